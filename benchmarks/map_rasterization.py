@@ -0,0 +1,163 @@
+"""
+Times Map.parse against the previous rasterizer, which built sets of blocks cell by cell, and checks that both produce
+the same grid and bounds. The previous rasterizer is kept here as the reference.
+
+Semantic maps are not shipped with the repository. Each map is given as a json file with the semantic map or as a
+.metadata file (it can be compressed) with a semantic map message, e.g. one trial of each of the four Saturn maps. If no
+map is given, synthetic maps (see TrialGenerator) of several sizes are used instead.
+
+Usage (from the root of the repository):
+    PYTHONPATH=. python benchmarks/map_rasterization.py SaturnA.metadata SaturnB.metadata SaturnC.json SaturnD.json
+    PYTHONPATH=. python benchmarks/map_rasterization.py --rooms 40 400 4000
+"""
+
+from typing import Any, Dict, Set, Tuple
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from tomcat_viz.Common.Files import openFile
+from tomcat_viz.Parser.Map import Map
+from tomcat_viz.Parser.MetadataReader import MetadataReader
+from tomcat_viz.Parser.Trial import Trial
+from tomcat_viz.Parser.TrialGenerator import TrialGenerator
+
+
+def bestOf(repeat: int, function) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+
+    return min(elapsed)
+
+
+def rasterizeWithSets(jsonMap: Dict[str, Any]) -> Tuple[Dict[str, int], np.ndarray]:
+    """
+    Previous implementation of Map.parse. Blocks are (x, y) tuples instead of instances of the former Block class,
+    which had the same equality.
+    """
+
+    rooms = {}
+    roomParts = {}
+    roomBlocks: Set[Tuple[int, int]] = set()
+    for location in jsonMap["locations"]:
+        if "child_locations" in location:
+            rooms[location["id"]] = {"parts": location["child_locations"]}
+        else:
+            coordinates = location["bounds"]["coordinates"]
+            x1 = coordinates[0]["x"]
+            y1 = coordinates[0]["z"]
+            x2 = coordinates[1]["x"]
+            y2 = coordinates[1]["z"]
+            bounds = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+            if "_part" in location["type"]:
+                roomParts[location["id"]] = {"bounds": bounds}
+            else:
+                for x in range(x1 - 1, x2 + 1, 1):
+                    roomBlocks.add((x, y1 - 1))
+                    roomBlocks.add((x, y2))
+                for y in range(y1 - 1, y2 + 1, 1):
+                    roomBlocks.add((x1 - 1, y))
+                    roomBlocks.add((x2, y))
+
+    for _, room in rooms.items():
+        emptyBlocks = set()
+        wallBlocks = set()
+        for partId in room["parts"]:
+            x1, y1, x2, y2 = [roomParts[partId]["bounds"][key] for key in ["x1", "y1", "x2", "y2"]]
+            for x in range(x1, x2):
+                for y in range(y1, y2):
+                    emptyBlocks.add((x, y))
+
+            for x in range(x1 - 1, x2 + 1, 1):
+                wallBlocks.add((x, y1 - 1))
+                wallBlocks.add((x, y2))
+            for y in range(y1 - 1, y2 + 1, 1):
+                wallBlocks.add((x1 - 1, y))
+                wallBlocks.add((x2, y))
+
+        roomBlocks = roomBlocks.union(wallBlocks.difference(emptyBlocks))
+
+    doorBlocks = set()
+    openingBlocks = set()
+    for location in jsonMap["connections"]:
+        coordinates = location["bounds"]["coordinates"]
+        blocks = doorBlocks if "door" in location["type"] else openingBlocks
+        for x in range(coordinates[0]["x"], coordinates[1]["x"]):
+            for y in range(coordinates[0]["z"], coordinates[1]["z"]):
+                blocks.add((x, y))
+
+    roomBlocks = roomBlocks.difference(openingBlocks)
+
+    metadata = {"min_x": min(x for x, _ in roomBlocks), "min_y": min(y for _, y in roomBlocks),
+                "max_x": max(x for x, _ in roomBlocks), "max_y": max(y for _, y in roomBlocks)}
+    grid = np.zeros((metadata["max_y"] - metadata["min_y"] + 1, metadata["max_x"] - metadata["min_x"] + 1),
+                    dtype=np.int8)
+    for x, y in roomBlocks:
+        grid[y - metadata["min_y"]][x - metadata["min_x"]] = Map.WALL
+    for x, y in doorBlocks:
+        grid[y - metadata["min_y"]][x - metadata["min_x"]] = Map.DOOR
+
+    return metadata, grid
+
+
+def readSemanticMap(filepath: str) -> Dict[str, Any]:
+    if filepath.endswith(".json"):
+        with open(filepath, "r") as f:
+            jsonMap = json.load(f)
+        # Either the semantic map or a whole ground truth message
+        return jsonMap.get("data", {}).get("semantic_map", jsonMap)
+
+    semanticMap = None
+    reader = MetadataReader({Trial.MAP_TOPIC}, Trial.AGENT_NAME)
+    with openFile(filepath, "r") as f:
+        for message in reader.read(f):
+            if message.get("topic", None) == Trial.MAP_TOPIC:
+                # The last occurrence prevails, as in Trial.parse
+                semanticMap = message["data"]["semantic_map"]
+
+    if semanticMap is None:
+        raise ValueError(f"No semantic map in {filepath}.")
+
+    return semanticMap
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the vectorized rasterizer of Map.parse with the previous "
+                                                 "one.")
+    parser.add_argument("maps", type=str, nargs="*",
+                        help="Semantic maps as json files or .metadata files with a semantic map message.")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[40, 400, 4000],
+                        help="Number of rooms of the synthetic maps used when no map is given.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repetitions. The best time is reported.")
+    args = parser.parse_args()
+
+    if len(args.maps) > 0:
+        semanticMaps = {os.path.basename(filepath): readSemanticMap(filepath) for filepath in args.maps}
+    else:
+        semanticMaps = {f"synthetic ({numRooms} rooms)": TrialGenerator.createSemanticMap(numRooms) for numRooms in
+                        args.rooms}
+
+    numMismatches = 0
+    print(f"{'Map':<36} {'Locations':>10} {'Grid':>10} {'Sets (s)':>10} {'Arrays (s)':>10} {'Speedup':>8}  Grid")
+    for name, semanticMap in semanticMaps.items():
+        vectorizedMap = Map()
+        vectorizedMap.parse(semanticMap)
+        referenceMetadata, referenceGrid = rasterizeWithSets(semanticMap)
+        identical = vectorizedMap.metadata == referenceMetadata and np.array_equal(vectorizedMap.grid, referenceGrid)
+        numMismatches += 0 if identical else 1
+
+        setsTime = bestOf(args.repeat, lambda: rasterizeWithSets(semanticMap))
+        arraysTime = bestOf(args.repeat, lambda: Map().parse(semanticMap))
+        shape = "x".join(str(size) for size in vectorizedMap.grid.shape)
+        print(f"{name:<36} {len(semanticMap['locations']):>10} {shape:>10} {setsTime:>10.4f} {arraysTime:>10.4f} "
+              f"{setsTime / arraysTime:>7.1f}x  {'identical' if identical else 'DIFFERENT'}")
+
+    # A non-zero exit code flags differences to scripts
+    sys.exit(1 if numMismatches > 0 else 0)
@@ -0,0 +1,93 @@
+"""
+Times Trial.parse with a single process and ParallelParser with pools of several processes, and checks that all of them
+produce the same trial package. Parallel parses only split the reading of the file: workers decode and sort the lines of
+their chunk, but the calling process decodes the relevant lines again and runs the handlers, so the speedup is bounded
+by the share of the time spent on irrelevant lines, timestamps and sorting. Spawning the workers takes a fraction of a
+second, so small files are always parsed faster by a single process.
+
+If no file is given, a synthetic trial (see TrialGenerator) is generated in the data directory.
+
+Usage (from the root of the repository):
+    PYTHONPATH=. python benchmarks/parallel_parse.py [trial.metadata ...] [--workers 2 4 8] [--repeat 3]
+"""
+
+from typing import Dict
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+from tomcat_viz.Parser.ParallelParser import ParallelParser
+from tomcat_viz.Parser.Trial import Trial
+from tomcat_viz.Parser.TrialGenerator import TrialGenerator
+
+
+def parse(filepath: str, timeSteps: int, numWorkers: int) -> Trial:
+    trial = Trial(timeSteps)
+    with open(filepath, "r") as f:
+        ParallelParser(trial, numWorkers).parse(f)
+    return trial
+
+
+def timeParse(filepath: str, timeSteps: int, numWorkers: int, repeat: int) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(filepath, timeSteps, numWorkers)
+        elapsed.append(time.perf_counter() - start)
+
+    return min(elapsed)
+
+
+def readPackage(trial: Trial, workDir: str) -> Dict[str, bytes]:
+    packagePath = os.path.join(workDir, "trial.trial")
+    trial.save(packagePath)
+    with zipfile.ZipFile(packagePath, "r") as package:
+        return {name: package.read(name) for name in package.namelist()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares parses of a trial with one and several processes.")
+    parser.add_argument("metadata", type=str, nargs="*",
+                        help="Uncompressed .metadata files. A synthetic trial is used if none is given.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="Numbers of processes to compare.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions. The best time is reported.")
+    parser.add_argument("--time_steps", type=int, default=900, help="Number of seconds of the missions of the files.")
+    parser.add_argument("--length", type=int, default=9000, help="Length in seconds of the synthetic trial.")
+    parser.add_argument("--data_dir", type=str, default=os.path.join(tempfile.gettempdir(), "tomcat-viz-benchmarks"),
+                        help="Directory where the synthetic trial is kept.")
+    args = parser.parse_args()
+
+    filepaths = args.metadata
+    timeSteps = args.time_steps
+    if len(filepaths) == 0:
+        filepath = os.path.join(args.data_dir, f"synthetic_parallel_{args.length}s.metadata")
+        if not os.path.isfile(filepath):
+            os.makedirs(args.data_dir, exist_ok=True)
+            print(f"Generating {filepath}...")
+            TrialGenerator(args.length).write(f"{filepath}.tmp")
+            os.replace(f"{filepath}.tmp", filepath)
+        filepaths = [filepath]
+        timeSteps = args.length
+
+    # Workers compete with each other (and with the calling process) for the processors
+    print(f"{os.cpu_count()} processor(s) available")
+    numMismatches = 0
+    print(f"{'File':<56} {'Workers':>8} {'Seconds':>10} {'Speedup':>8}  Package")
+    with tempfile.TemporaryDirectory() as workDir:
+        for filepath in filepaths:
+            name = os.path.basename(filepath)
+            referencePackage = readPackage(parse(filepath, timeSteps, 1), workDir)
+            serialTime = timeParse(filepath, timeSteps, 1, args.repeat)
+            print(f"{name:<56} {1:>8} {serialTime:>10.3f} {1:>7.2f}x")
+            for numWorkers in args.workers:
+                identical = readPackage(parse(filepath, timeSteps, numWorkers), workDir) == referencePackage
+                numMismatches += 0 if identical else 1
+                parallelTime = timeParse(filepath, timeSteps, numWorkers, args.repeat)
+                print(f"{name:<56} {numWorkers:>8} {parallelTime:>10.3f} {serialTime / parallelTime:>7.2f}x  "
+                      f"{'identical' if identical else 'DIFFERENT'}")
+
+    # A non-zero exit code flags differences to scripts
+    sys.exit(1 if numMismatches > 0 else 0)
@@ -0,0 +1,178 @@
+"""
+Times Trial.parse, Trial.save, Trial.load and Map.parse on synthetic trials (see TrialGenerator) at several scales and
+compares the results with the ones of a previous run. A scale multiplies the length of the mission (and so the number
+of messages) and the number of rooms of the map.
+
+Synthetic files are kept in a data directory and only generated when missing, as the largest ones take a while.
+
+Usage (from the root of the repository):
+    PYTHONPATH=. python benchmarks/parser_suite.py --output before.json
+    PYTHONPATH=. python benchmarks/parser_suite.py --output after.json --compare before.json
+"""
+
+from typing import Any, Dict
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from tomcat_viz.Parser.Map import Map
+from tomcat_viz.Parser.ParallelParser import ParallelParser
+from tomcat_viz.Parser.StreamingParser import StreamingParser
+from tomcat_viz.Parser.Trial import Trial
+from tomcat_viz.Parser.TrialGenerator import TrialGenerator
+
+BENCHMARKS = ["parse", "save", "load", "load_preload", "map_parse"]
+# Differences below this many seconds are considered noise, whatever the ratio
+MIN_DIFFERENCE = 0.005
+
+
+def bestOf(repeat: int, function) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+
+    return min(elapsed)
+
+
+def getSyntheticFile(args: argparse.Namespace, missionLength: int) -> str:
+    filename = (f"synthetic_{missionLength}s_{args.state_rate:g}hz_{args.event_rate:g}ev_{args.noise_rate:g}noise_"
+                f"{args.players}p_{args.rooms}r_seed{args.seed}.metadata")
+    filepath = os.path.join(args.data_dir, filename)
+    if not os.path.isfile(filepath):
+        os.makedirs(args.data_dir, exist_ok=True)
+        print(f"Generating {filepath}...")
+        generator = TrialGenerator(missionLength, args.state_rate, args.event_rate, args.noise_rate, args.players,
+                                   args.rooms, args.seed)
+        # Written under another name first, so an interrupted run does not leave a truncated file behind
+        generator.write(f"{filepath}.tmp")
+        os.replace(f"{filepath}.tmp", filepath)
+
+    return filepath
+
+
+def runScale(args: argparse.Namespace, scale: int, workDir: str) -> Dict[str, Any]:
+    missionLength = args.base_length * scale
+    metadataPath = getSyntheticFile(args, missionLength)
+    packagePath = os.path.join(workDir, f"synthetic_{scale}x.trial")
+
+    def parse() -> Trial:
+        trial = Trial(timeSteps=missionLength)
+        with open(metadataPath, "r") as f:
+            if args.streaming:
+                StreamingParser(trial).parse(f)
+            else:
+                ParallelParser(trial, args.workers).parse(f)
+        return trial
+
+    def load(preload: bool):
+        trial = Trial(timeSteps=missionLength)
+        trial.load(packagePath)
+        if preload:
+            trial.preload()
+
+    trial = parse()
+    semanticMap = TrialGenerator.createSemanticMap(args.rooms * scale)
+    with open(metadataPath, "rb") as f:
+        numLines = sum(1 for _ in f)
+
+    result = {
+        "mission_length": missionLength,
+        "lines": numLines,
+        "bytes": os.path.getsize(metadataPath),
+        "map_rooms": args.rooms * scale,
+        "parse": bestOf(args.repeat, parse),
+        "save": bestOf(args.repeat, lambda: trial.save(packagePath)),
+        "load": bestOf(args.repeat, lambda: load(False)),
+        "load_preload": bestOf(args.repeat, lambda: load(True)),
+        "map_parse": bestOf(args.repeat, lambda: Map().parse(semanticMap))
+    }
+    os.remove(packagePath)
+
+    return result
+
+
+def printResults(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """
+    Prints the results and, if a baseline is given, how they compare with it.
+
+    :return: number of benchmarks slower than the baseline by more than the threshold.
+    """
+
+    numRegressions = 0
+    print(f"{'Scale':<6} {'Benchmark':<14} {'Seconds':>10} {'Baseline':>10} {'Ratio':>7}")
+    for scale, result in results["results"].items():
+        baselineResult = baseline["results"].get(scale, None) if baseline is not None else None
+        for benchmark in BENCHMARKS:
+            line = f"{scale:<6} {benchmark:<14} {result[benchmark]:>10.4f}"
+            if baselineResult is not None and benchmark in baselineResult:
+                ratio = result[benchmark] / baselineResult[benchmark] if baselineResult[benchmark] > 0 else 1.0
+                line += f" {baselineResult[benchmark]:>10.4f} {ratio:>6.2f}x"
+                significant = abs(result[benchmark] - baselineResult[benchmark]) >= MIN_DIFFERENCE
+                if significant and ratio > 1 + threshold:
+                    line += "  slower"
+                    numRegressions += 1
+                elif significant and ratio < 1 - threshold:
+                    line += "  faster"
+            print(line)
+
+    if baseline is not None and baseline["parameters"] != results["parameters"]:
+        print("Warning: the baseline was obtained with different parameters.")
+
+    return numRegressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parser benchmark suite on synthetic trials.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Scales to run.")
+    parser.add_argument("--base_length", type=int, default=90, help="Length of the mission in seconds at scale 1.")
+    parser.add_argument("--state_rate", type=float, default=10, help="State messages per player per second.")
+    parser.add_argument("--event_rate", type=float, default=1, help="Average number of events per second.")
+    parser.add_argument("--noise_rate", type=float, default=20,
+                        help="Average number of lines of irrelevant topics per second.")
+    parser.add_argument("--players", type=int, default=3, help="Number of players.")
+    parser.add_argument("--rooms", type=int, default=40, help="Number of rooms of the map at scale 1.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic trials.")
+    parser.add_argument("--streaming", action="store_true", help="Parse in streaming mode.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to read the files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions. The best time is reported.")
+    parser.add_argument("--data_dir", type=str, default=os.path.join(tempfile.gettempdir(), "tomcat-viz-benchmarks"),
+                        help="Directory where the synthetic files are kept.")
+    parser.add_argument("--output", type=str, help="Path of a json file where the results are saved.")
+    parser.add_argument("--compare", type=str, help="Path of the results of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative difference from the baseline above which a benchmark is reported as slower "
+                             "or faster.")
+    args = parser.parse_args()
+
+    parameters = {name: value for name, value in vars(args).items() if
+                  name not in ["scales", "repeat", "data_dir", "output", "compare", "threshold"]}
+    results = {
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                        "processor": platform.processor(), "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "parameters": parameters,
+        "results": {}
+    }
+    with tempfile.TemporaryDirectory() as workDir:
+        for scale in args.scales:
+            results["results"][f"{scale}x"] = runScale(args, scale, workDir)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    numRegressions = printResults(results, baseline, args.threshold)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # A non-zero exit code flags regressions to scripts
+    sys.exit(1 if numRegressions > 0 else 0)
@@ -0,0 +1,98 @@
+"""
+Measures the memory of the scene items drawn by the map widget, which is the source of MapWidget.ESTIMATED_ITEM_BYTES,
+MapWidget.ESTIMATED_STAMPED_ITEM_BYTES and MapWidget.PATH_ELEMENT_BYTES. Qt objects are not visible to tracemalloc, so
+the growth of the resident memory of the process (Linux only) is measured while a number of items of each kind are
+created and kept alive, as the caches of the map widget do. Each kind is measured in a process of its own, so memory
+released by a previous measurement is not reused by the next one. The numbers depend on the platform and the version
+of Qt.
+
+Usage (from the root of the repository): PYTHONPATH=. python benchmarks/scene_item_memory.py [--items 20000]
+"""
+
+from typing import Callable, List
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+
+from PyQt5.QtCore import QPointF, Qt
+from PyQt5.QtGui import QPainterPath
+from PyQt5.QtWidgets import QApplication
+
+from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Memory import getResidentMemory
+from tomcat_viz.Gui.CustomScene import CustomScene
+from tomcat_viz.Gui.MapWidget import MapWidget
+
+# Number of elements of the paths measured. Paths are measured in tenths of the number of items.
+PATH_ELEMENTS = 1000
+
+
+def measure(numItems: int, createItem: Callable[[int], object], removeItem: Callable[[object], None] = None) -> float:
+    gc.collect()
+    before = getResidentMemory()
+    items: List[object] = [createItem(i) for i in range(numItems)]
+    if removeItem is not None:
+        for item in items:
+            removeItem(item)
+    gc.collect()
+    bytesPerItem = (getResidentMemory() - before) / numItems
+    # Kept alive until here so the items are not released before the measurement
+    del items
+    return bytesPerItem
+
+
+def createPath(numElements: int) -> QPainterPath:
+    path = QPainterPath(QPointF(0, 0))
+    for i in range(1, numElements):
+        path.lineTo(i, i % 7)
+    return path
+
+
+def measureKind(kind: str, numItems: int) -> float:
+    # Scene items need an application but not a display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication([])
+    # Items are spread over a grid of the size of a large map, so the index of the scene grows as it does in the GUI
+    columns = 200
+    blockSize = 10
+    scene = CustomScene(0, 0, columns * blockSize, columns * blockSize, Qt.white)
+
+    def blockArgs(i: int):
+        return i % columns, i // columns, blockSize, blockSize
+
+    removeItem = scene.removeItem if kind.endswith("removed") else None
+    if kind.startswith("stamped"):
+        bytesPerItem = measure(numItems, lambda i: scene.drawMarker(Constants.MarkerType.NO_VICTIM, *blockArgs(i)),
+                               removeItem)
+    elif kind.startswith("block"):
+        bytesPerItem = measure(numItems, lambda i: scene.drawRubble(*blockArgs(i)), removeItem)
+    else:
+        bytesPerItem = measure(max(1, numItems // 10), lambda _: createPath(PATH_ELEMENTS)) / PATH_ELEMENTS
+
+    app.quit()
+    return bytesPerItem
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the memory of the scene items drawn by the map widget.")
+    parser.add_argument("--items", type=int, default=20000, help="Number of items of each kind.")
+    args = parser.parse_args()
+
+    if getResidentMemory() is None:
+        print("The resident memory of the process is not available in this platform.")
+        sys.exit(1)
+
+    kinds = {"block": "block (in the scene)", "block removed": "block (removed from the scene)",
+             "stamped": "stamped block (in the scene)", "stamped removed": "stamped block (removed from the scene)",
+             "path": "painter path element"}
+    context = multiprocessing.get_context("spawn")
+    print(f"{'Item':<44} {'Measured bytes':>15}")
+    for kind, name in kinds.items():
+        with context.Pool(1) as pool:
+            print(f"{name:<44} {pool.apply(measureKind, (kind, args.items)):>15.0f}")
+
+    print(f"\nMapWidget.ESTIMATED_ITEM_BYTES = {MapWidget.ESTIMATED_ITEM_BYTES}, "
+          f"MapWidget.ESTIMATED_STAMPED_ITEM_BYTES = {MapWidget.ESTIMATED_STAMPED_ITEM_BYTES}, "
+          f"MapWidget.PATH_ELEMENT_BYTES = {MapWidget.PATH_ELEMENT_BYTES}")
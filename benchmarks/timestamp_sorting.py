@@ -0,0 +1,53 @@
+"""
+Compares the cost of ordering the messages of a trial by timestamp with dateutil and with the ISO-8601 fast path used
+by the parser, and reports how much of the load time of the trial is saved.
+
+Usage (from the root of the repository): PYTHONPATH=. python benchmarks/timestamp_sorting.py <trial.metadata>
+"""
+
+import argparse
+import time
+
+from dateutil.parser import parse
+
+from tomcat_viz.Common.Format import timestampToMicroseconds
+from tomcat_viz.Parser.Trial import Trial
+
+
+def bestOf(repeat: int, function):
+    elapsed = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed.append(time.perf_counter() - start)
+
+    return min(elapsed), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timestamp ordering benchmark.")
+    parser.add_argument("metadata", type=str, help="Path to a full-length .metadata file.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions. The best time is reported.")
+    args = parser.parse_args()
+
+    with open(args.metadata, "r") as f:
+        messages = [message for message in Trial().createMetadataReader().read(f) if
+                    message.get("topic", None) not in Trial.GROUND_TRUTH_TOPICS]
+
+    dateutilTime, dateutilOrder = bestOf(args.repeat, lambda: sorted(
+        messages, key=lambda x: parse(x["header"]["timestamp"])))
+    fastTime, fastOrder = bestOf(args.repeat, lambda: sorted(
+        messages, key=lambda x: timestampToMicroseconds(x["header"]["timestamp"])))
+
+    def loadTrial():
+        with open(args.metadata, "r") as f:
+            Trial().parse(f)
+
+    loadTime, _ = bestOf(args.repeat, loadTrial)
+
+    print(f"Messages sorted: {len(messages)}")
+    print(f"Same order: {[id(m) for m in dateutilOrder] == [id(m) for m in fastOrder]}")
+    print(f"Sort with dateutil: {dateutilTime:.3f}s")
+    print(f"Sort with fast path: {fastTime:.3f}s ({dateutilTime / fastTime:.1f}x faster)")
+    print(f"Trial load time: {loadTime:.3f}s (with dateutil: ~{loadTime - fastTime + dateutilTime:.3f}s)")
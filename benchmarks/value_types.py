@@ -0,0 +1,153 @@
+"""
+Compares the memory footprint and the hashing cost of the slotted value types of the trial (Position, Marker, Victim and
+ChatMessage) with the dictionary-based classes they replaced. If a .metadata file is given, the trial is also parsed
+with both implementations and the parse time and peak memory are reported.
+
+Usage (from the root of the repository): PYTHONPATH=. python benchmarks/value_types.py [trial.metadata]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import tomcat_viz.Parser.Trial as TrialModule
+from tomcat_viz.Common.Constants import Constants
+
+
+class LegacyChatMessage:
+
+    def __init__(self, sender: str, addressee: str, color: str, text: str):
+        self.sender = sender
+        self.addressee = addressee
+        self.color = color
+        self.text = text
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and
+                getattr(other, "sender", None) == self.sender and
+                getattr(other, "addressee", None) == self.addressee and
+                getattr(other, "text", None) == self.text)
+
+    def __hash__(self):
+        return hash(f"{self.sender}#{self.addressee}#{self.text}")
+
+
+class LegacyPosition:
+
+    def __init__(self, x: float, y: float):
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and
+                getattr(other, "x", None) == self.x and
+                getattr(other, "y", None) == self.y)
+
+    def __hash__(self):
+        return hash(f"{self.x}#{self.y}")
+
+    def __repr__(self):
+        return f"{self.x}#{self.y}"
+
+
+class LegacyMarker:
+
+    def __init__(self, markerType: Constants.MarkerType, x: float, y: float):
+        self.markerType = markerType
+        self.position = LegacyPosition(x, y)
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and
+                getattr(other, "markerType", None) == self.markerType and
+                getattr(other, "position", None) == self.position)
+
+    def __hash__(self):
+        return hash(f"{self.markerType}#{self.position}")
+
+    def __repr__(self):
+        return f"{self.markerType}#{self.position}"
+
+
+class LegacyVictim:
+
+    def __init__(self, victimType: Constants.VictimType, x: float, y: float):
+        self.victimType = victimType
+        self.position = LegacyPosition(x, y)
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and
+                getattr(other, "victimType", None) == self.victimType and
+                getattr(other, "position", None) == self.position)
+
+    def __hash__(self):
+        return hash(f"{self.victimType}#{self.position}")
+
+    def __repr__(self):
+        return f"{self.victimType}#{self.position}"
+
+
+LEGACY_TYPES = {"ChatMessage": LegacyChatMessage, "Position": LegacyPosition, "Marker": LegacyMarker,
+                "Victim": LegacyVictim}
+SLOTTED_TYPES = {name: getattr(TrialModule, name) for name in LEGACY_TYPES}
+
+
+def createObjects(types, numObjects: int):
+    objects = []
+    for i in range(numObjects):
+        x, y = float(i % 150), float(i // 150)
+        objects.append(types["Position"](x, y))
+        objects.append(types["Marker"](Constants.MarkerType.NO_VICTIM, x, y))
+        objects.append(types["Victim"](Constants.VictimType.A, x, y))
+        objects.append(types["ChatMessage"]("Server", "Red", "yellow", f"Message {i}"))
+
+    return objects
+
+
+def measureObjects(types, numObjects: int):
+    tracemalloc.start()
+    objects = createObjects(types, numObjects)
+    bytesPerObject = tracemalloc.get_traced_memory()[0] / len(objects)
+    tracemalloc.stop()
+
+    # Set operations as performed by the parser when it accumulates markers and victims per time step
+    start = time.perf_counter()
+    objectSet = set(objects)
+    found = sum(1 for obj in objects if obj in objectSet)
+    for obj in objects:
+        objectSet.discard(obj)
+    elapsed = time.perf_counter() - start
+
+    assert found == len(objects)
+    return bytesPerObject, elapsed
+
+
+def measureParse(types, metadata: str):
+    for name, valueType in types.items():
+        setattr(TrialModule, name, valueType)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(metadata, "r") as f:
+        TrialModule.Trial().parse(f)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Value types benchmark.")
+    parser.add_argument("metadata", type=str, nargs="?", help="Optional path to a .metadata file to parse.")
+    parser.add_argument("--objects", type=int, default=50000, help="Number of objects created per type.")
+    args = parser.parse_args()
+
+    for label, types in [("Legacy", LEGACY_TYPES), ("Slotted", SLOTTED_TYPES)]:
+        bytesPerObject, elapsed = measureObjects(types, args.objects)
+        print(f"{label}: {bytesPerObject:.0f} bytes per object, set operations in {elapsed:.3f}s")
+
+    if args.metadata is not None:
+        # Slotted types last, so the module is left as it was
+        for label, types in [("Legacy", LEGACY_TYPES), ("Slotted", SLOTTED_TYPES)]:
+            elapsed, peak = measureParse(types, args.metadata)
+            print(f"{label} parse: {elapsed:.3f}s, peak memory {peak / 2 ** 20:.1f} MiB")
@@ -0,0 +1,49 @@
+import json
+
+from tomcat_viz.Parser.Trial import Trial
+from tomcat_viz.Parser.TrialGenerator import TrialGenerator
+
+MISSION_LENGTH = 60
+
+# Values that the parser does not recognize, so their enums are None
+UNKNOWN_TYPES = {
+    "Event:VictimPlaced": ("type", "unknown_victim"),
+    "Event:MarkerPlaced": ("type", "unknown_marker"),
+    "Event:ItemEquipped": ("equippeditemname", "unknown_item")
+}
+
+
+def createTrialWithUnknownTypes(tmp_path) -> Trial:
+    metadataPath = tmp_path / "unknown_types.metadata"
+    with open(metadataPath, "w") as f:
+        for message in TrialGenerator(MISSION_LENGTH, eventRate=10, noiseRate=0, seed=1).generate():
+            field = UNKNOWN_TYPES.get(message.get("msg", {}).get("sub_type", None), None)
+            if field is not None:
+                message["data"][field[0]] = field[1]
+            f.write(json.dumps(message))
+            f.write("\n")
+
+    trial = Trial(timeSteps=MISSION_LENGTH)
+    with open(metadataPath, "r") as f:
+        trial.parse(f)
+
+    return trial
+
+
+def test_package_round_trip_with_unknown_types(tmp_path):
+    trial = createTrialWithUnknownTypes(tmp_path)
+    placedVictims = [list(events) for events in trial.placedVictims]
+    placedMarkers = [list(events) for events in trial.placedMarkers]
+    equippedItems = [list(items) for items in trial.playersEquippedItems]
+    assert any(victim.victimType is None for events in placedVictims for victim in events)
+    assert any(marker.markerType is None for events in placedMarkers for marker in events)
+    assert any(item is None for items in equippedItems for item in items)
+
+    packagePath = str(tmp_path / "unknown_types.trial")
+    trial.save(packagePath)
+    loadedTrial = Trial(timeSteps=MISSION_LENGTH)
+    loadedTrial.load(packagePath)
+
+    assert [list(events) for events in loadedTrial.placedVictims] == placedVictims
+    assert [list(events) for events in loadedTrial.placedMarkers] == placedMarkers
+    assert [list(items) for items in loadedTrial.playersEquippedItems] == equippedItems
@@ -0,0 +1,61 @@
+from typing import IO, Any, Dict
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# Functions that open the files of each compressed format, by extension
+COMPRESSED_FILE_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def getFileHash(filepath: str) -> str:
+    """
+    Computes the SHA-256 digest of the content of a file. The file is read in chunks, so files of any size can be
+    hashed.
+    """
+
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def getFileStat(filepath: str) -> Dict[str, Any]:
+    """
+    Gets the size and the modification time of a file. Together, they are used to detect changes in a file without
+    hashing its content.
+    """
+
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def isCompressedFile(filepath: str) -> bool:
+    return os.path.splitext(filepath)[1].lower() in COMPRESSED_FILE_OPENERS
+
+
+def removeCompressionExtension(filepath: str) -> str:
+    """
+    Removes the extension of the compressed format of a file, if any (e.g. trial.metadata.gz -> trial.metadata).
+    """
+
+    return os.path.splitext(filepath)[0] if isCompressedFile(filepath) else filepath
+
+
+def openFile(filepath: str, mode: str = "r") -> IO:
+    """
+    Opens a file for reading. Files compressed with gzip, bzip2 or xz (.gz, .bz2 and .xz extensions) are decompressed
+    as they are read, so they never need to be decompressed to disk.
+    """
+
+    opener = COMPRESSED_FILE_OPENERS.get(os.path.splitext(filepath)[1].lower(), None)
+    if opener is None:
+        return open(filepath, mode)
+
+    # Compressed files are opened in binary mode unless text mode is explicit
+    return opener(filepath, mode if "b" in mode else f"{mode}t")
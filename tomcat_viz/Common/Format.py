@@ -1,3 +1,13 @@
+from datetime import date, datetime, timezone
+
+from dateutil.parser import parse
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Number of days since epoch per date prefix (YYYY-MM-DD). A trial spans one or two dates, so this stays tiny.
+_daysSinceEpochCache = {}
+
 
 def secondsToTime(seconds: int):
     minutes = int(seconds / 60)
@@ -15,3 +25,48 @@ def secondsToTime(seconds: int):
 
     return timer
 
+
+def timestampToMicroseconds(timestamp: str) -> int:
+    """
+    Converts a timestamp to microseconds since epoch (UTC). Timestamps written by the testbed
+    (e.g. 2021-09-13T20:59:36.1234Z) are converted by slicing the string. Other formats are delegated to dateutil.
+    Timestamps without timezone are assumed to be in UTC.
+    """
+
+    try:
+        datePrefix = timestamp[:10]
+        days = _daysSinceEpochCache.get(datePrefix, None)
+        if days is None:
+            if timestamp[4] != "-" or timestamp[7] != "-":
+                raise ValueError
+            days = date(int(timestamp[:4]), int(timestamp[5:7]), int(timestamp[8:10])).toordinal() - EPOCH_ORDINAL
+            _daysSinceEpochCache[datePrefix] = days
+
+        if timestamp[10] not in "T " or timestamp[13] != ":" or timestamp[16] != ":":
+            raise ValueError
+        seconds = int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+
+        end = 19
+        microseconds = 0
+        if len(timestamp) > end and timestamp[end] == ".":
+            end += 1
+            while end < len(timestamp) and timestamp[end].isdigit():
+                end += 1
+            # Fractions are truncated or padded to six digits
+            microseconds = int(f"{timestamp[20:end]:0<6}"[:6])
+
+        if end < len(timestamp) and timestamp[end:] != "Z":
+            offset = timestamp[end:]
+            if len(offset) != 6 or offset[0] not in "+-" or offset[3] != ":":
+                raise ValueError
+            offsetSeconds = int(offset[1:3]) * 3600 + int(offset[4:6]) * 60
+            seconds -= offsetSeconds if offset[0] == "+" else -offsetSeconds
+
+        return (days * 86400 + seconds) * 1000000 + microseconds
+    except (ValueError, IndexError):
+        dateTime = parse(timestamp)
+        if dateTime.tzinfo is None:
+            dateTime = dateTime.replace(tzinfo=timezone.utc)
+
+        delta = dateTime - EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
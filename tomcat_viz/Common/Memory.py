@@ -0,0 +1,132 @@
+from collections import deque
+from enum import Enum
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, Optional, Set, Tuple
+import mmap
+import os
+import sys
+
+import numpy as np
+
+
+class MemoryCounter:
+    """
+    This class measures the memory retained by Python objects by following their references through containers,
+    instance attributes and slots. An object is only counted once per counter, so an object shared by several measured
+    objects is attributed to the first one measured.
+
+    Data of numpy arrays backed by memory-mapped files (e.g. loaded trial packages) is counted apart, as it's only
+    resident while it's being used and can be released by the operating system at any time.
+
+    Classes, functions, modules and enumeration members are shared by the whole program and are not counted. Qt
+    objects are counted by the size of their Python wrapper only, as their memory is not visible from Python.
+    """
+
+    _SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, Enum)
+
+    def __init__(self):
+        self._seen: Set[int] = set()
+        self._qtTypes: Dict[type, bool] = {}
+
+    def measure(self, obj: Any) -> Tuple[int, int]:
+        """
+        Measures the memory retained by an object, leaving out objects already measured by the counter.
+
+        :return: number of bytes in memory and number of bytes of memory-mapped files.
+        """
+
+        numBytes = 0
+        numMappedBytes = 0
+        pending = [obj]
+        while len(pending) > 0:
+            obj = pending.pop()
+            if id(obj) in self._seen or isinstance(obj, MemoryCounter._SHARED_TYPES):
+                continue
+            self._seen.add(id(obj))
+
+            # Arrays that own their data include it in their size. Views only include their header.
+            numBytes += sys.getsizeof(obj)
+            if isinstance(obj, np.ndarray):
+                if isinstance(MemoryCounter._getMemoryOwner(obj), mmap.mmap):
+                    numMappedBytes += obj.nbytes
+                elif obj.base is not None:
+                    pending.append(obj.base)
+                elif obj.dtype == object:
+                    pending.extend(obj.ravel().tolist())
+            elif isinstance(obj, dict):
+                pending.extend(obj.keys())
+                pending.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+                pending.extend(obj)
+            elif not self._isQtObject(obj):
+                if hasattr(obj, "__dict__"):
+                    pending.append(obj.__dict__)
+                pending.extend(MemoryCounter._getSlotValues(obj))
+
+        return numBytes, numMappedBytes
+
+    def _isQtObject(self, obj: Any) -> bool:
+        objType = type(obj)
+        isQt = self._qtTypes.get(objType, None)
+        if isQt is None:
+            isQt = any(cls.__module__.startswith("PyQt5") for cls in objType.__mro__)
+            self._qtTypes[objType] = isQt
+
+        return isQt
+
+    @staticmethod
+    def _getMemoryOwner(array: np.ndarray) -> Any:
+        owner = array
+        while isinstance(owner, np.ndarray) and owner.base is not None:
+            owner = owner.base
+
+        return owner
+
+    @staticmethod
+    def _getSlotValues(obj: Any) -> list:
+        values = []
+        for cls in type(obj).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in [slots] if isinstance(slots, str) else slots:
+                if slot != "__dict__" and hasattr(obj, slot):
+                    values.append(getattr(obj, slot))
+
+        return values
+
+
+def getResidentMemory() -> Optional[int]:
+    """
+    Gets the resident memory of the process in bytes, if the platform exposes it (Linux only).
+    """
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def formatMemoryReport(report: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    """
+    Formats a memory report as a table. A report has sections (e.g. trial) with entries (e.g. a field of the trial)
+    that have a number of bytes and, optionally, a number of memory-mapped bytes and a number of items. Entries flagged
+    as estimated (e.g. the ones that include Qt objects) are marked.
+    """
+
+    lines = [f"{'':<36} {'KiB':>12} {'Mapped KiB':>12} {'Items':>10}"]
+    for section, entries in report.items():
+        lines.append(section)
+        totalBytes = 0
+        totalMappedBytes = 0
+        for name, entry in entries.items():
+            mappedBytes = entry.get("mapped_bytes", 0)
+            items = entry.get("items", "")
+            note = "" if entry.get("loaded", True) else "  (not loaded)"
+            note += "  (estimated)" if entry.get("estimated", False) else ""
+            lines.append(f"  {name:<34} {entry['bytes'] / 1024:>12.1f} {mappedBytes / 1024:>12.1f} {items:>10}{note}")
+            totalBytes += entry["bytes"]
+            totalMappedBytes += mappedBytes
+        if len(entries) > 1:
+            lines.append(f"  {'total':<34} {totalBytes / 1024:>12.1f} {totalMappedBytes / 1024:>12.1f}")
+
+    return "\n".join(lines)
@@ -9,11 +9,15 @@ class ChatWidget(TextMessageWidget):
     def __init__(self):
         super().__init__()
 
-    def _messagesToHTMLTableLines(self, messages: List[Tuple[ChatMessage, int, str]]):
+    def _messagesToHTMLTableLines(self, messages: List[Tuple[ChatMessage, int, List[str]]]):
         tableLines = []
-        for chatMessage, timer, textColor in messages:
+        for chatMessage, timer, addresseeColors in messages:
+            # A square per addressee. The text takes the color of the addressee if there is only one.
+            addressees = "".join(f"<span style = 'color: {color};'>&#9632;</span>" for color in addresseeColors)
+            textColor = addresseeColors[0] if len(addresseeColors) == 1 else "black"
             row = f"<tr><td><span style = 'color: {chatMessage.color}; font-weight: bold'>[{timer}]:</span></td>" \
                   f"<td><span style = 'color: {chatMessage.color}; font-weight: bold'>{chatMessage.sender} - </span></td>" \
+                  f"<td>{addressees}</td>" \
                   f"<td><span style = 'color: {textColor};'>{chatMessage.text}</span></td></tr>"
             tableLines.append(row)
 
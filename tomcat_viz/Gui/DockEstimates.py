@@ -1,9 +1,10 @@
-from typing import Any, Callable
+from typing import Any, Callable, Dict
 
 from PyQt5.Qt import QPalette, QColor
 from PyQt5.QtWidgets import QScrollArea, QWidget, QPushButton, QVBoxLayout, QMainWindow
 
 from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Memory import MemoryCounter
 from tomcat_viz.Gui.EstimatesWidget import EstimatesWidget
 from tomcat_viz.Parser.Estimates import Estimates
 
@@ -127,6 +128,22 @@ class DockEstimates(QWidget):
         self.dockedWidget.estimatesWidget.loadEstimates(estimates)
         self._undockedWidget.estimatesWidget.loadEstimates(estimates)
 
+    def getMemoryFootprint(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Measures the memory retained by the plots of the docked and undocked widgets. Both widgets plot the same
+        series, so their values are reported once.
+        """
+
+        counter = MemoryCounter()
+        docked = self.dockedWidget.estimatesWidget.measureMemory(counter)
+        undocked = self._undockedWidget.estimatesWidget.measureMemory(counter)
+
+        return {
+            "seriesValues": {"bytes": docked["series"] + undocked["series"], "items": docked["plots"]},
+            "dockedPlots": {"bytes": docked["times"] + docked["plot_data"], "items": docked["plots"]},
+            "undockedPlots": {"bytes": undocked["times"] + undocked["plot_data"], "items": undocked["plots"]}
+        }
+
     def dock(self):
         self._onDock()
 
@@ -1,8 +1,9 @@
-from typing import Callable
+from typing import Callable, Dict
 
 from PyQt5.Qt import QPalette, QColor
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout
 
+from tomcat_viz.Common.Memory import MemoryCounter
 from tomcat_viz.Gui.CollapsiblePanel import CollapsiblePanel
 from tomcat_viz.Gui.MultiTimeSeriesPlotWidget import MultiTimeSeriesPlotWidget
 from tomcat_viz.Gui.Utils import createHorizontalSeparator, createVerticalSeparator
@@ -76,6 +77,14 @@ class EstimatesWidget(QWidget):
     def setLegendToggleCallback(self, callback: Callable):
         self._legendToggleCallback = callback
 
+    def measureMemory(self, counter: MemoryCounter) -> Dict[str, int]:
+        footprint = {"plots": 0, "series": 0, "times": 0, "plot_data": 0}
+        for multiPlotWidget in self._multiPlotWidgets:
+            for name, value in multiPlotWidget.measureMemory(counter).items():
+                footprint[name] += value
+
+        return footprint
+
     def toggleLegend(self, legendIndex: int, timeSeriesIndex: int, groupIndex: int):
         self._multiPlotWidgets[groupIndex].toggleLegend(legendIndex, timeSeriesIndex)
 
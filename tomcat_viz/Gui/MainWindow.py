@@ -1,13 +1,17 @@
 from PyQt5.Qt import QMenu, QAction
-from PyQt5.QtWidgets import QFileDialog
+from PyQt5.QtWidgets import QFileDialog, QInputDialog
 from PyQt5.QtWidgets import QMainWindow
 
+from tomcat_viz.Gui.MemoryReportDialog import MemoryReportDialog
 from tomcat_viz.Gui.TomcatVisualizerWidget import TomcatVisualizerWidget
+from tomcat_viz.Parser.MessageStream import MessageStreamServer
 
 
 class MainWindow(QMainWindow):
     LEFT_PANEL_PROP = 80
     MAP_HEIGHT_PROP = 80
+    # Compressed files can be loaded, but not followed
+    METADATA_FILE_FILTER = "Metadata File (*.metadata *.metadata.gz *.metadata.bz2 *.metadata.xz)"
 
     def __init__(self):
         super().__init__()
@@ -26,6 +30,7 @@ class MainWindow(QMainWindow):
     def _createMenu(self):
         self._createTrialMenu()
         self._createEstimatesMenu()
+        self._createToolsMenu()
 
     def _createTrialMenu(self):
         menuBar = self.menuBar()
@@ -34,10 +39,16 @@ class MainWindow(QMainWindow):
         # Load options
         loadMenu = QMenu("&Load", self)
         loadFromMetadataAction = QAction("&From Metadata...", self)
+        followMetadataAction = QAction("F&ollow Metadata...", self)
+        receiveFromStreamAction = QAction("From &Stream...", self)
         loadFromPackageAction = QAction("&From Package...", self)
         loadFromMetadataAction.triggered.connect(self._loadTrialFromMetadataAction)
+        followMetadataAction.triggered.connect(self._followTrialFromMetadataAction)
+        receiveFromStreamAction.triggered.connect(self._receiveTrialFromStreamAction)
         loadFromPackageAction.triggered.connect(self._loadTrialFromPackageAction)
         loadMenu.addAction(loadFromMetadataAction)
+        loadMenu.addAction(followMetadataAction)
+        loadMenu.addAction(receiveFromStreamAction)
         loadMenu.addAction(loadFromPackageAction)
         trialMenu.addMenu(loadMenu)
         menuBar.addMenu(trialMenu)
@@ -58,20 +69,43 @@ class MainWindow(QMainWindow):
         trialMenu.addAction(loadAction)
         menuBar.addMenu(trialMenu)
 
+    def _createToolsMenu(self):
+        menuBar = self.menuBar()
+        toolsMenu = QMenu("T&ools", self)
+
+        memoryReportAction = QAction("&Memory Report...", self)
+        memoryReportAction.triggered.connect(self._memoryReportAction)
+        toolsMenu.addAction(memoryReportAction)
+        menuBar.addMenu(toolsMenu)
+
     def _loadTrialFromMetadataAction(self, value):
-        filepath = QFileDialog.getOpenFileName(self, "Select Metadata File", ".", "Metadata File (*.metadata)")[0]
+        filepath = QFileDialog.getOpenFileName(self, "Select Metadata File", ".", MainWindow.METADATA_FILE_FILTER)[0]
         if self._tomcatWidget.loadTrialFromMetadata(filepath):
             self._dumpAction.setEnabled(True)
 
+    def _followTrialFromMetadataAction(self, value):
+        filepath = QFileDialog.getOpenFileName(self, "Select Metadata File", ".", "Metadata File (*.metadata)")[0]
+        if self._tomcatWidget.followTrialFromMetadata(filepath):
+            self._dumpAction.setEnabled(True)
+
+    def _receiveTrialFromStreamAction(self, value):
+        address, ok = QInputDialog.getText(self, "Listen for Messages", "Address (host:port or socket path):",
+                                           text=MessageStreamServer.DEFAULT_ADDRESS)
+        if ok and self._tomcatWidget.receiveTrialFromStream(address):
+            self._dumpAction.setEnabled(True)
+
     def _loadTrialFromPackageAction(self, value):
-        filepath = QFileDialog.getOpenFileName(self, "Select Package File", ".", "Package File (*.pkl)")[0]
+        filepath = QFileDialog.getOpenFileName(self, "Select Package File", ".", "Package File (*.trial *.pkl)")[0]
         if self._tomcatWidget.loadTrialFromPackage(filepath):
             self._dumpAction.setEnabled(True)
 
     def _dumpTrialAction(self, value):
-        filepath = QFileDialog.getSaveFileName(self, "Save Package File", ".", "Package File (*.pkl)")[0]
+        filepath = QFileDialog.getSaveFileName(self, "Save Package File", ".", "Package File (*.trial)")[0]
         self._tomcatWidget.dumpTrial(filepath)
 
     def _loadEstimatesAction(self):
         filepath = QFileDialog.getOpenFileName(self, "Select Estimates File", ".", "Package File (*.json)")[0]
         self._tomcatWidget.loadEstimates(filepath)
+
+    def _memoryReportAction(self):
+        MemoryReportDialog(self._tomcatWidget.getMemoryReport, self).exec_()
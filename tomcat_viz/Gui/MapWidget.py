@@ -1,15 +1,17 @@
 from enum import Enum
-from typing import Dict, List
+from typing import Any, Dict, List
 import csv
 from pkg_resources import resource_stream
 import codecs
 
 from PyQt5.QtWidgets import QWidget
-from PyQt5.Qt import Qt, QGraphicsView, QPainterPath, QPen, QGraphicsItem
+from PyQt5.Qt import Qt, QGraphicsView, QPainterPath, QPen, QGraphicsItem, QPointF
 
 from tomcat_viz.Common.Format import secondsToTime
 from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Memory import MemoryCounter
 from tomcat_viz.Gui.CustomScene import CustomScene
+from tomcat_viz.Gui.StampedRectItem import StampedRectItem
 from tomcat_viz.Parser.Map import Map
 from tomcat_viz.Parser.Trial import Trial, Position, Victim
 
@@ -29,6 +31,18 @@ class MapWidget(QWidget):
         NEXT = 0
         PREVIOUS = 1
 
+    # Approximate memory of the Qt side of the scene items, measured from the growth of the resident memory when items
+    # are created (see benchmarks/scene_item_memory.py). Stamped blocks (e.g. markers) have a text item with its own
+    # text document. Entries of getMemoryFootprint that use them are flagged as estimated.
+    ESTIMATED_ITEM_BYTES = 1100
+    ESTIMATED_STAMPED_ITEM_BYTES = 18000
+    # Size of an element of a painter path (coordinates and type)
+    PATH_ELEMENT_BYTES = 24
+
+    # Caches of items reported by getMemoryFootprint, in the order they are measured
+    ITEM_CACHES = ["_addedPlayerItems", "_removedPlayerItems", "_addedBlockItems", "_removedBlockItems",
+                   "_markerItems", "_rubbleItems", "_victimItems"]
+
     def __init__(self, width: int, height: int, blockSize: int = 10, playerSize: int = 8):
         super().__init__()
         self._blockSize = blockSize
@@ -45,6 +59,13 @@ class MapWidget(QWidget):
 
         self._lastDrawnTimeStep = -1
         self._maxDrawnTimeStep = -1
+        # Items are cached from this time step on. It changes when the map is redrawn from a keyframe.
+        self._firstCachedTimeStep = 0
+        # Items shown in the first cached time step per kind of object and position, if it's not the first time step.
+        # They are used to extend the cache backwards, along with the number of elements of each player path that are
+        # not collapsed at the end of the path (see _createPathsBefore).
+        self._firstCachedBlockItems: Dict[str, Dict[Position, QGraphicsItem]] = {}
+        self._firstCachedPathLengths: List[int] = []
 
         # List of scene objects and actions (addition or removal) over time
         # Every time step will store a collection of scene object actions.
@@ -57,10 +78,10 @@ class MapWidget(QWidget):
 
         # Items added and removed to/from the scene per time step. It will cache the objects so we don't need to
         # recreate then if we go forth, back and forth
-        self._addedPlayerItems = [[]]
-        self._removedPlayerItems = [[]]
-        self._addedBlockItems = [[]]
-        self._removedBlockItems = [[]]
+        self._addedPlayerItems: Dict[int, List[QGraphicsItem]] = {0: []}
+        self._removedPlayerItems: Dict[int, List[QGraphicsItem]] = {0: []}
+        self._addedBlockItems: Dict[int, List[QGraphicsItem]] = {0: []}
+        self._removedBlockItems: Dict[int, List[QGraphicsItem]] = {0: []}
 
         # Marker item drawn in a given position
         self._markerItems: Dict[Position, QGraphicsItem] = {}
@@ -86,8 +107,20 @@ class MapWidget(QWidget):
         self._placePlayersInTheMap()
         self._lastDrawnTimeStep = 0
         self._maxDrawnTimeStep = 0
+        self._firstCachedTimeStep = 0
+        self._firstCachedBlockItems = {}
+        self._firstCachedPathLengths = []
 
     def updateFor(self, timeStep: int):
+        if abs(timeStep - self._lastDrawnTimeStep) > Trial.KEYFRAME_INTERVAL:
+            # Redrawing the map from a keyframe is cheaper than going through all the time steps in between
+            self._seekTo(timeStep)
+            return
+
+        # Going back a few time steps after a seek only changes the objects affected by them
+        while timeStep < self._firstCachedTimeStep:
+            self._cachePreviousTimeStep()
+
         if timeStep > self._lastDrawnTimeStep:
             for t in range(self._lastDrawnTimeStep + 1, timeStep + 1):
                 self._drawTrajectoriesAt(t, True)
@@ -108,19 +141,167 @@ class MapWidget(QWidget):
         self._trial = None
         self._lastDrawnTimeStep = -1
         self._maxDrawnTimeStep = -1
+        self._firstCachedTimeStep = 0
+        self._firstCachedBlockItems = {}
+        self._firstCachedPathLengths = []
         self._sceneObjectActions: List[List[SceneObjectAction]] = [[]]
         self._currPlayersBlocks = []
         self._playersPaths = []
         self._playersPathItems = []
-        self._addedPlayerItems = [[]]
-        self._removedPlayerItems = [[]]
-        self._addedBlockItems = [[]]
-        self._removedBlockItems = [[]]
+        self._addedPlayerItems = {0: []}
+        self._removedPlayerItems = {0: []}
+        self._addedBlockItems = {0: []}
+        self._removedBlockItems = {0: []}
         self._markerItems: Dict[Position, QGraphicsItem] = {}
         self._rubbleCounts: Dict[Position, int] = {}
         self._rubbleItems: Dict[Position, QGraphicsItem] = {}
         self._victimItems: Dict[Position, QGraphicsItem] = {}
 
+    def _seekTo(self, timeStep: int):
+        """
+        Redraws the objects and players in the map from the state of the world at a time step, which the trial
+        restores from its closest keyframe. Items cached for other time steps are discarded.
+        """
+
+        # Every item that can change over time was added in some time step. Plates never change, so they are kept.
+        cachedItems = {}
+        for itemsPerTimeStep in [self._addedBlockItems, self._removedBlockItems, self._addedPlayerItems,
+                                 self._removedPlayerItems]:
+            for items in itemsPerTimeStep.values():
+                for item in items:
+                    cachedItems[id(item)] = item
+        for item in cachedItems.values():
+            if item.scene() is not None:
+                self._scene.removeItem(item)
+
+        state = self._trial.stateAt(timeStep)
+        self._markerItems = {}
+        for position, markerType in state.markers.items():
+            self._markerItems[position] = self._scene.drawMarker(markerType, position.x, position.y, self._blockSize,
+                                                                 self._blockSize)
+        self._rubbleCounts = state.rubbleCounts
+        self._rubbleItems = {}
+        for position in state.rubbleCounts:
+            self._rubbleItems[position] = self._scene.drawRubble(position.x, position.y, self._blockSize,
+                                                                 self._blockSize)
+        self._victimItems = {}
+        for position, victimType in state.victims.items():
+            item = self._drawVictim(victimType, position)
+            if item is not None:
+                self._victimItems[position] = item
+        missingVictimItems = []
+        for position in state.missingVictims:
+            missingVictimItems.append(
+                self._scene.drawMissingVictim(position.x, position.y, self._blockSize, self._blockSize))
+
+        # Items of the time step are never removed when going back, as it is the first cached time step
+        self._addedBlockItems = {timeStep: (list(self._markerItems.values()) + list(self._rubbleItems.values()) +
+                                            list(self._victimItems.values()) + missingVictimItems)}
+        self._removedBlockItems = {timeStep: []}
+        self._addedPlayerItems = {timeStep: self._createPlayerItemsAt(timeStep)}
+        self._removedPlayerItems = {timeStep: []}
+        self._playersPaths = {timeStep: self._createPathsFromStart(timeStep)}
+        for i, path in enumerate(self._playersPaths[timeStep]):
+            self._playersPathItems[i].setPath(path)
+        self._firstCachedPathLengths = [path.elementCount() for path in self._playersPaths[timeStep]]
+
+        self._firstCachedBlockItems = {"markers": dict(self._markerItems), "rubble": dict(self._rubbleItems),
+                                       "victims": dict(self._victimItems),
+                                       "missingVictims": dict(zip(state.missingVictims, missingVictimItems))}
+        self._firstCachedTimeStep = timeStep
+        self._lastDrawnTimeStep = timeStep
+        self._maxDrawnTimeStep = timeStep
+
+    def _cachePreviousTimeStep(self):
+        """
+        Caches the items of the time step before the first cached one. Only the objects that changed between both time
+        steps get new items, and the paths of the players are derived from the ones of the first cached time step.
+        Items are created out of the scene. They are added when the map goes back to their time step.
+        """
+
+        timeStep = self._firstCachedTimeStep
+        previousTimeStep = timeStep - 1
+        blockItems = self._firstCachedBlockItems
+        diff = self._trial.diff(previousTimeStep, timeStep)
+
+        addedItems = []
+        removedItems = []
+        for kind, changes in [("markers", diff.markers), ("rubble", diff.rubbleCounts), ("victims", diff.victims),
+                              ("missingVictims", diff.missingVictims)]:
+            for position, (before, after) in changes.items():
+                if kind == "rubble" and before is not None and after is not None:
+                    # Stacked rubble is drawn as a single item whatever its count
+                    continue
+
+                item = blockItems[kind].pop(position, None)
+                if item is not None:
+                    addedItems.append(item)
+                if before is not None:
+                    item = self._drawBlockItem(kind, before, position)
+                    if item is not None:
+                        self._scene.removeItem(item)
+                        blockItems[kind][position] = item
+                        removedItems.append(item)
+
+        # Items of the previous time step are never removed when going back, as it is the first cached time step now
+        self._addedBlockItems[previousTimeStep] = [item for items in blockItems.values() for item in items.values()]
+        self._removedBlockItems[previousTimeStep] = []
+        self._addedBlockItems[timeStep] = addedItems
+        self._removedBlockItems[timeStep] = removedItems
+
+        playerItems = self._createPlayerItemsAt(previousTimeStep)
+        for item in playerItems:
+            self._scene.removeItem(item)
+        self._addedPlayerItems[previousTimeStep] = playerItems
+        self._removedPlayerItems[previousTimeStep] = []
+        self._removedPlayerItems[timeStep] = playerItems
+        self._playersPaths[previousTimeStep] = self._createPathsBefore(timeStep)
+
+        self._firstCachedTimeStep = previousTimeStep
+
+    def _drawBlockItem(self, kind: str, value: Any, position: Position) -> QGraphicsItem:
+        if kind == "markers":
+            return self._scene.drawMarker(value, position.x, position.y, self._blockSize, self._blockSize)
+        elif kind == "rubble":
+            return self._scene.drawRubble(position.x, position.y, self._blockSize, self._blockSize)
+        elif kind == "victims":
+            return self._drawVictim(value, position)
+        else:
+            return self._scene.drawMissingVictim(position.x, position.y, self._blockSize, self._blockSize)
+
+    def getMemoryFootprint(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Estimates the memory retained by the caches of scene items and player paths. Python containers are measured
+        (see MemoryCounter) and the memory of the Qt objects is estimated from their number. Items cached in more than
+        one place are counted in the first cache that has them.
+        """
+
+        counter = MemoryCounter()
+        countedItems = set()
+        footprint = {}
+        for name in MapWidget.ITEM_CACHES:
+            cache = getattr(self, name)
+            numBytes = counter.measure(cache)[0]
+            numItems = 0
+            for value in cache.values():
+                for item in value if isinstance(value, list) else [value]:
+                    numItems += 1
+                    if id(item) not in countedItems:
+                        countedItems.add(id(item))
+                        numBytes += (MapWidget.ESTIMATED_STAMPED_ITEM_BYTES if isinstance(item, StampedRectItem) else
+                                     MapWidget.ESTIMATED_ITEM_BYTES)
+            footprint[name.lstrip("_")] = {"bytes": numBytes, "items": numItems, "time_steps": len(cache),
+                                           "estimated": True}
+
+        # Every time step has a full copy of the paths up to it
+        paths = self._playersPaths.values() if isinstance(self._playersPaths, dict) else []
+        numElements = sum(path.elementCount() for timeStepPaths in paths for path in timeStepPaths)
+        footprint["playersPaths"] = {"bytes": counter.measure(self._playersPaths)[0] + numElements *
+                                     MapWidget.PATH_ELEMENT_BYTES, "items": numElements,
+                                     "time_steps": len(self._playersPaths), "estimated": True}
+
+        return footprint
+
     def _drawWallsAndDoors(self):
         for i in range(self._map.grid.shape[0]):
             for j in range(self._map.grid.shape[1]):
@@ -132,9 +313,6 @@ class MapWidget(QWidget):
                     self._scene.drawEmptyBlock(j, i, self._blockSize, self._blockSize)
 
     def _drawInitialObjects(self):
-        self._addedBlockItems.append([])
-        self._removedBlockItems.append([])
-
         self._drawInitialVictims()
         self._drawInitialRubble()
         self._drawInitialRubbleCollapsePlates()
@@ -174,9 +352,7 @@ class MapWidget(QWidget):
 
     def _drawInitialRubbleCollapsePlates(self):
         for platePosition in self._trial.threatPlateList:
-            item = self._scene.drawRubbleCollapseBlock(platePosition.x, platePosition.y, self._blockSize,
-                                                       self._blockSize)
-            self._addedBlockItems[0].append(item)
+            self._scene.drawRubbleCollapseBlock(platePosition.x, platePosition.y, self._blockSize, self._blockSize)
 
     def _drawInitialVictimSignalPlates(self):
         objects_resource = resource_stream("tomcat_viz.Resources.Maps", self._trial.metadata["map_block_filename"])
@@ -191,8 +367,7 @@ class MapWidget(QWidget):
             x = int(coordinates[0]) - self._map.metadata["min_x"]
             y = int(coordinates[2]) - self._map.metadata["min_y"]
             if row[1] == "block_signal_victim":
-                item = self._scene.drawVictimSignalBlock(x, y, self._blockSize, self._blockSize)
-                self._addedBlockItems[0].append(item)
+                self._scene.drawVictimSignalBlock(x, y, self._blockSize, self._blockSize)
 
     def _placePlayersInTheMap(self):
         self._drawPlayersAt(0, True)
@@ -201,9 +376,8 @@ class MapWidget(QWidget):
     def _drawPlayersAt(self, timeStep: int, forward: bool):
         if forward:
             if timeStep > self._maxDrawnTimeStep:
-                if len(self._addedPlayerItems) == timeStep:
-                    self._addedPlayerItems.append([])
-                    self._removedPlayerItems.append([])
+                self._addedPlayerItems[timeStep] = []
+                self._removedPlayerItems[timeStep] = []
 
                 # Remove player items from previous time step
                 if timeStep >= 1:
@@ -287,14 +461,14 @@ class MapWidget(QWidget):
             self._scene.addPath(bluePath, bluePen)
         ]
 
-        self._playersPaths = [[redPath, greenPath, bluePath]]
+        self._playersPaths = {0: [redPath, greenPath, bluePath]}
 
     def _drawTrajectoriesAt(self, timeStep: int, forward: bool):
         if forward:
             if timeStep > self._maxDrawnTimeStep:
                 # Create a new path extending from the previous one
                 paths = self._createPathTo(timeStep)
-                self._playersPaths.append(paths)
+                self._playersPaths[timeStep] = paths
             else:
                 # Reuse previously created path
                 paths = self._playersPaths[timeStep]
@@ -318,12 +492,53 @@ class MapWidget(QWidget):
 
         return paths
 
+    def _createPathsFromStart(self, timeStep: int):
+        paths = []
+        for timedPositions in self._trial.playersPositions:
+            path = QPainterPath()
+            start = timedPositions[0][0]
+            path.moveTo(self._blockSize * (start.x + 0.5), self._blockSize * (start.y + 0.5))
+            # Like in the trajectories drawn step by step, only the first position of the first time step is used
+            end = timedPositions.offsets[timeStep + 1]
+            for x, y in timedPositions.coordinates[timedPositions.offsets[1]:end].tolist():
+                path.lineTo(self._blockSize * (x + 0.5), self._blockSize * (y + 0.5))
+            paths.append(path)
+
+        return paths
+
+    def _createPathsBefore(self, timeStep: int):
+        # A path ends with the elements of the positions of its time step, except the ones that painter paths drop
+        # because they repeat the last point. Elements cannot be removed from a painter path, so the ones of the time
+        # step are moved to the last point before it, which draws the same trajectory.
+        paths = []
+        for i, timedPositions in enumerate(self._trial.playersPositions):
+            previousPositions = timedPositions[timeStep - 1]
+            lastPoint = self._toScenePoint(previousPositions[0] if timeStep == 1 else previousPositions[-1])
+            numElements = 0
+            for position in timedPositions[timeStep]:
+                point = self._toScenePoint(position)
+                if point != lastPoint:
+                    numElements += 1
+                    lastPoint = point
+
+            path = QPainterPath(self._playersPaths[timeStep][i])
+            lastIndex = self._firstCachedPathLengths[i] - numElements - 1
+            self._firstCachedPathLengths[i] = lastIndex + 1
+            last = path.elementAt(lastIndex)
+            for j in range(lastIndex + 1, path.elementCount()):
+                path.setElementPositionAt(j, last.x, last.y)
+            paths.append(path)
+
+        return paths
+
+    def _toScenePoint(self, position: Position) -> QPointF:
+        return QPointF(self._blockSize * (position.x + 0.5), self._blockSize * (position.y + 0.5))
+
     def _drawBlocks(self, timeStep: int, forward: bool):
         if forward:
             if timeStep > self._maxDrawnTimeStep:
-                if len(self._addedBlockItems) == timeStep:
-                    self._addedBlockItems.append([])
-                    self._removedBlockItems.append([])
+                self._addedBlockItems[timeStep] = []
+                self._removedBlockItems[timeStep] = []
 
                 self._drawMarkers(timeStep)
                 self._drawRubble(timeStep)
@@ -372,7 +587,7 @@ class MapWidget(QWidget):
             self._addedBlockItems[timeStep].append(item)
 
     def _drawRubble(self, timeStep: int):
-        for position, count in self._trial.rubbleCounts[timeStep].items():
+        for position, count in self._trial.rubbleCounts[timeStep]:
             if position in self._rubbleCounts:
                 self._rubbleCounts[position] += count
 
@@ -432,7 +647,9 @@ class MapWidget(QWidget):
             else:
                 print(
                     f"[{secondsToTime(timeStep)}]: Rescuing victim {victim.victimType} at {victim.position} not found.")
-                self._scene.drawMissingVictim(victim.position.x, victim.position.y, self._blockSize, self._blockSize)
+                item = self._scene.drawMissingVictim(victim.position.x, victim.position.y, self._blockSize,
+                                                     self._blockSize)
+                self._addedBlockItems[timeStep].append(item)
 
     def _drawPickedUpVictims(self, timeStep: int):
         for victim in self._trial.pickedUpVictims[timeStep]:
@@ -445,29 +662,36 @@ class MapWidget(QWidget):
             else:
                 print(
                     f"[{secondsToTime(timeStep)}]: Picking up victim {victim.victimType} at {victim.position} not found.")
-                self._scene.drawMissingVictim(victim.position.x, victim.position.y, self._blockSize, self._blockSize)
+                item = self._scene.drawMissingVictim(victim.position.x, victim.position.y, self._blockSize,
+                                                     self._blockSize)
+                self._addedBlockItems[timeStep].append(item)
 
     def _drawPlacedVictims(self, timeStep: int):
         for victim in self._trial.placedVictims[timeStep]:
-            item = None
-            if victim.victimType == Constants.VictimType.A:
-                item = self._scene.drawVictimA(victim.position.x, victim.position.y, self._blockSize,
-                                               self._blockSize)
-            elif victim.victimType == Constants.VictimType.B:
-                item = self._scene.drawVictimB(victim.position.x, victim.position.y, self._blockSize,
-                                               self._blockSize)
-            elif victim.victimType == Constants.VictimType.CRITICAL:
-                item = self._scene.drawCriticalVictim(victim.position.x, victim.position.y, self._blockSize,
-                                                      self._blockSize)
-            if victim.victimType == Constants.VictimType.SAFE_A:
-                item = self._scene.drawSafeVictimA(victim.position.x, victim.position.y, self._blockSize,
-                                                   self._blockSize)
-            elif victim.victimType == Constants.VictimType.SAFE_B:
-                item = self._scene.drawSafeVictimB(victim.position.x, victim.position.y, self._blockSize,
-                                                   self._blockSize)
-            elif victim.victimType == Constants.VictimType.SAFE_CRITICAL:
-                item = self._scene.drawSafeCriticalVictim(victim.position.x, victim.position.y, self._blockSize,
-                                                          self._blockSize)
+            item = self._drawVictim(victim.victimType, victim.position)
             if item is not None:
+                if victim.position in self._victimItems:
+                    # Remove the victim that was in the position before
+                    oldItem = self._victimItems[victim.position]
+                    self._scene.removeItem(oldItem)
+                    self._removedBlockItems[timeStep].append(oldItem)
+
                 self._victimItems[victim.position] = item
                 self._addedBlockItems[timeStep].append(item)
+
+    def _drawVictim(self, victimType: Constants.VictimType, position: Position) -> QGraphicsItem:
+        item = None
+        if victimType == Constants.VictimType.A:
+            item = self._scene.drawVictimA(position.x, position.y, self._blockSize, self._blockSize)
+        elif victimType == Constants.VictimType.B:
+            item = self._scene.drawVictimB(position.x, position.y, self._blockSize, self._blockSize)
+        elif victimType == Constants.VictimType.CRITICAL:
+            item = self._scene.drawCriticalVictim(position.x, position.y, self._blockSize, self._blockSize)
+        elif victimType == Constants.VictimType.SAFE_A:
+            item = self._scene.drawSafeVictimA(position.x, position.y, self._blockSize, self._blockSize)
+        elif victimType == Constants.VictimType.SAFE_B:
+            item = self._scene.drawSafeVictimB(position.x, position.y, self._blockSize, self._blockSize)
+        elif victimType == Constants.VictimType.SAFE_CRITICAL:
+            item = self._scene.drawSafeCriticalVictim(position.x, position.y, self._blockSize, self._blockSize)
+
+        return item
@@ -0,0 +1,57 @@
+from typing import Any, Callable, Dict
+import json
+import time
+
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtWidgets import QDialog, QFileDialog, QHBoxLayout, QPlainTextEdit, QPushButton, QVBoxLayout
+
+from tomcat_viz.Common.Memory import formatMemoryReport
+
+
+class MemoryReportDialog(QDialog):
+    """
+    This dialog shows the memory report of the visualizer. The report can be refreshed (e.g. after moving through the
+    trial, which fills the caches of the map) and saved as json to compare it with the ones of other versions. Rows
+    that include Qt objects are rough estimates and are marked as such.
+    """
+
+    def __init__(self, getReport: Callable[[], Dict[str, Dict[str, Dict[str, Any]]]], parent=None):
+        super().__init__(parent)
+        self._getReport = getReport
+        self._report = None
+
+        self.setWindowTitle("Memory Report")
+        self.resize(760, 640)
+
+        self._reportText = QPlainTextEdit()
+        self._reportText.setReadOnly(True)
+        self._reportText.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+
+        refreshButton = QPushButton("&Refresh")
+        saveButton = QPushButton("&Save as JSON...")
+        closeButton = QPushButton("&Close")
+        refreshButton.clicked.connect(self._refresh)
+        saveButton.clicked.connect(self._save)
+        closeButton.clicked.connect(self.accept)
+
+        buttonsLayout = QHBoxLayout()
+        buttonsLayout.addWidget(refreshButton)
+        buttonsLayout.addWidget(saveButton)
+        buttonsLayout.addStretch()
+        buttonsLayout.addWidget(closeButton)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._reportText)
+        layout.addLayout(buttonsLayout)
+
+        self._refresh()
+
+    def _refresh(self):
+        self._report = self._getReport()
+        self._reportText.setPlainText(formatMemoryReport(self._report))
+
+    def _save(self):
+        filepath = QFileDialog.getSaveFileName(self, "Save Memory Report", ".", "JSON File (*.json)")[0]
+        if filepath != "":
+            with open(filepath, "w") as f:
+                json.dump({"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "report": self._report}, f, indent=2)
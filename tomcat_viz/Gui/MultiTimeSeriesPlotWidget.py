@@ -1,9 +1,10 @@
-from typing import Callable, List
+from typing import Callable, Dict, List
 
 from PyQt5.QtWidgets import QVBoxLayout, QLineEdit
 from PyQt5.QtWidgets import QWidget
 
 from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Memory import MemoryCounter
 from tomcat_viz.Gui.TimeSeriesPlotWidget import TimeSeriesPlotWidget
 from tomcat_viz.Gui.Utils import createHorizontalSeparator
 from tomcat_viz.Parser.Estimates import TimeSeries
@@ -57,6 +58,14 @@ class MultiTimeSeriesPlotWidget(QWidget):
     def setLegendToggleCallback(self, callback: Callable):
         self._onLegendToggleCallback = callback
 
+    def measureMemory(self, counter: MemoryCounter) -> Dict[str, int]:
+        footprint = {"plots": len(self._plotWidgets)}
+        for plotWidget in self._plotWidgets:
+            for name, numBytes in plotWidget.measureMemory(counter).items():
+                footprint[name] = footprint.get(name, 0) + numBytes
+
+        return footprint
+
     def setSearchChangeCallback(self, callback: Callable):
         self._onSearchChangeCallback = callback
 
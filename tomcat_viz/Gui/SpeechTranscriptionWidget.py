@@ -1,6 +1,7 @@
 from typing import List, Tuple
 
 from tomcat_viz.Gui.TextMessageWidget import TextMessageWidget
+from tomcat_viz.Parser.Trial import ChatMessage
 
 
 class SpeechTranscriptionWidget(TextMessageWidget):
@@ -8,11 +9,13 @@ class SpeechTranscriptionWidget(TextMessageWidget):
     def __init__(self):
         super().__init__()
 
-    def _messagesToHTMLTableLines(self, messages: List[Tuple[str, int, str]]):
+    def _messagesToHTMLTableLines(self, messages: List[Tuple[ChatMessage, int, List[str]]]):
         tableLines = []
-        for text, timer, textColor in messages:
+        for transcription, timer, speakerColors in messages:
+            # Transcriptions concern their speaker only
+            textColor = speakerColors[0] if len(speakerColors) > 0 else "black"
             row = f"<tr><td><span style = 'color: {textColor}; font-weight: bold'>[{timer}]:</span></td>" \
-                  f"<td><span style = 'color: {textColor};'>{text}</span></td></tr>"
+                  f"<td><span style = 'color: {textColor};'>{transcription.text}</span></td></tr>"
             tableLines.append(row)
 
         return tableLines
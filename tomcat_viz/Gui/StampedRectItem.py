@@ -7,3 +7,7 @@ class StampedRectItem(QGraphicsItem):
         super().__init__()
         self.rectItem = rectItem
         self.textItem = textItem
+
+    def scene(self):
+        # The item itself is never added to a scene, only its parts (see CustomScene)
+        return self.rectItem.scene()
@@ -1,8 +1,10 @@
-from typing import List, Tuple, Collection, Any
+from typing import List, Tuple, Any
 
 from PyQt5.QtWidgets import QTextEdit
 
+from tomcat_viz.Common.Constants import Constants
 from tomcat_viz.Common.Format import secondsToTime
+from tomcat_viz.Parser.Columnar import MessageTable
 
 
 class TextMessageWidget(QTextEdit):
@@ -15,22 +17,16 @@ class TextMessageWidget(QTextEdit):
         self._htmlTableLines = []
         self._numTableLinesPerTime = []
 
-        self._redMessages = []
-        self._greenMessages = []
-        self._blueMessages = []
+        self._messages = MessageTable()
 
         self._lastDrawnTimeStep = -1
 
     def updateFor(self, timeStep: int):
         if timeStep > self._lastDrawnTimeStep:
             for t in range(self._lastDrawnTimeStep + 1, timeStep + 1):
-                messages = []
-                for message in self._redMessages[t]:
-                    messages.append((message, secondsToTime(t), "red"))
-                for message in self._greenMessages[t]:
-                    messages.append((message, secondsToTime(t), "green"))
-                for message in self._blueMessages[t]:
-                    messages.append((message, secondsToTime(t), "blue"))
+                # Each message is shown once, with the colors of the players it concerns
+                messages = [(message, secondsToTime(t), TextMessageWidget._getPlayerColors(message.addressees)) for
+                            message in self._messages[t]]
                 self._htmlTableLines.extend(self._messagesToHTMLTableLines(messages))
                 self._numTableLinesPerTime.append(len(messages))
         else:
@@ -44,10 +40,8 @@ class TextMessageWidget(QTextEdit):
         self.setHtml(self._getHtmlContent())
         self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
 
-    def loadMessages(self, redMessages: List[Collection[Any]], greenMessages: List[Collection[Any]], blueMessages: List[Collection[Any]]):
-        self._redMessages = redMessages
-        self._greenMessages = greenMessages
-        self._blueMessages = blueMessages
+    def loadMessages(self, messages: MessageTable):
+        self._messages = messages
         self._lastDrawnTimeStep = 0
         self._htmlTableLines = []
         self._numTableLinesPerTime = []
@@ -57,8 +51,12 @@ class TextMessageWidget(QTextEdit):
         html = f"<html><body>{tableHtml}</body></html>"
         return html
 
-    def _messagesToHTMLTableLines(self, messages: List[Tuple[Any, int, str]]):
+    def _messagesToHTMLTableLines(self, messages: List[Tuple[Any, int, List[str]]]):
         # To be implemented by the subclasses
         return []
 
+    @staticmethod
+    def _getPlayerColors(players: int) -> List[str]:
+        return [player.name.lower() for player in Constants.Player if players & (1 << player.value)]
+
 
@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Dict
 
 from PyQt5.Qt import Qt
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QGridLayout
@@ -6,6 +6,7 @@ from pyqtgraph import PlotWidget, mkPen, mkColor, mkBrush
 
 from tomcat_viz.Common.Constants import Constants
 from tomcat_viz.Common.Format import secondsToTime
+from tomcat_viz.Common.Memory import MemoryCounter
 from tomcat_viz.Gui.PlotLegendWidget import PlotLegendWidget
 from tomcat_viz.Parser.Estimates import TimeSeries
 
@@ -58,6 +59,18 @@ class TimeSeriesPlotWidget(QWidget):
     def setLegendToggleCallback(self, callback: Callable):
         self._legendToggleCallback = callback
 
+    def measureMemory(self, counter: MemoryCounter) -> Dict[str, int]:
+        """
+        Measures the memory retained by the series, the time steps and the data of the plot items of the widget.
+        """
+
+        plotData = [data for dataItem in [self._baselineDataItem] + self._dataItems for data in dataItem.getData()]
+        return {
+            "series": counter.measure(self._series)[0],
+            "times": counter.measure(self._times)[0],
+            "plot_data": counter.measure(plotData)[0]
+        }
+
     def toggleLegend(self, legendIndex: int):
         self._legendWidgets[legendIndex].toggleLegend()
 
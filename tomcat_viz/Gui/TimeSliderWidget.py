@@ -26,6 +26,12 @@ class TimeSliderWidget(QWidget):
         self._timeSlider.setRange(0, timeSteps - 1)
         self._updateTimerLabel(0)
 
+    def extendTimeSteps(self, timeSteps: int):
+        # Keeps the current time step, as opposed to setTimeSteps
+        self._timeSlider.setRange(0, timeSteps - 1)
+        self._updateButtonsState(self._timeSlider.value())
+        self._updateTimerLabel(self._timeSlider.value())
+
     def reset(self):
         self._timeSlider.setValue(0)
 
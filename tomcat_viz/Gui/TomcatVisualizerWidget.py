@@ -1,9 +1,14 @@
+from typing import Any, Dict
+
 from PyQt5.Qt import Qt, QPalette, QColor
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout
 from PyQt5.QtWidgets import QSplitter
 from PyQt5.QtWidgets import QWidget
 
 from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Files import openFile
+from tomcat_viz.Common.Memory import getResidentMemory
 from tomcat_viz.Gui.DockEstimates import DockEstimates
 from tomcat_viz.Gui.HeaderWidget import HeaderWidget
 from tomcat_viz.Gui.MapWidget import MapWidget
@@ -12,12 +17,20 @@ from tomcat_viz.Gui.ChatWidget import ChatWidget
 from tomcat_viz.Gui.TimeSliderWidget import TimeSliderWidget
 from tomcat_viz.Gui.Utils import createLabel
 from tomcat_viz.Parser.Estimates import Estimates
+from tomcat_viz.Parser.MessageStream import MessageStreamServer
+from tomcat_viz.Parser.MetadataReader import FileTail
+from tomcat_viz.Parser.ParseCache import ParseCache
 from tomcat_viz.Parser.Trial import Trial
+from tomcat_viz.Parser.TrialFollower import TrialFollower
 
 
 class TomcatVisualizerWidget(QWidget):
     LEFT_PANEL_PROP = 80
     MAP_HEIGHT_PROP = 80
+    # Interval (in milliseconds) between reads of a followed .metadata file
+    FOLLOW_INTERVAL = 1000
+    # Interval (in milliseconds) between reads of the messages received from a stream
+    STREAM_INTERVAL = 200
 
     def __init__(self):
         super().__init__()
@@ -32,22 +45,82 @@ class TomcatVisualizerWidget(QWidget):
         self._configureLayout()
 
         self._trial = None
+        self._parseCache = ParseCache()
+
+        self._followTimer = QTimer()
+        self._followTimer.timeout.connect(self._onFollowTimeout)
+        self._follower = None
+        self._numFollowedTimeSteps = 0
 
     def loadTrialFromMetadata(self, filepath: str):
         if filepath != "":
-            with open(filepath, "r") as f:
-                self._trial = Trial()
-                self._trial.parse(f)
+            self._stopFollowing()
+            self._trial = Trial()
+            if not self._parseCache.load(self._trial, filepath):
+                # Compressed files are decompressed as they are parsed
+                with openFile(filepath, "r") as f:
+                    self._trial.parse(f)
+                if self._trial.numBadLines > 0:
+                    print(f"Skipped {self._trial.numBadLines} bad json line(s) of {filepath}")
+                try:
+                    self._parseCache.store(self._trial, filepath)
+                except Exception as e:
+                    # The cache is optional. The parsed trial is shown anyway.
+                    print(f"Could not store {filepath} in the parse cache: {e}")
             self._initializeTrial()
             return True
 
         return False
 
+    def followTrialFromMetadata(self, filepath: str):
+        """
+        Shows a trial from a .metadata file that is still being written. The lines appended to the file are parsed
+        periodically and the time slider is extended as new time steps arrive.
+        """
+
+        if filepath != "":
+            self._stopFollowing()
+            self._trial = Trial()
+            self._follower = TrialFollower(self._trial, FileTail(filepath))
+            self._numFollowedTimeSteps = 0
+            self._followTimer.start(TomcatVisualizerWidget.FOLLOW_INTERVAL)
+            return True
+
+        return False
+
+    def receiveTrialFromStream(self, address: str):
+        """
+        Shows a trial from testbed messages sent as json lines to a TCP (host:port) or Unix socket (path). Received
+        messages are parsed periodically, like in follow mode.
+        """
+
+        if address != "":
+            self._stopFollowing()
+            server = MessageStreamServer(address)
+            try:
+                server.start()
+            except OSError as e:
+                print(f"Could not listen on {address}: {e}")
+                return False
+
+            self._trial = Trial()
+            self._follower = TrialFollower(self._trial, server)
+            self._numFollowedTimeSteps = 0
+            self._followTimer.start(TomcatVisualizerWidget.STREAM_INTERVAL)
+            return True
+
+        return False
+
     def loadTrialFromPackage(self, filepath: str):
         if filepath != "":
+            self._stopFollowing()
             self._trial = Trial()
             self._trial.load(filepath)
             self._initializeTrial()
+
+            # Sections of the package are created as the widgets read them. What is left is created in the
+            # background once the first frame is shown, so moving through the trial is not slowed down later.
+            QTimer.singleShot(0, self._trial.preloadInBackground)
             return True
 
         return False
@@ -61,7 +134,26 @@ class TomcatVisualizerWidget(QWidget):
             self._estimatesWidget.loadEstimates(Estimates(filepath))
             self._estimatesWidget.updateFor(self._timeSlider.value())
 
+    def getMemoryReport(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Breaks down the memory retained by the trial and the caches of the map and estimates widgets. The result can be
+        formatted with formatMemoryReport.
+        """
+
+        report = {}
+        if self._trial is not None:
+            report["trial"] = self._trial.getMemoryFootprint()
+        report["map widget"] = self._mapWidget.getMemoryFootprint()
+        report["estimates"] = self._estimatesWidget.getMemoryFootprint()
+
+        residentMemory = getResidentMemory()
+        if residentMemory is not None:
+            report["process"] = {"resident": {"bytes": residentMemory}}
+
+        return report
+
     def closeApp(self):
+        self._stopFollowing()
         self._estimatesWidget.close()
 
     def _createWidgets(self):
@@ -130,20 +222,36 @@ class TomcatVisualizerWidget(QWidget):
         self._speechWidget.updateFor(newTimeStep)
         self._estimatesWidget.updateFor(newTimeStep)
 
-    def _initializeTrial(self):
+    def _onFollowTimeout(self):
+        numTimeSteps = self._follower.update()
+        if numTimeSteps > self._numFollowedTimeSteps:
+            if self._numFollowedTimeSteps == 0:
+                self._initializeTrial(numTimeSteps)
+            else:
+                self._timeSlider.extendTimeSteps(numTimeSteps)
+            self._numFollowedTimeSteps = numTimeSteps
+
+        if not self._follower.isFollowing:
+            # The end of the trial was parsed
+            self._followTimer.stop()
+
+    def _stopFollowing(self):
+        self._followTimer.stop()
+        if self._follower is not None:
+            self._follower.stop()
+            self._follower = None
+
+    def _initializeTrial(self, timeSteps: int = None):
         self._mapWidget.reset()
         self._mapWidget.loadMap(self._trial.map)
 
         self._initializeHeaderInfo()
         self._mapWidget.loadTrial(self._trial)
-        self._chatWidget.loadMessages(self._trial.chatMessages[Constants.Player.RED.value],
-                                      self._trial.chatMessages[Constants.Player.GREEN.value],
-                                      self._trial.chatMessages[Constants.Player.BLUE.value])
-        self._speechWidget.loadMessages(self._trial.speechTranscriptions[Constants.Player.RED.value],
-                                        self._trial.speechTranscriptions[Constants.Player.GREEN.value],
-                                        self._trial.speechTranscriptions[Constants.Player.BLUE.value])
-
-        self._timeSlider.setTimeSteps(self._trial.timeSteps)
+        self._chatWidget.loadMessages(self._trial.chatMessages)
+        self._speechWidget.loadMessages(self._trial.speechTranscriptions)
+
+        # A followed trial starts with the time steps parsed so far
+        self._timeSlider.setTimeSteps(self._trial.timeSteps if timeSteps is None else timeSteps)
         self._timeSlider.reset()
         self._timeSlider.setEnabled(True)
 
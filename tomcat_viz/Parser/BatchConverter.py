@@ -0,0 +1,183 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from tomcat_viz.Common.Files import getFileHash, getFileStat, openFile, removeCompressionExtension
+from tomcat_viz.Parser.Trial import Trial
+
+
+class BatchConverter:
+    """
+    This class converts all the .metadata files in a directory (and its subdirectories) into trial packages, keeping
+    the directory structure. Files compressed with gzip, bzip2 or xz (e.g. trial.metadata.gz) are included and
+    decompressed as they are parsed. Files are converted in parallel by a pool of processes.
+
+    A manifest (manifest.json) in the output directory records, for each converted file, the hash of its content, the
+    version of the parser, the duration of the conversion, the number of lines that are not valid json and the path of
+    the package. A file is skipped if its content and the parser did not change since its last conversion. The manifest
+    is updated after every conversion, and packages are written to a temporary file before being moved to their final
+    path, so an interrupted batch can be resumed by running it again.
+    """
+
+    MANIFEST = "manifest.json"
+    METADATA_EXTENSION = ".metadata"
+    PACKAGE_EXTENSION = ".trial"
+
+    def __init__(self, inputDir: str, outputDir: str, numWorkers: int = 1):
+        self.inputDir = inputDir
+        self.outputDir = outputDir
+        self.numWorkers = numWorkers
+
+        self._manifestPath = os.path.join(outputDir, BatchConverter.MANIFEST)
+        self._entries = self._loadManifestEntries()
+
+    def run(self) -> Dict[str, List[str]]:
+        """
+        Converts the files that changed since the last run.
+
+        :return: relative paths of the converted, skipped and failed files.
+        """
+
+        summary = {"converted": [], "skipped": [], "failed": []}
+
+        pendingFiles = []
+        for relativePath in self._findMetadataFiles():
+            if self._isUnchanged(relativePath):
+                summary["skipped"].append(relativePath)
+            else:
+                pendingFiles.append(relativePath)
+
+        if len(pendingFiles) == 0:
+            return summary
+
+        # Processes are spawned rather than forked so workers don't inherit the state of the caller
+        with ProcessPoolExecutor(max_workers=self.numWorkers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {}
+            for relativePath in pendingFiles:
+                entry = self._entries.get(relativePath, {})
+                knownHash = entry.get("source_hash", None) if self._isUpToDate(entry) else None
+                future = executor.submit(convertMetadataFile, os.path.join(self.inputDir, relativePath),
+                                         os.path.join(self.outputDir, self._getPackagePath(relativePath)), knownHash)
+                futures[future] = relativePath
+
+            for future in as_completed(futures):
+                relativePath = futures[future]
+                result = future.result()
+                if result["status"] == "failed":
+                    print(f"Failed to convert {relativePath}: {result['error']}")
+                    summary["failed"].append(relativePath)
+                    continue
+
+                if result["status"] == "converted":
+                    self._entries[relativePath] = {
+                        "source_hash": result["source_hash"],
+                        "parser_version": Trial.PARSER_VERSION,
+                        "duration": result["duration"],
+                        "bad_lines": result["bad_lines"],
+                        "output_path": self._getPackagePath(relativePath)
+                    }
+                    summary["converted"].append(relativePath)
+                    if result["bad_lines"] > 0:
+                        print(f"Skipped {result['bad_lines']} bad json line(s) of {relativePath}")
+                else:
+                    summary["skipped"].append(relativePath)
+
+                # Size and modification time let the next run skip unchanged files without hashing them
+                self._entries[relativePath]["source_stat"] = result["source_stat"]
+                self._saveManifest()
+
+        return summary
+
+    def _findMetadataFiles(self) -> List[str]:
+        relativePaths = []
+        for directory, _, filenames in os.walk(self.inputDir):
+            for filename in filenames:
+                if removeCompressionExtension(filename).endswith(BatchConverter.METADATA_EXTENSION):
+                    relativePaths.append(os.path.relpath(os.path.join(directory, filename), self.inputDir))
+
+        return sorted(relativePaths)
+
+    def _isUpToDate(self, entry: Dict[str, Any]) -> bool:
+        return (entry.get("parser_version", None) == Trial.PARSER_VERSION and
+                os.path.isfile(os.path.join(self.outputDir, entry["output_path"])))
+
+    def _isUnchanged(self, relativePath: str) -> bool:
+        """
+        Checks whether a file has the same size and modification time it had when it was converted. If not, workers
+        compare the hash of its content with the one in the manifest before converting it.
+        """
+
+        entry = self._entries.get(relativePath, None)
+        if entry is None or not self._isUpToDate(entry):
+            return False
+
+        return entry.get("source_stat", None) == getFileStat(os.path.join(self.inputDir, relativePath))
+
+    @staticmethod
+    def _getPackagePath(relativePath: str) -> str:
+        return f"{os.path.splitext(removeCompressionExtension(relativePath))[0]}{BatchConverter.PACKAGE_EXTENSION}"
+
+    def _loadManifestEntries(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.isfile(self._manifestPath):
+            return {}
+
+        with open(self._manifestPath, "r") as f:
+            return json.load(f)["files"]
+
+    def _saveManifest(self):
+        os.makedirs(self.outputDir, exist_ok=True)
+        temporaryPath = f"{self._manifestPath}.tmp"
+        with open(temporaryPath, "w") as f:
+            json.dump({"parser_version": Trial.PARSER_VERSION, "files": self._entries}, f, indent=2, sort_keys=True)
+        os.replace(temporaryPath, self._manifestPath)
+
+
+def convertMetadataFile(metadataPath: str, packagePath: str, knownHash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parses a .metadata file and saves it as a trial package. This function is executed by worker processes.
+
+    :param knownHash: hash of the file when its current package was created. If the content of the file still has
+    this hash, the file is not converted again.
+    :return: status of the conversion (converted, skipped or failed), hash of the file, duration of the conversion and
+    number of lines that are not valid json.
+    """
+
+    start = time.perf_counter()
+    try:
+        result = {"source_stat": getFileStat(metadataPath), "source_hash": getFileHash(metadataPath)}
+        if result["source_hash"] == knownHash:
+            result["status"] = "skipped"
+            return result
+
+        trial = Trial()
+        with openFile(metadataPath, "r") as f:
+            trial.parse(f)
+
+        temporaryPath = f"{packagePath}.tmp"
+        trial.save(temporaryPath)
+        os.replace(temporaryPath, packagePath)
+
+        result["status"] = "converted"
+        result["duration"] = time.perf_counter() - start
+        result["bad_lines"] = trial.numBadLines
+        return result
+    except Exception as e:
+        return {"status": "failed", "error": repr(e)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts all the .metadata files in a directory to trial packages.")
+    parser.add_argument("input_dir", type=str, help="Directory with .metadata files. Subdirectories are included.")
+    parser.add_argument("output_dir", type=str, help="Directory where the packages and the manifest are saved.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = BatchConverter(args.input_dir, args.output_dir, args.workers).run()
+    print(f"Converted: {len(summary['converted'])}, skipped: {len(summary['skipped'])}, "
+          f"failed: {len(summary['failed'])} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,459 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import threading
+
+import numpy as np
+
+
+class GrowableArray:
+    """
+    This class represents an append-only NumPy array. The capacity doubles whenever it is exhausted, so appending is
+    amortized O(1). The valid entries are exposed as a regular array view through the values property.
+    """
+
+    def __init__(self, dtype: Any, shape: Tuple[int, ...] = (), capacity: int = 64):
+        self._data = np.empty((max(capacity, 1),) + shape, dtype=dtype)
+        self._size = 0
+
+    @classmethod
+    def fromValues(cls, values: Any, dtype: Any, shape: Tuple[int, ...] = ()) -> "GrowableArray":
+        values = np.asarray(values, dtype=dtype).reshape((-1,) + shape)
+        array = cls(dtype, shape, len(values))
+        array.extend(values)
+        return array
+
+    @classmethod
+    def fromArray(cls, values: np.ndarray) -> "GrowableArray":
+        """
+        Wraps an existing array without copying it (e.g. a memory-mapped one). The array is only copied if new values
+        are appended.
+        """
+
+        array = cls.__new__(cls)
+        array._data = values
+        array._size = len(values)
+        return array
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def append(self, value: Any):
+        if self._size == len(self._data):
+            self._reserve(max(1, 2 * len(self._data)))
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values: Any):
+        values = np.asarray(values, dtype=self._data.dtype)
+        if len(values) == 0:
+            return
+
+        if self._size + len(values) > len(self._data):
+            self._reserve(max(2 * len(self._data), self._size + len(values)))
+        self._data[self._size:self._size + len(values)] = values
+        self._size += len(values)
+
+    def trim(self):
+        """
+        Releases the capacity that is not being used.
+        """
+
+        if len(self._data) > self._size:
+            self._data = self._data[:self._size].copy()
+
+    def _reserve(self, capacity: int):
+        data = np.empty((capacity,) + self._data.shape[1:], dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index: Any) -> Any:
+        return self.values[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.values)
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> np.ndarray:
+        return self.values if dtype is None else self.values.astype(dtype)
+
+    def __getstate__(self):
+        # Only the valid entries are serialized
+        return {"values": self.values.copy()}
+
+    def __setstate__(self, state):
+        self._data = state["values"]
+        self._size = len(state["values"])
+
+
+class PositionSeries:
+    """
+    This class stores the positions of a player over the time steps of a trial in a CSR-like layout. The coordinates of
+    all the positions are kept in a single float32 (N, 2) array, and the positions of time step t are the rows
+    coordinates[offsets[t]:offsets[t + 1]]. Indexing the series by time step gives the list of positions in that time
+    step, so it can be used as a list of lists of positions.
+    """
+
+    def __init__(self):
+        self._coordinates = GrowableArray(np.float32, (2,))
+        self._offsets = GrowableArray(np.int64)
+        self._offsets.append(0)
+
+    @classmethod
+    def fromLists(cls, positionsPerTimeStep: Iterable[Iterable[Any]]) -> "PositionSeries":
+        """
+        Creates a series from a list of lists of positions per time step, as stored in old trial packages.
+        """
+
+        series = cls()
+        for positions in positionsPerTimeStep:
+            series.append(positions)
+        series.trim()
+        return series
+
+    @classmethod
+    def fromArrays(cls, coordinates: np.ndarray, offsets: np.ndarray) -> "PositionSeries":
+        series = cls.__new__(cls)
+        series._coordinates = GrowableArray.fromArray(coordinates)
+        series._offsets = GrowableArray.fromArray(offsets)
+        return series
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        return self._coordinates.values
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets.values
+
+    def append(self, positions: Iterable[Any]):
+        """
+        Adds a new time step with a list of objects that have x and y attributes.
+        """
+
+        for position in positions:
+            self._coordinates.append((position.x, position.y))
+        self._offsets.append(len(self._coordinates))
+
+    def trim(self):
+        self._coordinates.trim()
+        self._offsets.trim()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, timeStep: int) -> List[Any]:
+        # Imported here to avoid a circular import as Position is defined with the trial
+        from tomcat_viz.Parser.Trial import Position
+
+        if timeStep < 0:
+            timeStep += len(self)
+        if timeStep < 0 or timeStep >= len(self):
+            raise IndexError("Time step out of range.")
+
+        start, end = self._offsets[timeStep], self._offsets[timeStep + 1]
+        return [Position(x, y) for x, y in self._coordinates[start:end].tolist()]
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        for timeStep in range(len(self)):
+            yield self[timeStep]
+
+
+class StringPool:
+    """
+    This class interns strings. Each distinct string is stored once and identified by its index in the pool, so tables
+    that store indices instead of strings don't pay for repeated sender ids, colors and texts.
+    """
+
+    def __init__(self):
+        self._strings: List[str] = []
+        self._indices: Dict[str, int] = {}
+
+    @classmethod
+    def fromStrings(cls, strings: Iterable[str]) -> "StringPool":
+        pool = cls()
+        for string in strings:
+            pool.intern(string)
+        return pool
+
+    @property
+    def strings(self) -> List[str]:
+        return self._strings
+
+    def intern(self, string: str) -> int:
+        index = self._indices.get(string, None)
+        if index is None:
+            index = len(self._strings)
+            self._strings.append(string)
+            self._indices[string] = index
+
+        return index
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __getitem__(self, index: int) -> str:
+        return self._strings[index]
+
+
+class MessageTable:
+    """
+    This class stores the text messages of a trial (e.g. chat messages) in a single table. Each message is stored once,
+    with a bitmask of the players it concerns (bit i for the player of index i), and its sender, color and text are
+    stored as indices in a string pool that can be shared by several tables. As in a position series, the messages of
+    time step t are the rows offsets[t]:offsets[t + 1] of the columns. Indexing the table by time step gives the list
+    of messages (as ChatMessage objects) in that time step.
+    """
+
+    def __init__(self, strings: StringPool = None):
+        self.strings = strings if strings is not None else StringPool()
+        self._senders = GrowableArray(np.int32)
+        self._players = GrowableArray(np.uint8)
+        self._colors = GrowableArray(np.int32)
+        self._texts = GrowableArray(np.int32)
+        self._offsets = GrowableArray(np.int64)
+        self._offsets.append(0)
+
+    @classmethod
+    def fromArrays(cls, strings: StringPool, offsets: np.ndarray, senders: np.ndarray, players: np.ndarray,
+                   colors: np.ndarray, texts: np.ndarray) -> "MessageTable":
+        table = cls(strings)
+        table._offsets = GrowableArray.fromArray(offsets)
+        table._senders = GrowableArray.fromArray(senders)
+        table._players = GrowableArray.fromArray(players)
+        table._colors = GrowableArray.fromArray(colors)
+        table._texts = GrowableArray.fromArray(texts)
+        return table
+
+    @classmethod
+    def fromPlayerLogs(cls, logs: List[Iterable[Iterable[Any]]], strings: StringPool,
+                       toRow: Callable[[Any, int], Tuple[str, str, str]]) -> "MessageTable":
+        """
+        Creates a table from one collection of events per time step per player, as stored in old trial packages, where
+        a message sent to several players was stored once per addressee. toRow(event, playerIdx) gives the sender,
+        color and text of an event. Equal rows of a time step are merged into a single message.
+        """
+
+        table = cls(strings)
+        for eventsPerPlayer in zip(*logs):
+            messages = {}
+            for playerIdx, events in enumerate(eventsPerPlayer):
+                for event in events:
+                    row = toRow(event, playerIdx)
+                    messages[row] = messages.get(row, 0) | (1 << playerIdx)
+            table.append((sender, players, color, text) for (sender, color, text), players in messages.items())
+        table.trim()
+        return table
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets.values
+
+    @property
+    def senders(self) -> np.ndarray:
+        return self._senders.values
+
+    @property
+    def players(self) -> np.ndarray:
+        return self._players.values
+
+    @property
+    def colors(self) -> np.ndarray:
+        return self._colors.values
+
+    @property
+    def texts(self) -> np.ndarray:
+        return self._texts.values
+
+    def append(self, messages: Iterable[Tuple[str, int, str, str]]):
+        """
+        Adds a new time step with a collection of messages given as tuples (sender, players bitmask, color, text).
+        """
+
+        for sender, players, color, text in messages:
+            self._senders.append(self.strings.intern(sender))
+            self._players.append(players)
+            self._colors.append(self.strings.intern(color))
+            self._texts.append(self.strings.intern(text))
+        self._offsets.append(len(self._senders))
+
+    def trim(self):
+        for column in [self._senders, self._players, self._colors, self._texts, self._offsets]:
+            column.trim()
+
+    def countFor(self, playerIdx: int) -> int:
+        """
+        Counts the messages that concern a player, without creating them.
+        """
+
+        return int(np.count_nonzero(self._players.values & (1 << playerIdx)))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, timeStep: int) -> List[Any]:
+        # Imported here to avoid a circular import as ChatMessage is defined with the trial
+        from tomcat_viz.Parser.Trial import ChatMessage
+
+        if timeStep < 0:
+            timeStep += len(self)
+        if timeStep < 0 or timeStep >= len(self):
+            raise IndexError("Time step out of range.")
+
+        start, end = self._offsets[timeStep], self._offsets[timeStep + 1]
+        strings = self.strings.strings
+        return [ChatMessage(strings[sender], players, strings[color], strings[text]) for sender, players, color, text in
+                zip(self._senders[start:end].tolist(), self._players[start:end].tolist(),
+                    self._colors[start:end].tolist(), self._texts[start:end].tolist())]
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        for timeStep in range(len(self)):
+            yield self[timeStep]
+
+
+class EventLog:
+    """
+    This class stores the events of a kind (e.g. placed markers) that happened over the time steps of a trial. Events
+    are kept in a single list, sorted by time step, along with an int32 array of the time step of each event. Time
+    steps without events take no space. Indexing the log by time step gives the list of events in that time step, so
+    it can be used as a list of collections of events.
+
+    A log can also be created with a decoder (e.g. when it is read from a trial package). In that case, the events of a
+    time step are only decoded the first time the time step is accessed.
+    """
+
+    def __init__(self):
+        self._timeSteps = GrowableArray(np.int32)
+        self._events = []
+        self._numTimeSteps = 0
+
+        # Lazy logs only
+        self._decoder = None
+        self._decodedTimeSteps = None
+        self._lock = None
+
+    @classmethod
+    def fromLists(cls, eventsPerTimeStep: Iterable[Iterable[Any]]) -> "EventLog":
+        """
+        Creates a log from a list of collections of events per time step, as stored in old trial packages.
+        """
+
+        log = cls()
+        for events in eventsPerTimeStep:
+            log.append(events.items() if isinstance(events, dict) else events)
+        log.trim()
+        return log
+
+    @classmethod
+    def fromDecoder(cls, timeSteps: np.ndarray, numTimeSteps: int,
+                    decoder: Callable[[int, int], List[Any]]) -> "EventLog":
+        """
+        Creates a lazy log from a sorted array with the time step of each event. The events in positions [start, end)
+        of the log are created by calling decoder(start, end) when they are first needed.
+        """
+
+        log = cls()
+        log._timeSteps = GrowableArray.fromArray(timeSteps)
+        log._events = [None] * len(timeSteps)
+        log._numTimeSteps = numTimeSteps
+        log._decoder = decoder
+        log._decodedTimeSteps = np.zeros(numTimeSteps, dtype=np.bool_)
+        log._lock = threading.Lock()
+        return log
+
+    @property
+    def timeSteps(self) -> np.ndarray:
+        return self._timeSteps.values
+
+    @property
+    def events(self) -> List[Any]:
+        self.materialize()
+        return self._events
+
+    def materialize(self):
+        """
+        Decodes all the events of a lazy log that were not accessed yet.
+        """
+
+        if self._decoder is None:
+            return
+
+        with self._lock:
+            if self._decoder is not None:
+                self._events = self._decoder(0, len(self._events))
+                self._decoder = None
+                self._decodedTimeSteps = None
+
+    def append(self, events: Iterable[Any]):
+        """
+        Adds a new time step with a collection of events. The collection is copied, so it can be reused by the caller.
+        """
+
+        self.materialize()
+        numEvents = len(self._events)
+        self._events.extend(events)
+        if len(self._events) > numEvents:
+            self._timeSteps.extend(np.full(len(self._events) - numEvents, self._numTimeSteps, dtype=np.int32))
+        self._numTimeSteps += 1
+
+    def trim(self):
+        self._timeSteps.trim()
+
+    def getEventsBetween(self, firstTimeStep: int, lastTimeStep: int) -> Tuple[np.ndarray, List[Any]]:
+        """
+        Gets the events that happened from firstTimeStep to lastTimeStep (inclusive) along with their time steps. It's
+        faster than indexing the log by each time step in the range.
+        """
+
+        start = int(np.searchsorted(self._timeSteps.values, firstTimeStep, side="left"))
+        end = int(np.searchsorted(self._timeSteps.values, lastTimeStep, side="right"))
+        if self._decoder is not None and start < end:
+            self._decodeRange(start, end)
+        return self._timeSteps.values[start:end], self._events[start:end]
+
+    def _getRange(self, timeStep: int) -> Tuple[int, int]:
+        start = np.searchsorted(self._timeSteps.values, timeStep, side="left")
+        end = np.searchsorted(self._timeSteps.values, timeStep, side="right")
+        return int(start), int(end)
+
+    def __len__(self):
+        return self._numTimeSteps
+
+    def __getitem__(self, timeStep: int) -> List[Any]:
+        if timeStep < 0:
+            timeStep += len(self)
+        if timeStep < 0 or timeStep >= len(self):
+            raise IndexError("Time step out of range.")
+
+        start, end = self._getRange(timeStep)
+        if self._decoder is not None and start < end:
+            self._decodeTimeStep(timeStep, start, end)
+        return self._events[start:end]
+
+    def _decodeTimeStep(self, timeStep: int, start: int, end: int):
+        with self._lock:
+            if self._decoder is not None and not self._decodedTimeSteps[timeStep]:
+                self._events[start:end] = self._decoder(start, end)
+                self._decodedTimeSteps[timeStep] = True
+
+    def _decodeRange(self, start: int, end: int):
+        with self._lock:
+            if self._decoder is not None:
+                timeSteps = self._timeSteps.values[start:end]
+                if not self._decodedTimeSteps[timeSteps].all():
+                    self._events[start:end] = self._decoder(start, end)
+                    self._decodedTimeSteps[timeSteps] = True
+
+    def __iter__(self) -> Iterator[List[Any]]:
+        for timeStep in range(len(self)):
+            yield self[timeStep]
+
+    def __getstate__(self):
+        # Lazy logs are decoded before they are serialized. The decoder and the lock are not serializable.
+        self.materialize()
+        return {"_timeSteps": self._timeSteps, "_events": self._events, "_numTimeSteps": self._numTimeSteps}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
@@ -0,0 +1,247 @@
+from typing import Any, Dict, List, Tuple
+import argparse
+import os
+import sqlite3
+import time
+
+from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Files import getFileStat
+from tomcat_viz.Parser.Trial import Trial
+
+
+class CorpusIndex:
+    """
+    This class keeps an SQLite database with the metadata and a summary (final score, saved victims, blackout windows,
+    number of chat messages, etc.) of every trial package in a corpus, so trials can be selected without opening their
+    packages.
+
+    Indexing is incremental. A package is only read again if its size or modification time changed since it was
+    indexed, and packages that no longer exist are removed from the index.
+    """
+
+    # Must be incremented whenever the schema or the content of the summaries changes, so the index is rebuilt
+    SCHEMA_VERSION = 1
+    PACKAGE_EXTENSION = ".trial"
+    DEFAULT_DATABASE = "corpus.sqlite"
+
+    TRIAL_COLUMNS = [
+        ("path", "TEXT UNIQUE NOT NULL"),
+        ("size", "INTEGER"),
+        ("mtime_ns", "INTEGER"),
+        ("trial_number", "TEXT"),
+        ("team_number", "TEXT"),
+        ("map_name", "TEXT"),
+        ("map_block_filename", "TEXT"),
+        ("red_id", "TEXT"),
+        ("green_id", "TEXT"),
+        ("blue_id", "TEXT"),
+        ("red_role", "TEXT"),
+        ("green_role", "TEXT"),
+        ("blue_role", "TEXT"),
+        ("num_time_steps", "INTEGER"),
+        ("final_score", "INTEGER"),
+        ("victims_saved", "INTEGER"),
+        ("critical_victims_saved", "INTEGER"),
+        ("markers_placed", "INTEGER"),
+        ("blackout_seconds", "INTEGER"),
+        ("num_blackouts", "INTEGER"),
+        ("red_chat_messages", "INTEGER"),
+        ("green_chat_messages", "INTEGER"),
+        ("blue_chat_messages", "INTEGER")
+    ]
+
+    def __init__(self, databasePath: str = DEFAULT_DATABASE):
+        self.databasePath = databasePath
+        self._connection = sqlite3.connect(databasePath)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._createSchema()
+
+    def close(self):
+        self._connection.close()
+
+    def indexDirectory(self, directory: str) -> Dict[str, List[str]]:
+        """
+        Indexes the packages in a directory (and its subdirectories).
+
+        :return: paths of the indexed, skipped, removed and failed packages.
+        """
+
+        summary = {"indexed": [], "skipped": [], "removed": [], "failed": []}
+        indexedStats = {row["path"]: (row["size"], row["mtime_ns"]) for row in
+                        self._connection.execute("SELECT path, size, mtime_ns FROM trials")}
+
+        packagePaths = set()
+        for subdirectory, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if filename.endswith(CorpusIndex.PACKAGE_EXTENSION):
+                    packagePaths.add(os.path.abspath(os.path.join(subdirectory, filename)))
+
+        for packagePath in sorted(packagePaths):
+            stat = getFileStat(packagePath)
+            if indexedStats.get(packagePath, None) == (stat["size"], stat["mtime_ns"]):
+                summary["skipped"].append(packagePath)
+                continue
+
+            try:
+                self._indexPackage(packagePath, stat)
+                summary["indexed"].append(packagePath)
+            except Exception as e:
+                print(f"Failed to index {packagePath}: {e}")
+                summary["failed"].append(packagePath)
+
+        # Packages of the directory that were deleted
+        root = os.path.join(os.path.abspath(directory), "")
+        for packagePath in indexedStats:
+            if packagePath.startswith(root) and packagePath not in packagePaths:
+                self._connection.execute("DELETE FROM trials WHERE path = ?", (packagePath,))
+                summary["removed"].append(packagePath)
+
+        self._connection.commit()
+        return summary
+
+    def query(self, where: str = "1", parameters: Tuple[Any, ...] = ()) -> List[sqlite3.Row]:
+        """
+        Selects the trials that satisfy an SQL condition over the columns of the trials table. Blackout windows are in
+        the perturbations table (trial_id, kind, start, end), e.g. "id IN (SELECT trial_id FROM perturbations)".
+        """
+
+        return self._connection.execute(f"SELECT * FROM trials WHERE {where} ORDER BY path", parameters).fetchall()
+
+    def getPerturbations(self, trialId: int) -> List[sqlite3.Row]:
+        return self._connection.execute("SELECT kind, start, end FROM perturbations WHERE trial_id = ? ORDER BY start",
+                                        (trialId,)).fetchall()
+
+    def _createSchema(self):
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != CorpusIndex.SCHEMA_VERSION:
+            # Summaries of an older version cannot be trusted, so they are created again
+            self._connection.execute("DROP TABLE IF EXISTS perturbations")
+            self._connection.execute("DROP TABLE IF EXISTS trials")
+
+        columns = ", ".join(f"{name} {columnType}" for name, columnType in CorpusIndex.TRIAL_COLUMNS)
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS trials (id INTEGER PRIMARY KEY, {columns})")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS perturbations (trial_id INTEGER NOT NULL REFERENCES "
+                                 "trials(id) ON DELETE CASCADE, kind TEXT, start INTEGER, end INTEGER)")
+        for column in ["trial_number", "team_number", "map_name", "final_score"]:
+            self._connection.execute(f"CREATE INDEX IF NOT EXISTS trials_{column} ON trials({column})")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS perturbations_trial_id ON perturbations(trial_id)")
+        self._connection.execute(f"PRAGMA user_version = {CorpusIndex.SCHEMA_VERSION}")
+        self._connection.commit()
+
+    def _indexPackage(self, packagePath: str, stat: Dict[str, int]):
+        trial = Trial()
+        trial.load(packagePath)
+
+        row = CorpusIndex.summarize(trial)
+        row["path"] = packagePath
+        row["size"] = stat["size"]
+        row["mtime_ns"] = stat["mtime_ns"]
+
+        self._connection.execute("DELETE FROM trials WHERE path = ?", (packagePath,))
+        names = [name for name, _ in CorpusIndex.TRIAL_COLUMNS]
+        cursor = self._connection.execute(
+            f"INSERT INTO trials ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            [row[name] for name in names])
+        self._connection.executemany("INSERT INTO perturbations (trial_id, kind, start, end) VALUES (?, ?, ?, ?)",
+                                     [(cursor.lastrowid, "blackout", start, end) for start, end in
+                                      CorpusIndex.getWindows(trial.activeBlackout)])
+
+    @staticmethod
+    def summarize(trial: Trial) -> Dict[str, Any]:
+        metadata = trial.metadata
+        mapBlockFilename = metadata.get("map_block_filename", None)
+        numTimeSteps = trial.numParsedTimeSteps
+        blackoutWindows = CorpusIndex.getWindows(trial.activeBlackout)
+
+        summary = {
+            "trial_number": metadata.get("trial_number", None),
+            "team_number": metadata.get("team_number", None),
+            # Map block files are named MapBlocks_<map name>_<version>_xyz.csv
+            "map_name": mapBlockFilename.split("_")[1] if mapBlockFilename is not None else None,
+            "map_block_filename": mapBlockFilename,
+            "num_time_steps": numTimeSteps,
+            "final_score": int(trial.scores[numTimeSteps - 1]) if numTimeSteps > 0 else 0,
+            # Counted from the time steps of the events, so lazy logs don't need to be decoded
+            "victims_saved": len(trial.savedVictims.timeSteps),
+            "critical_victims_saved": sum(1 for victim in trial.savedVictims.events if
+                                          victim.victimType == Constants.VictimType.CRITICAL),
+            "markers_placed": len(trial.placedMarkers.timeSteps),
+            "blackout_seconds": sum(end - start + 1 for start, end in blackoutWindows),
+            "num_blackouts": len(blackoutWindows)
+        }
+        for player in Constants.Player:
+            name = player.name.lower()
+            role = metadata.get(f"{name}_role", None)
+            summary[f"{name}_id"] = metadata.get(f"{name}_id", None)
+            summary[f"{name}_role"] = role.name.lower() if role is not None else None
+            summary[f"{name}_chat_messages"] = trial.chatMessages.countFor(player.value)
+
+        return summary
+
+    @staticmethod
+    def getWindows(activePerTimeStep: List[bool]) -> List[Tuple[int, int]]:
+        """
+        Gets the intervals [start, end] of consecutive time steps in which a flag is active.
+        """
+
+        windows = []
+        start = None
+        for timeStep, active in enumerate(activePerTimeStep):
+            if active and start is None:
+                start = timeStep
+            elif not active and start is not None:
+                windows.append((start, timeStep - 1))
+                start = None
+        if start is not None:
+            windows.append((start, len(activePerTimeStep) - 1))
+
+        return windows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexes trial packages in an SQLite database and queries them.")
+    parser.add_argument("--database", type=str, default=CorpusIndex.DEFAULT_DATABASE, help="Path to the database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    indexParser = subparsers.add_parser("index", help="Indexes the packages in directories (incrementally).")
+    indexParser.add_argument("directories", type=str, nargs="+", help="Directories with .trial packages.")
+    queryParser = subparsers.add_parser("query", help="Lists the indexed trials that satisfy all the given filters.")
+    queryParser.add_argument("--team", type=str, help="Team number (e.g. TM000042).")
+    queryParser.add_argument("--trial", type=str, help="Trial number (e.g. T000123).")
+    queryParser.add_argument("--map", type=str, help="Map name (e.g. SaturnB).")
+    queryParser.add_argument("--blackout", action="store_true", help="Only trials with a blackout.")
+    queryParser.add_argument("--min_score", type=int, help="Minimum final score.")
+    queryParser.add_argument("--where", type=str, help="Extra SQL condition over the columns of the trials table.")
+    args = parser.parse_args()
+
+    corpusIndex = CorpusIndex(args.database)
+    start = time.perf_counter()
+    if args.command == "index":
+        for directory in args.directories:
+            summary = corpusIndex.indexDirectory(directory)
+            print(f"{directory}: indexed {len(summary['indexed'])}, skipped {len(summary['skipped'])}, "
+                  f"removed {len(summary['removed'])}, failed {len(summary['failed'])}")
+        print(f"Indexing took {time.perf_counter() - start:.1f}s")
+    else:
+        conditions = []
+        parameters = []
+        for column, value in [("team_number", args.team), ("trial_number", args.trial), ("map_name", args.map)]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if args.blackout:
+            conditions.append("num_blackouts > 0")
+        if args.min_score is not None:
+            conditions.append("final_score >= ?")
+            parameters.append(args.min_score)
+        if args.where is not None:
+            conditions.append(f"({args.where})")
+
+        rows = corpusIndex.query(" AND ".join(conditions) if len(conditions) > 0 else "1", tuple(parameters))
+        elapsed = time.perf_counter() - start
+        print(f"{'Trial':<10} {'Team':<10} {'Map':<10} {'Score':>6} {'Saved':>6} {'Blackouts':>9}  Path")
+        for row in rows:
+            print(f"{row['trial_number'] or '':<10} {row['team_number'] or '':<10} {row['map_name'] or '':<10} "
+                  f"{row['final_score']:>6} {row['victims_saved']:>6} {row['num_blackouts']:>9}  {row['path']}")
+        print(f"{len(rows)} trial(s) in {elapsed * 1000:.1f}ms")
+    corpusIndex.close()
@@ -1,30 +1,11 @@
 import json
 import os
 import pickle
-from typing import Tuple, Set
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 
 
-class Block:
-    """
-    This class represents a block in the map. The map will be defined as a set of blocks because we will perform
-    set operations do define the empty space inside complex areas.
-    """
-
-    def __init__(self, x: int, y: int):
-        self.x = x
-        self.y = y
-
-    def __eq__(self, other):
-        return (isinstance(other, self.__class__) and
-                getattr(other, 'x', None) == self.x and
-                getattr(other, 'y', None) == self.y)
-
-    def __hash__(self):
-        return hash(f"{self.x},{self.y}")
-
-
 class Map:
     WALL = 1
     DOOR = 2
@@ -52,104 +33,110 @@ class Map:
         self.grid = mapPackage["grid"]
 
     def parse(self, jsonMap: json):
-        wallBlocks, doorBlocks = self._getStaticBlocks(jsonMap)
-        self._fillMetadata(wallBlocks)
-        self._fillGrid(wallBlocks, doorBlocks)
+        wallMask, doorMask, minX, minY = self._rasterize(jsonMap)
+        self._fillMetadata(wallMask, minX, minY)
+        self._fillGrid(wallMask, doorMask, minX, minY)
 
-    def _fillMetadata(self, wallBlocks: Set[Block]):
+    def _fillMetadata(self, wallMask: np.ndarray, minX: int, minY: int):
         # Get map bounds and add to the metadata file
-        minX = None
-        minY = None
-        maxX = None
-        maxY = None
-        for block in wallBlocks:
-            minX = block.x if minX is None else min(minX, block.x)
-            minY = block.y if minY is None else min(minY, block.y)
-            maxX = block.x if maxX is None else max(maxX, block.x)
-            maxY = block.y if maxY is None else max(maxY, block.y)
-        self.metadata["min_x"] = minX
-        self.metadata["min_y"] = minY
-        self.metadata["max_x"] = maxX
-        self.metadata["max_y"] = maxY
-
-    def _fillGrid(self, wallBlocks: Set[Block], doorBlocks: Set[Block]):
-        width = self.metadata["max_x"] - self.metadata["min_x"] + 1
-        height = self.metadata["max_y"] - self.metadata["min_y"] + 1
-        self.grid = np.zeros((height, width), dtype=np.int8)
-
-        for block in wallBlocks:
-            self.grid[block.y - self.metadata["min_y"]][block.x - self.metadata["min_x"]] = Map.WALL
-
-        for block in doorBlocks:
-            self.grid[block.y - self.metadata["min_y"]][block.x - self.metadata["min_x"]] = Map.DOOR
-
-    def _getStaticBlocks(self, jsonMap: json) -> Tuple[Set[Block], Set[Block]]:
-        rooms = {}
+        columns = np.flatnonzero(wallMask.any(axis=0))
+        rows = np.flatnonzero(wallMask.any(axis=1))
+        self.metadata["min_x"] = minX + int(columns[0])
+        self.metadata["min_y"] = minY + int(rows[0])
+        self.metadata["max_x"] = minX + int(columns[-1])
+        self.metadata["max_y"] = minY + int(rows[-1])
+
+    def _fillGrid(self, wallMask: np.ndarray, doorMask: np.ndarray, minX: int, minY: int):
+        # Masks are cropped to the bounds of the walls. Doors out of these bounds are left out.
+        rows = slice(self.metadata["min_y"] - minY, self.metadata["max_y"] - minY + 1)
+        columns = slice(self.metadata["min_x"] - minX, self.metadata["max_x"] - minX + 1)
+        self.grid = np.where(wallMask[rows, columns], Map.WALL, 0).astype(np.int8)
+        self.grid[doorMask[rows, columns]] = Map.DOOR
+
+    def _rasterize(self, jsonMap: json) -> Tuple[np.ndarray, np.ndarray, int, int]:
+        """
+        Draws the walls and doors of the map in boolean masks over the area enclosed by the contours of the rooms. A
+        room made of parts is walled by the contours of its parts, except where they overlap the interior of another
+        part. Openings are removed from the walls.
+
+        :return: masks of walls and doors, and coordinates of their first column and row.
+        """
+
+        rooms = []
         roomParts = {}
-        roomBlocks = set()
+        simpleRooms = []
         for location in jsonMap["locations"]:
             if "child_locations" in location:
-                rooms[location["id"]] = {"parts": location["child_locations"]}
+                rooms.append(location["child_locations"])
+            elif "_part" in location["type"]:
+                roomParts[location["id"]] = Map._getBounds(location)
             else:
-                coordinates = location["bounds"]["coordinates"]
-                x1 = coordinates[0]["x"]
-                y1 = coordinates[0]["z"]
-                x2 = coordinates[1]["x"]
-                y2 = coordinates[1]["z"]
-                bounds = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
-                if "_part" in location["type"]:
-                    roomParts[location["id"]] = {"bounds": bounds}
-                else:
-                    for x in range(x1 - 1, x2 + 1, 1):
-                        roomBlocks.add(Block(x, y1 - 1))
-                        roomBlocks.add(Block(x, y2))
-                    for y in range(y1 - 1, y2 + 1, 1):
-                        roomBlocks.add(Block(x1 - 1, y))
-                        roomBlocks.add(Block(x2, y))
-
-        # For each room that has parts, compute the blocks that define the contour of the room
-        for _, room in rooms.items():
-            if "parts" in room:
-                emptyBlocks = set()
-                wallBlocks = set()
-                for part_id in room["parts"]:
-                    x1 = roomParts[part_id]["bounds"]["x1"]
-                    y1 = roomParts[part_id]["bounds"]["y1"]
-                    x2 = roomParts[part_id]["bounds"]["x2"]
-                    y2 = roomParts[part_id]["bounds"]["y2"]
-
-                    for x in range(x1, x2):
-                        for y in range(y1, y2):
-                            emptyBlocks.add(Block(x, y))
-
-                    for x in range(x1 - 1, x2 + 1, 1):
-                        wallBlocks.add(Block(x, y1 - 1))
-                        wallBlocks.add(Block(x, y2))
-                    for y in range(y1 - 1, y2 + 1, 1):
-                        wallBlocks.add(Block(x1 - 1, y))
-                        wallBlocks.add(Block(x2, y))
-
-                roomBlocks = roomBlocks.union(wallBlocks.difference(emptyBlocks))
+                simpleRooms.append(Map._getBounds(location))
+
+        roomsBounds = [[roomParts[partId] for partId in parts] for parts in rooms if len(parts) > 0]
+        minX, minY, maxX, maxY = Map._getContourBox(simpleRooms + [bounds for partsBounds in roomsBounds
+                                                                   for bounds in partsBounds])
+
+        wallMask = np.zeros((maxY - minY + 1, maxX - minX + 1), dtype=bool)
+        for bounds in simpleRooms:
+            Map._drawContour(wallMask, bounds, minX, minY)
+
+        # Each room is drawn in a mask of its own, so the interior of its parts only removes its own walls
+        for partsBounds in roomsBounds:
+            roomMinX, roomMinY, roomMaxX, roomMaxY = Map._getContourBox(partsBounds)
+            roomWallMask = np.zeros((roomMaxY - roomMinY + 1, roomMaxX - roomMinX + 1), dtype=bool)
+            roomEmptyMask = np.zeros_like(roomWallMask)
+            for bounds in partsBounds:
+                Map._drawContour(roomWallMask, bounds, roomMinX, roomMinY)
+                Map._drawRectangle(roomEmptyMask, bounds, roomMinX, roomMinY)
+
+            roomArea = wallMask[roomMinY - minY:roomMaxY - minY + 1, roomMinX - minX:roomMaxX - minX + 1]
+            roomArea |= roomWallMask & ~roomEmptyMask
 
         # Add connections to the openings
-        doorBlocks = set()
-        openingBlocks = set()
+        doorMask = np.zeros_like(wallMask)
         for location in jsonMap["connections"]:
-            coordinates = location["bounds"]["coordinates"]
-            x1 = coordinates[0]["x"]
-            y1 = coordinates[0]["z"]
-            x2 = coordinates[1]["x"]
-            y2 = coordinates[1]["z"]
-
+            bounds = Map._getBounds(location)
             if "door" in location["type"]:
-                for x in range(x1, x2):
-                    for y in range(y1, y2):
-                        doorBlocks.add(Block(x, y))
+                Map._drawRectangle(doorMask, bounds, minX, minY)
             else:
-                for x in range(x1, x2):
-                    for y in range(y1, y2):
-                        openingBlocks.add(Block(x, y))
-
-        roomBlocks = roomBlocks.difference(openingBlocks)
-
-        return roomBlocks, doorBlocks
+                Map._drawRectangle(wallMask, bounds, minX, minY, False)
+
+        return wallMask, doorMask, minX, minY
+
+    @staticmethod
+    def _getBounds(location: Dict[str, Any]) -> Tuple[int, int, int, int]:
+        coordinates = location["bounds"]["coordinates"]
+        return coordinates[0]["x"], coordinates[0]["z"], coordinates[1]["x"], coordinates[1]["z"]
+
+    @staticmethod
+    def _getContourBox(boundsList: List[Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
+        # Contours are one block away from the interior of a room on each side
+        minX = min(min(x1 - 1, x2) for x1, _, x2, _ in boundsList)
+        minY = min(min(y1 - 1, y2) for _, y1, _, y2 in boundsList)
+        maxX = max(max(x1 - 1, x2) for x1, _, x2, _ in boundsList)
+        maxY = max(max(y1 - 1, y2) for _, y1, _, y2 in boundsList)
+        return minX, minY, maxX, maxY
+
+    @staticmethod
+    def _drawContour(mask: np.ndarray, bounds: Tuple[int, int, int, int], minX: int, minY: int):
+        # Blocks around the rectangle [x1, x2) x [y1, y2)
+        x1, y1, x2, y2 = bounds
+        columns = slice(x1 - 1 - minX, x2 + 1 - minX)
+        rows = slice(y1 - 1 - minY, y2 + 1 - minY)
+        mask[y1 - 1 - minY, columns] = True
+        mask[y2 - minY, columns] = True
+        mask[rows, x1 - 1 - minX] = True
+        mask[rows, x2 - minX] = True
+
+    @staticmethod
+    def _drawRectangle(mask: np.ndarray, bounds: Tuple[int, int, int, int], minX: int, minY: int,
+                       value: bool = True):
+        # Blocks in [x1, x2) x [y1, y2), clipped to the mask
+        x1, y1, x2, y2 = bounds
+        x1 = max(x1 - minX, 0)
+        y1 = max(y1 - minY, 0)
+        x2 = min(x2 - minX, mask.shape[1])
+        y2 = min(y2 - minY, mask.shape[0])
+        if x1 < x2 and y1 < y2:
+            mask[y1:y2, x1:x2] = value
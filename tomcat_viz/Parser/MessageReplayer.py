@@ -0,0 +1,55 @@
+from typing import Optional
+import argparse
+import json
+import socket
+import time
+
+from tomcat_viz.Common.Format import timestampToMicroseconds
+from tomcat_viz.Parser.MessageStream import MessageStreamServer, parseAddress
+
+
+def getLineTimestamp(line: bytes) -> Optional[int]:
+    try:
+        return timestampToMicroseconds(json.loads(line)["header"]["timestamp"])
+    except Exception:
+        return None
+
+
+def replay(metadataPath: str, address: str, speed: float):
+    """
+    Sends the lines of a .metadata file to a message stream server in the order they appear in the file, keeping the
+    time between messages given by their header timestamps divided by speed. Lines without a timestamp are sent right
+    away. If speed is 0, lines are sent as fast as the server reads them.
+    """
+
+    family, socketAddress = parseAddress(address)
+    with socket.socket(family, socket.SOCK_STREAM) as connection, open(metadataPath, "rb") as f:
+        connection.connect(socketAddress)
+
+        start = time.perf_counter()
+        firstTimestamp = None
+        for line in f:
+            timestamp = getLineTimestamp(line) if speed > 0 else None
+            if timestamp is not None:
+                if firstTimestamp is None:
+                    firstTimestamp = timestamp
+                delay = (timestamp - firstTimestamp) / 1e6 / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            # Blocks when the server falls behind
+            connection.sendall(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streams a .metadata file to the visualizer as if it came from the "
+                                                 "testbed message bus.")
+    parser.add_argument("metadata", type=str, help="Path to the .metadata file.")
+    parser.add_argument("--address", type=str, default=MessageStreamServer.DEFAULT_ADDRESS,
+                        help="host:port of a TCP socket or path of a Unix socket.")
+    parser.add_argument("--speed", type=float, default=1, help="Replay speed. Use 0 to send messages without delay.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    replay(args.metadata, args.address, args.speed)
+    print(f"Replayed {args.metadata} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,132 @@
+from typing import Any, List, Tuple
+import os
+import queue
+import socket
+import threading
+
+
+def parseAddress(address: str) -> Tuple[int, Any]:
+    """
+    Converts an address given as host:port (TCP socket) or as a file path (Unix socket) into a socket family and a
+    socket address.
+    """
+
+    host, separator, port = address.rpartition(":")
+    if separator != "" and port.isdigit():
+        return socket.AF_INET, (host if host != "" else "localhost", int(port))
+
+    return socket.AF_UNIX, address
+
+
+class MessageStreamServer:
+    """
+    This class receives testbed messages as json lines from a TCP or Unix socket. Lines are read by a background thread
+    and kept in a bounded queue until they are consumed with readLines. When the queue is full, the thread stops reading
+    from the socket, so the socket buffers fill up and the sender is blocked until the consumer catches up.
+
+    One sender is served at a time. When it disconnects, the server waits for the next one.
+    """
+
+    DEFAULT_ADDRESS = "localhost:9000"
+    QUEUE_SIZE = 10000
+    # Maximum number of lines returned by a call to readLines, so a consumer on the GUI thread is never blocked for long
+    MAX_LINES_PER_READ = 5000
+    RECEIVE_SIZE = 1024 * 1024
+    # Interval (in seconds) in which the background thread checks whether the server was closed
+    POLL_TIMEOUT = 0.2
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, queueSize: int = QUEUE_SIZE):
+        self.address = address
+        self.numReceivedLines = 0
+
+        self._family, self._socketAddress = parseAddress(address)
+        self._lines = queue.Queue(maxsize=queueSize)
+        self._closed = threading.Event()
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        if self._family == socket.AF_UNIX and os.path.exists(self._socketAddress):
+            # Left behind by a server that was not closed
+            os.remove(self._socketAddress)
+
+        self._socket = socket.socket(self._family, socket.SOCK_STREAM)
+        if self._family == socket.AF_INET:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self._socketAddress)
+        self._socket.listen(1)
+        self._socket.settimeout(MessageStreamServer.POLL_TIMEOUT)
+
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def readLines(self, maxLines: int = MAX_LINES_PER_READ) -> List[bytes]:
+        """
+        Returns the lines received so far, up to maxLines, without waiting for new ones.
+        """
+
+        lines = []
+        while len(lines) < maxLines:
+            try:
+                lines.append(self._lines.get_nowait())
+            except queue.Empty:
+                break
+
+        return lines
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if self._family == socket.AF_UNIX and os.path.exists(self._socketAddress):
+                os.remove(self._socketAddress)
+
+    def _serve(self):
+        while not self._closed.is_set():
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+
+            with connection:
+                connection.settimeout(MessageStreamServer.POLL_TIMEOUT)
+                self._receive(connection)
+
+    def _receive(self, connection: socket.socket):
+        partialLine = b""
+        while not self._closed.is_set():
+            try:
+                data = connection.recv(MessageStreamServer.RECEIVE_SIZE)
+            except socket.timeout:
+                continue
+
+            if len(data) == 0:
+                # The sender disconnected
+                break
+
+            lines = (partialLine + data).split(b"\n")
+            partialLine = lines.pop()
+            for line in lines:
+                # Empty lines may be sent to keep the connection alive
+                if line.strip() != b"" and not self._put(line + b"\n"):
+                    return
+
+        if partialLine.strip() != b"":
+            self._put(partialLine)
+
+    def _put(self, line: bytes) -> bool:
+        # Waits while the queue is full. Meanwhile, nothing is read from the socket.
+        while not self._closed.is_set():
+            try:
+                self._lines.put(line, timeout=MessageStreamServer.POLL_TIMEOUT)
+                self.numReceivedLines += 1
+                return True
+            except queue.Full:
+                continue
+
+        return False
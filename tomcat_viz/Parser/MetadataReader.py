@@ -0,0 +1,190 @@
+from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Set, Tuple
+import json
+import os
+import time
+
+from tomcat_viz.Common.Format import timestampToMicroseconds
+
+
+class MetadataReader:
+    """
+    This class reads the lines of an exported trial file (.metadata) and yields, one by one, the json messages that
+    belong to a given set of topics. It never holds more than one line in memory, so it can be used to stream over
+    files of any size.
+
+    Before decoding a line, the reader looks for the value of the "topic" field in the raw text. Lines that cannot
+    contain a relevant message are skipped without being decoded. Lines can be given as str or bytes.
+
+    If a profiler is given (see ParseProfiler), the time spent on each line is recorded under the topic of its message.
+    """
+
+    TOPIC_KEY = '"topic"'
+    # Maximum number of bad lines whose details are kept
+    MAX_BAD_LINES = 20
+
+    def __init__(self, topics: Set[str], agentName: str, prefilter: bool = True, profiler: Any = None):
+        self.topics = topics
+        self.agentName = agentName
+        self.prefilter = prefilter
+        self.profiler = profiler
+        self._topicsBytes = {topic.encode() for topic in topics}
+        self._agentNameBytes = agentName.encode()
+
+        self.numLines = 0
+        self.numSkippedLines = 0
+        self.numBadLines = 0
+        # Line number, length and decoding error of the first bad lines
+        self.badLines: List[Dict[str, Any]] = []
+
+    def read(self, lines: Iterable[AnyStr]) -> Iterator[Dict[str, Any]]:
+        profiler = self.profiler
+        for line in lines:
+            self.numLines += 1
+            if profiler is not None:
+                start = time.perf_counter()
+
+            if self.prefilter and not self._mayBeRelevant(line):
+                self.numSkippedLines += 1
+                if profiler is not None:
+                    profiler.addDecoding(profiler.SKIPPED_LINES, time.perf_counter() - start)
+                continue
+
+            jsonMessage = None
+            try:
+                jsonMessage = json.loads(line)
+            except Exception as e:
+                self.numBadLines += 1
+                if len(self.badLines) < MetadataReader.MAX_BAD_LINES:
+                    self.badLines.append({"line": self.numLines, "length": len(line), "error": str(e)})
+
+            if profiler is not None:
+                topic = profiler.BAD_LINES if jsonMessage is None else str(jsonMessage.get("topic", profiler.NO_TOPIC))
+                profiler.addDecoding(topic, time.perf_counter() - start)
+
+            if jsonMessage is not None:
+                if "topic" in jsonMessage:
+                    if jsonMessage["topic"] in self.topics:
+                        yield jsonMessage
+                else:
+                    # Intervention messages generated locally don't have the topic field.
+                    if "source" in jsonMessage["msg"] and jsonMessage["msg"]["source"] == self.agentName:
+                        yield jsonMessage
+
+    def _mayBeRelevant(self, line: AnyStr) -> bool:
+        """
+        Checks whether a line must be decoded. A line is skipped only if none of the "topic" fields in it (nested ones
+        included) has a relevant value and it does not mention the agent, whose intervention messages may have no
+        topic at all. Therefore, no relevant message is ever skipped.
+        """
+
+        if isinstance(line, bytes):
+            topicKey, quote, separator, escape = MetadataReader.TOPIC_KEY.encode(), b'"', b":", b"\\"
+            agentName, topics = self._agentNameBytes, self._topicsBytes
+        else:
+            topicKey, quote, separator, escape = MetadataReader.TOPIC_KEY, '"', ":", "\\"
+            agentName, topics = self.agentName, self.topics
+
+        if agentName in line:
+            return True
+
+        keyPosition = line.find(topicKey)
+        while keyPosition >= 0:
+            valueStart = line.find(quote, keyPosition + len(topicKey))
+            if line[keyPosition + len(topicKey):valueStart].strip() == separator:
+                valueEnd = line.find(quote, valueStart + 1)
+                value = line[valueStart + 1:valueEnd]
+                if valueEnd < 0 or escape in value or value in topics:
+                    # Escaped values are not worth handling here. We let the json decoder deal with them.
+                    return True
+
+            keyPosition = line.find(topicKey, keyPosition + len(topicKey))
+
+        return False
+
+
+def getLineAlignedChunks(filepath: str, numChunks: int) -> List[Tuple[int, int]]:
+    """
+    Splits a file into at most numChunks byte ranges [start, end) of similar size. Every range starts at the beginning
+    of a line and ends right after a line break (or at the end of the file).
+    """
+
+    fileSize = os.path.getsize(filepath)
+    boundaries = [0]
+    with open(filepath, "rb") as f:
+        for i in range(1, numChunks):
+            offset = max(fileSize * i // numChunks, boundaries[-1])
+            if offset > 0:
+                # Move to the beginning of the first line that starts at or after the offset
+                f.seek(offset - 1)
+                f.readline()
+            boundaries.append(min(f.tell(), fileSize))
+    boundaries.append(fileSize)
+
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+def readChunk(filepath: str, start: int, end: int, topics: Set[str], agentName: str,
+              untimedTopics: Set[str]) -> Tuple[List[Tuple[int, bytes]], List[Dict[str, Any]], int, int, int]:
+    """
+    Reads the relevant messages in a byte range of a file. This function is executed by worker processes when a file
+    is read in parallel (see ParallelParser).
+
+    Timed messages are returned as the lines they were decoded from rather than as dictionaries. Sending dictionaries
+    back to the calling process costs about as much as decoding them again, whereas lines are copied as a whole.
+
+    :return: lines of timed messages sorted by timestamp in microseconds as (timestamp, line) pairs, messages of the
+    untimed topics in the order they appear in the file, and the number of lines, skipped lines and bad lines in the
+    range.
+    """
+
+    currentLine = b""
+
+    def readLines():
+        nonlocal currentLine
+        position = start
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            while position < end:
+                currentLine = f.readline()
+                if len(currentLine) == 0:
+                    break
+                position += len(currentLine)
+                yield currentLine
+
+    reader = MetadataReader(topics, agentName)
+    timedLines = []
+    untimedMessages = []
+    # The reader decodes one line at a time, so the last line read is the one each message comes from
+    for message in reader.read(readLines()):
+        if message.get("topic", None) in untimedTopics:
+            untimedMessages.append(message)
+        else:
+            timedLines.append((timestampToMicroseconds(message["header"]["timestamp"]), currentLine))
+
+    # The sort is stable, so messages with the same timestamp keep the order they have in the file
+    timedLines.sort(key=lambda x: x[0])
+
+    return timedLines, untimedMessages, reader.numLines, reader.numSkippedLines, reader.numBadLines
+
+
+class FileTail:
+    """
+    This class reads the lines appended to a file that is still being written. Each call to readLines returns the
+    complete lines written since the previous call. An incomplete last line is held until the rest of it is written.
+    """
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, "rb")
+        self._partialLine = b""
+
+    def readLines(self) -> List[bytes]:
+        data = self._file.read()
+        if len(data) == 0:
+            return []
+
+        lines = (self._partialLine + data).split(b"\n")
+        self._partialLine = lines.pop()
+        return [line + b"\n" for line in lines]
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import time
+
+from tomcat_viz.Common.Files import getFileStat, openFile, removeCompressionExtension
+from tomcat_viz.Parser.MetadataReader import MetadataReader
+from tomcat_viz.Parser.Trial import Trial
+
+
+class MetadataScanner:
+    """
+    This class lists the trials in .metadata files without parsing them. A file is only read up to its trial start
+    message, from which the metadata stored by Trial.parse is taken (trial and team numbers, map block file, player ids
+    and the id of each callsign). Roles are not included, as they are selected later in the trial. Files compressed with
+    gzip, bzip2 or xz (e.g. trial.metadata.gz) are included, and only their first lines are decompressed.
+
+    Files of a directory are scanned in parallel. Scanning a file is dominated by opening it and reading its first
+    lines, which release the GIL, so a pool of threads is used. Starting processes would take longer than the scan.
+    """
+
+    METADATA_EXTENSION = ".metadata"
+    DEFAULT_WORKERS = 16
+
+    def __init__(self, numWorkers: int = DEFAULT_WORKERS):
+        self.numWorkers = numWorkers
+
+    def scanDirectory(self, directory: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Scans the .metadata files in a directory (and its subdirectories).
+
+        :return: result of the scan per relative path (see scanMetadataFile).
+        """
+
+        relativePaths = []
+        for subdirectory, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if removeCompressionExtension(filename).endswith(MetadataScanner.METADATA_EXTENSION):
+                    relativePaths.append(os.path.relpath(os.path.join(subdirectory, filename), directory))
+        relativePaths.sort()
+
+        filepaths = [os.path.join(directory, relativePath) for relativePath in relativePaths]
+        if self.numWorkers <= 1 or len(filepaths) <= 1:
+            results = [scanMetadataFile(filepath) for filepath in filepaths]
+        else:
+            with ThreadPoolExecutor(max_workers=self.numWorkers) as executor:
+                results = list(executor.map(scanMetadataFile, filepaths))
+
+        return dict(zip(relativePaths, results))
+
+
+def scanMetadataFile(filepath: str) -> Dict[str, Any]:
+    """
+    Reads the metadata of a trial from the first trial start message of a .metadata file. This function is executed
+    by the workers of the scanner.
+
+    :return: status of the scan (found, missing or failed), size and modification time of the file, metadata of the
+    trial and number of lines read.
+    """
+
+    try:
+        result = {"source_stat": getFileStat(filepath), "status": "missing", "metadata": None}
+        reader = MetadataReader({"trial"}, Trial.AGENT_NAME)
+        with openFile(filepath, "rb") as f:
+            for message in reader.read(f):
+                if message.get("topic", None) == "trial" and message["msg"]["sub_type"].lower() == "start":
+                    result["metadata"] = Trial.readTrialStartMessage(message)[0]
+                    result["status"] = "found"
+                    break
+
+        result["lines_read"] = reader.numLines
+        return result
+    except Exception as e:
+        return {"status": "failed", "error": repr(e)}
+
+
+def formatScanResults(results: Dict[str, Dict[str, Any]]) -> List[str]:
+    lines = [f"{'Trial':<10} {'Team':<10} {'Red':<12} {'Green':<12} {'Blue':<12} {'Map block file':<36} Path"]
+    for relativePath, result in results.items():
+        metadata = result.get("metadata", None)
+        if metadata is None:
+            lines.append(f"{'(' + result['status'] + ')':<96} {relativePath}")
+            continue
+
+        lines.append(f"{metadata['trial_number']:<10} {metadata['team_number']:<10} "
+                     f"{metadata.get('red_id', ''):<12} {metadata.get('green_id', ''):<12} "
+                     f"{metadata.get('blue_id', ''):<12} {metadata['map_block_filename']:<36} {relativePath}")
+
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lists the trials of the .metadata files in a directory by reading "
+                                                 "their trial start messages only.")
+    parser.add_argument("directory", type=str, help="Directory with .metadata files. Subdirectories are included.")
+    parser.add_argument("--workers", type=int, default=MetadataScanner.DEFAULT_WORKERS,
+                        help="Number of worker threads.")
+    parser.add_argument("--json", type=str, help="Path of a file where the results are saved as json.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    scanResults = MetadataScanner(args.workers).scanDirectory(args.directory)
+    elapsed = time.perf_counter() - start
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(scanResults, f, indent=2)
+    print("\n".join(formatScanResults(scanResults)))
+    print(f"{len(scanResults)} file(s) in {elapsed:.1f}s")
@@ -0,0 +1,401 @@
+from enum import Enum
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import io
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Parser.Columnar import EventLog, GrowableArray, MessageTable, PositionSeries, StringPool
+from tomcat_viz.Parser.Map import Map
+from tomcat_viz.Parser.Trial import ChatMessage, Marker, Position, Trial, Victim
+
+
+class TrialPackage:
+    """
+    This class writes and reads trial packages. A package is an uncompressed zip file with a manifest.json member and
+    one .npy member per array of the trial (e.g. players_positions/0/coordinates.npy). Objects stored in event logs
+    are split in typed columns, enums are stored by value and strings are stored as a utf-8 buffer plus an array of
+    offsets. Message tables (chat messages and speech transcriptions) are stored as their columns, with the strings of
+    the pool they share.
+
+    Members are stored without compression and aligned to 64 bytes, so arrays are memory-mapped straight from the
+    package file when it is read. Since every member is a regular .npy file, a package can also be opened with
+    numpy.load.
+    """
+
+    FORMAT = "tomcat-viz-trial"
+    # Version 1 stored chat messages and speech transcriptions in one event log per player
+    VERSION = 2
+    MESSAGE_TABLES = ["chat_messages", "speech_transcriptions"]
+    MESSAGE_TABLE_COLUMNS = ["offsets", "senders", "players", "colors", "texts"]
+    MANIFEST = "manifest.json"
+    ALIGNMENT = 64
+
+    # Zip extra field used to pad the local header of a member so its data is aligned
+    PADDING_HEADER_ID = 0xCAFE
+    # Value of enums that are None (e.g. victims of an unknown type). -1 is taken by Constants.Action.NONE.
+    NONE_ENUM_VALUE = -128
+
+    @staticmethod
+    def isPackage(filepath: str) -> bool:
+        if not zipfile.is_zipfile(filepath):
+            return False
+
+        with zipfile.ZipFile(filepath) as zipFile:
+            return TrialPackage.MANIFEST in zipFile.namelist()
+
+    @staticmethod
+    def write(trial: Trial, filepath: str):
+        arrays = {"scores": np.asarray(trial.scores, dtype=np.int32),
+                  "map/grid": trial.map.grid,
+                  "active_blackout": np.asarray(trial.activeBlackout, dtype=np.bool_)}
+        eventLogLengths = {}
+
+        for playerIdx in range(Constants.NUM_ROLES):
+            positions = trial.playersPositions[playerIdx]
+            arrays[f"players_positions/{playerIdx}/coordinates"] = positions.coordinates
+            arrays[f"players_positions/{playerIdx}/offsets"] = positions.offsets
+            arrays[f"players_yaws/{playerIdx}"] = np.asarray(trial.playersYaws[playerIdx], dtype=np.float32)
+            arrays[f"players_actions/{playerIdx}"] = TrialPackage._encodeEnums(trial.playersActions[playerIdx])
+            arrays[f"players_equipped_items/{playerIdx}"] = TrialPackage._encodeEnums(
+                trial.playersEquippedItems[playerIdx])
+
+        for name, log in TrialPackage._getEventLogs(trial).items():
+            arrays[f"{name}/time_steps"] = log.timeSteps
+            arrays.update({f"{name}/{column}": values for column, values in
+                           TrialPackage._getEventEncoder(name)(log.events).items()})
+            eventLogLengths[name] = len(log)
+
+        # Both tables index the strings of the trial
+        arrays.update(TrialPackage._encodeStrings("strings", trial.strings.strings))
+        for name, table in zip(TrialPackage.MESSAGE_TABLES, [trial.chatMessages, trial.speechTranscriptions]):
+            arrays.update({f"{name}/{column}": getattr(table, column) for column in
+                           TrialPackage.MESSAGE_TABLE_COLUMNS})
+
+        arrays.update({f"victim_list/{column}": values for column, values in
+                       TrialPackage._encodeVictims(trial.victimList).items()})
+        arrays["rubble_list/positions"] = TrialPackage._encodePositions(trial.rubbleList)
+        arrays["threat_plate_list/positions"] = TrialPackage._encodePositions(trial.threatPlateList)
+        arrays["victim_signal_plate_list/positions"] = TrialPackage._encodePositions(trial.victimSignalPlateList)
+
+        manifest = {
+            "format": TrialPackage.FORMAT,
+            "version": TrialPackage.VERSION,
+            "parser_version": Trial.PARSER_VERSION,
+            "time_steps": trial.timeSteps,
+            "metadata": TrialPackage._encodeMetadata(trial.metadata),
+            "map_metadata": trial.map.metadata,
+            "event_log_lengths": eventLogLengths,
+            "arrays": sorted(arrays.keys())
+        }
+
+        directory = os.path.dirname(filepath)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        with open(filepath, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as zipFile:
+            zipFile.writestr(TrialPackage.MANIFEST, json.dumps(manifest, indent=2))
+            for name, array in arrays.items():
+                TrialPackage._writeArray(zipFile, f, f"{name}.npy", array)
+
+    @staticmethod
+    def read(trial: Trial, filepath: str, memoryMap: bool = True):
+        """
+        Reads a package into a trial. If memoryMap is True, the arrays of the trial are read-only views of the
+        package file. Otherwise, they are loaded in memory.
+
+        Only arrays are read upfront. Sections made of Python objects are created when they are first accessed: event
+        logs decode the events of a time step when the time step is first indexed, and the other sections are deferred
+        in the trial (see Trial.deferSection).
+        """
+
+        manifest, arrays = TrialPackage._readArrays(filepath, memoryMap)
+
+        trial.timeSteps = manifest["time_steps"]
+        trial.metadata = TrialPackage._decodeMetadata(manifest["metadata"])
+        trial.map = Map()
+        trial.map.metadata = manifest["map_metadata"]
+        trial.map.grid = arrays["map/grid"]
+        trial.scores = arrays["scores"]
+        trial.activeBlackout = arrays["active_blackout"]
+
+        trial.playersPositions = [PositionSeries.fromArrays(arrays[f"players_positions/{playerIdx}/coordinates"],
+                                                            arrays[f"players_positions/{playerIdx}/offsets"])
+                                  for playerIdx in range(Constants.NUM_ROLES)]
+        trial.playersYaws = [GrowableArray.fromArray(arrays[f"players_yaws/{playerIdx}"])
+                             for playerIdx in range(Constants.NUM_ROLES)]
+
+        eventLogs = {}
+        for name, numTimeSteps in manifest["event_log_lengths"].items():
+            eventLogs[name] = TrialPackage._createEventLog(name, numTimeSteps, arrays)
+
+        trial.placedMarkers = eventLogs["placed_markers"]
+        trial.removedMarkers = eventLogs["removed_markers"]
+        trial.rubbleCounts = eventLogs["rubble_counts"]
+        trial.savedVictims = eventLogs["saved_victims"]
+        trial.pickedUpVictims = eventLogs["picked_up_victims"]
+        trial.placedVictims = eventLogs["placed_victims"]
+
+        if manifest["version"] == 1:
+            trial.strings = StringPool()
+            trial.chatMessages = Trial.chatMessagesFromPlayerLogs(
+                [eventLogs[f"chat_messages/{playerIdx}"] for playerIdx in range(Constants.NUM_ROLES)], trial.strings)
+            trial.speechTranscriptions = Trial.speechTranscriptionsFromPlayerLogs(
+                [eventLogs[f"speech_transcriptions/{playerIdx}"] for playerIdx in range(Constants.NUM_ROLES)],
+                trial.strings, trial.metadata)
+        else:
+            # The pool is small compared to the tables, as repeated strings are stored once
+            trial.strings = StringPool.fromStrings(TrialPackage._decodeStrings("strings", arrays))
+            trial.chatMessages, trial.speechTranscriptions = [
+                MessageTable.fromArrays(trial.strings, *[arrays[f"{name}/{column}"] for column in
+                                                         TrialPackage.MESSAGE_TABLE_COLUMNS])
+                for name in TrialPackage.MESSAGE_TABLES]
+
+        trial.deferSection("playersActions", lambda: [
+            TrialPackage._decodeEnums(arrays[f"players_actions/{playerIdx}"], Constants.Action)
+            for playerIdx in range(Constants.NUM_ROLES)])
+        trial.deferSection("playersEquippedItems", lambda: [
+            TrialPackage._decodeEnums(arrays[f"players_equipped_items/{playerIdx}"], Constants.EquippedItem)
+            for playerIdx in range(Constants.NUM_ROLES)])
+        trial.deferSection("victimList", lambda: TrialPackage._decodeVictims(
+            {"types": arrays["victim_list/types"], "positions": arrays["victim_list/positions"]}))
+        trial.deferSection("rubbleList", lambda: TrialPackage._decodePositions(arrays["rubble_list/positions"]))
+        trial.deferSection("threatPlateList",
+                           lambda: TrialPackage._decodePositions(arrays["threat_plate_list/positions"]))
+        trial.deferSection("victimSignalPlateList",
+                           lambda: TrialPackage._decodePositions(arrays["victim_signal_plate_list/positions"]))
+
+    @staticmethod
+    def _createEventLog(name: str, numTimeSteps: int, arrays: Dict[str, np.ndarray]) -> EventLog:
+        prefix = f"{name}/"
+        columns = {key[len(prefix):]: values for key, values in arrays.items() if key.startswith(prefix)}
+        timeSteps = columns.pop("time_steps")
+        decode = TrialPackage._getEventDecoder(name)
+
+        def decodeRange(start: int, end: int) -> List[Any]:
+            slicedColumns = {}
+            for column, values in columns.items():
+                if column.endswith("_offsets"):
+                    slicedColumns[column] = values[start:end + 1]
+                elif f"{column}_offsets" in columns:
+                    # String buffers are indexed by their offsets
+                    slicedColumns[column] = values
+                else:
+                    slicedColumns[column] = values[start:end]
+            return decode(slicedColumns)
+
+        return EventLog.fromDecoder(timeSteps, numTimeSteps, decodeRange)
+
+    @staticmethod
+    def _getEventLogs(trial: Trial) -> Dict[str, EventLog]:
+        return {
+            "placed_markers": trial.placedMarkers,
+            "removed_markers": trial.removedMarkers,
+            "rubble_counts": trial.rubbleCounts,
+            "saved_victims": trial.savedVictims,
+            "picked_up_victims": trial.pickedUpVictims,
+            "placed_victims": trial.placedVictims
+        }
+
+    @staticmethod
+    def _getEventEncoder(name: str) -> Callable[[List[Any]], Dict[str, np.ndarray]]:
+        kind = name.split("/")[0]
+        if kind.endswith("markers"):
+            return TrialPackage._encodeMarkers
+        elif kind.endswith("victims"):
+            return TrialPackage._encodeVictims
+        else:
+            return TrialPackage._encodeRubbleCounts
+
+    @staticmethod
+    def _getEventDecoder(name: str) -> Callable[[Dict[str, np.ndarray]], List[Any]]:
+        kind = name.split("/")[0]
+        if kind.endswith("markers"):
+            return TrialPackage._decodeMarkers
+        elif kind.endswith("victims"):
+            return TrialPackage._decodeVictims
+        elif kind == "rubble_counts":
+            return TrialPackage._decodeRubbleCounts
+        # Chat messages and speech transcriptions of version 1 packages
+        elif kind == "chat_messages":
+            return TrialPackage._decodeChatMessages
+        else:
+            return TrialPackage._decodeTexts
+
+    @staticmethod
+    def _encodeMarkers(markers: List[Marker]) -> Dict[str, np.ndarray]:
+        return {"types": TrialPackage._encodeEnums([marker.markerType for marker in markers]),
+                "positions": TrialPackage._encodePositions([marker.position for marker in markers])}
+
+    @staticmethod
+    def _decodeMarkers(columns: Dict[str, np.ndarray]) -> List[Marker]:
+        markerTypes = TrialPackage._decodeEnums(columns["types"], Constants.MarkerType)
+        return [Marker(markerType, x, y) for markerType, (x, y) in zip(markerTypes, columns["positions"].tolist())]
+
+    @staticmethod
+    def _encodeVictims(victims: List[Victim]) -> Dict[str, np.ndarray]:
+        return {"types": TrialPackage._encodeEnums([victim.victimType for victim in victims]),
+                "positions": TrialPackage._encodePositions([victim.position for victim in victims])}
+
+    @staticmethod
+    def _decodeVictims(columns: Dict[str, np.ndarray]) -> List[Victim]:
+        victimTypes = TrialPackage._decodeEnums(columns["types"], Constants.VictimType)
+        return [Victim(victimType, x, y) for victimType, (x, y) in zip(victimTypes, columns["positions"].tolist())]
+
+    @staticmethod
+    def _encodeRubbleCounts(rubbleCounts: List[Tuple[Position, int]]) -> Dict[str, np.ndarray]:
+        return {"positions": TrialPackage._encodePositions([position for position, _ in rubbleCounts]),
+                "counts": np.array([count for _, count in rubbleCounts], dtype=np.int32)}
+
+    @staticmethod
+    def _decodeRubbleCounts(columns: Dict[str, np.ndarray]) -> List[Tuple[Position, int]]:
+        return [(Position(x, y), count) for (x, y), count in
+                zip(columns["positions"].tolist(), columns["counts"].tolist())]
+
+    @staticmethod
+    def _decodeChatMessages(columns: Dict[str, np.ndarray]) -> List[ChatMessage]:
+        fields = [TrialPackage._decodeStrings(f"{field}s", columns) for field in
+                  ["sender", "addressee", "color", "text"]]
+        return [ChatMessage(*values) for values in zip(*fields)]
+
+    @staticmethod
+    def _decodeTexts(columns: Dict[str, np.ndarray]) -> List[str]:
+        return TrialPackage._decodeStrings("texts", columns)
+
+    @staticmethod
+    def _encodeStrings(name: str, strings: List[str]) -> Dict[str, np.ndarray]:
+        encodedStrings = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encodedStrings) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encodedStrings], out=offsets[1:])
+        return {name: np.frombuffer(b"".join(encodedStrings), dtype=np.uint8),
+                f"{name}_offsets": offsets}
+
+    @staticmethod
+    def _decodeStrings(name: str, columns: Dict[str, np.ndarray]) -> List[str]:
+        offsets = columns[f"{name}_offsets"].tolist()
+        if len(offsets) < 2:
+            return []
+
+        buffer = columns[name][offsets[0]:offsets[-1]].tobytes()
+        return [buffer[start - offsets[0]:end - offsets[0]].decode("utf-8") for start, end in
+                zip(offsets[:-1], offsets[1:])]
+
+    @staticmethod
+    def _encodePositions(positions: List[Position]) -> np.ndarray:
+        return np.array([(position.x, position.y) for position in positions], dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def _decodePositions(positions: np.ndarray) -> List[Position]:
+        return [Position(x, y) for x, y in positions.tolist()]
+
+    @staticmethod
+    def _encodeEnums(values: List[Enum]) -> np.ndarray:
+        return np.array([TrialPackage.NONE_ENUM_VALUE if value is None else value.value for value in values],
+                        dtype=np.int8)
+
+    @staticmethod
+    def _decodeEnums(values: np.ndarray, enumType: Any) -> List[Enum]:
+        members = {member.value: member for member in enumType}
+        members[TrialPackage.NONE_ENUM_VALUE] = None
+        return [members[value] for value in values.tolist()]
+
+    @staticmethod
+    def _encodeMetadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        # Enums (e.g. roles) are stored by the name of their type in Constants and the name of the member
+        return {key: {"enum": type(value).__name__, "name": value.name} if isinstance(value, Enum) else value for
+                key, value in metadata.items()}
+
+    @staticmethod
+    def _decodeMetadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: getattr(Constants, value["enum"])[value["name"]] if isinstance(value, dict) and "enum" in value
+                else value for key, value in metadata.items()}
+
+    @staticmethod
+    def _writeArray(zipFile: zipfile.ZipFile, f: Any, name: str, array: np.ndarray):
+        buffer = io.BytesIO()
+        np.lib.format.write_array(buffer, np.ascontiguousarray(array), allow_pickle=False)
+        data = buffer.getvalue()
+
+        # The .npy header is padded to a multiple of 64 bytes, so aligning the start of the member aligns the array
+        info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+        info.compress_type = zipfile.ZIP_STORED
+        headerSize = 30 + len(name.encode("utf-8")) + 4
+        padding = -(f.tell() + headerSize) % TrialPackage.ALIGNMENT
+        info.extra = struct.pack("<HH", TrialPackage.PADDING_HEADER_ID, padding) + b"\0" * padding
+        zipFile.writestr(info, data)
+
+    @staticmethod
+    def _readArrays(filepath: str, memoryMap: bool) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        with zipfile.ZipFile(filepath) as zipFile:
+            manifest = json.loads(zipFile.read(TrialPackage.MANIFEST))
+            if manifest.get("format", None) != TrialPackage.FORMAT:
+                raise ValueError(f"{filepath} is not a trial package.")
+            if manifest["version"] > TrialPackage.VERSION:
+                raise ValueError(f"Trial package version {manifest['version']} is not supported. The newest supported "
+                                 f"version is {TrialPackage.VERSION}.")
+
+            fileBuffer = np.memmap(filepath, dtype=np.uint8, mode="r") if memoryMap else None
+            arrays = {}
+            for info in zipFile.infolist():
+                if not info.filename.endswith(".npy"):
+                    continue
+
+                name = info.filename[:-len(".npy")]
+                if fileBuffer is None or info.compress_type != zipfile.ZIP_STORED:
+                    with zipFile.open(info) as member:
+                        arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                else:
+                    arrays[name] = TrialPackage._mapArray(fileBuffer, info)
+
+        return manifest, arrays
+
+    @staticmethod
+    def _mapArray(fileBuffer: np.ndarray, info: zipfile.ZipInfo) -> np.ndarray:
+        # The local header of a member has a fixed size part of 30 bytes followed by the name and the extra field,
+        # whose lengths are stored in its last 4 bytes.
+        nameLength, extraLength = struct.unpack(
+            "<HH", fileBuffer[info.header_offset + 26:info.header_offset + 30].tobytes())
+        dataOffset = info.header_offset + 30 + nameLength + extraLength
+
+        # Only the .npy header is read. The data stays in the file.
+        prefix = fileBuffer[dataOffset:dataOffset + 12].tobytes()
+        headerLengthSize = 2 if prefix[6] == 1 else 4
+        headerEnd = 8 + headerLengthSize + int.from_bytes(prefix[8:8 + headerLengthSize], "little")
+        member = io.BytesIO(fileBuffer[dataOffset:dataOffset + headerEnd].tobytes())
+        version = np.lib.format.read_magic(member)
+        if version == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(member)
+        else:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(member)
+
+        return np.ndarray(shape, dtype=dtype, buffer=fileBuffer, offset=dataOffset + member.tell(),
+                          order="F" if fortranOrder else "C")
+
+
+def convertPicklePackage(picklePath: str, packagePath: str):
+    """
+    Converts a trial package saved with pickle (.pkl) into the columnar package format.
+    """
+
+    trial = Trial()
+    trial.load(picklePath)
+    trial.save(packagePath)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts pickled trial packages (.pkl) to the columnar format.")
+    parser.add_argument("pickle_packages", type=str, nargs="+", help="Paths to .pkl trial packages.")
+    parser.add_argument("--output_dir", type=str, default=None,
+                        help="Directory where converted packages are saved. Defaults to the directory of each input.")
+    args = parser.parse_args()
+
+    for picklePath in args.pickle_packages:
+        outputDir = os.path.dirname(picklePath) if args.output_dir is None else args.output_dir
+        packagePath = os.path.join(outputDir, f"{os.path.splitext(os.path.basename(picklePath))[0]}.trial")
+        convertPicklePackage(picklePath, packagePath)
+        print(f"{picklePath} -> {packagePath}")
@@ -0,0 +1,77 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, TextIO
+import heapq
+import json
+import multiprocessing
+import os
+
+from tomcat_viz.Common.Files import isCompressedFile
+from tomcat_viz.Parser.MetadataReader import getLineAlignedChunks, readChunk
+from tomcat_viz.Parser.ParseProfiler import ParseProfiler
+from tomcat_viz.Parser.Trial import Trial
+
+
+class ParallelParser:
+    """
+    This class parses a trial file whose chunks are decoded and sorted by a pool of processes (see readChunk). The
+    result is the same as the one of Trial.parse. This requires an uncompressed file opened from disk. Otherwise, the
+    file is parsed by the calling process.
+
+    The relevant lines are decoded again by the calling process, so this is only faster than Trial.parse for large
+    files on machines with idle processors (see benchmarks/parallel_parse.py), and it's not used by default.
+    """
+
+    def __init__(self, trial: Trial, numWorkers: int):
+        self.trial = trial
+        self.numWorkers = numWorkers
+
+    @staticmethod
+    def canSplit(trialMessagesFile: TextIO) -> bool:
+        filepath = getattr(trialMessagesFile, "name", None)
+        # Compressed files (see openFile) cannot be split in byte ranges
+        return isinstance(filepath, str) and os.path.isfile(filepath) and not isCompressedFile(filepath)
+
+    def parse(self, trialMessagesFile: TextIO, profiler: ParseProfiler = None):
+        if self.numWorkers <= 1 or not ParallelParser.canSplit(trialMessagesFile):
+            self.trial.parse(trialMessagesFile, profiler)
+            return
+
+        with self.trial.profiling(profiler):
+            self._parse(trialMessagesFile.name)
+
+    def _parse(self, filepath: str):
+        trial = self.trial
+        chunks = getLineAlignedChunks(filepath, self.numWorkers)
+        topics = Trial._getRelevantTopics()
+        groundTruthTopics = set(Trial.GROUND_TRUTH_TOPICS.keys())
+
+        # Processes are spawned rather than forked so workers don't inherit the state of the GUI
+        # Workers are not profiled. Reading, decoding and sorting are timed as a whole.
+        with trial.profilePhase("read, timestamps and sort (parallel)"), \
+                ProcessPoolExecutor(max_workers=self.numWorkers,
+                                    mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(readChunk, filepath, start, end, topics, Trial.AGENT_NAME, groundTruthTopics)
+                       for start, end in chunks]
+            results = [future.result() for future in futures]
+
+        groundTruthMessagesMap: Dict[str, Any] = {}
+        numLines = 0
+        numSkippedLines = 0
+        numBadLines = 0
+        for _, groundTruthMessages, chunkLines, chunkSkippedLines, chunkBadLines in results:
+            # Chunks are in file order, so the last occurrence of a ground truth message prevails as in a serial read
+            for message in groundTruthMessages:
+                groundTruthMessagesMap[Trial.GROUND_TRUTH_TOPICS[message["topic"]]] = message
+            numLines += chunkLines
+            numSkippedLines += chunkSkippedLines
+            numBadLines += chunkBadLines
+        trial.updateLineCounts(numSkippedLines, numBadLines, numLines)
+
+        # Each chunk is sorted already. Merging them is stable with respect to the order of the chunks, so messages with
+        # the same timestamp end up in the order they have in the file.
+        with trial.profilePhase("merge"):
+            timedLines = list(heapq.merge(*[result[0] for result in results], key=lambda x: x[0]))
+
+        # Lines are decoded again as they are handled (and so timed with the handlers). Lines after the end of the
+        # mission are never decoded.
+        trial.parseSortedMessages(groundTruthMessagesMap, (json.loads(line) for _, line in timedLines))
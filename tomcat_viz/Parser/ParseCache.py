@@ -0,0 +1,151 @@
+from typing import Any, Dict, List
+import json
+import logging
+import os
+
+from tomcat_viz.Common.Files import getFileHash, getFileStat
+from tomcat_viz.Parser.Trial import Trial
+
+logger = logging.getLogger(__name__)
+
+
+class ParseCache:
+    """
+    This class keeps trial packages of parsed .metadata files in a cache directory, so a file that was parsed before is
+    loaded from its package instead. Packages are addressed by the hash of the content of the .metadata file and the
+    version of the parser, so a file is parsed again if it changes or if the parser changes.
+
+    To avoid hashing large files every time they are opened, the hash of a file is stored in an index along with its
+    size and modification time, and it's only computed again if these change.
+
+    The total size of the packages is capped. When the cap is exceeded, the least recently used packages are removed.
+    The modification time of a package is updated whenever it's used, so it gives the order of eviction.
+    """
+
+    INDEX = "index.json"
+    PACKAGE_EXTENSION = ".trial"
+    DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+    def __init__(self, cacheDir: str = None, maxSize: int = DEFAULT_MAX_SIZE):
+        if cacheDir is None:
+            cacheHome = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+            cacheDir = os.path.join(cacheHome, "tomcat-viz")
+
+        self.cacheDir = cacheDir
+        self.maxSize = maxSize
+
+        self._indexPath = os.path.join(cacheDir, ParseCache.INDEX)
+
+    def load(self, trial: Trial, metadataPath: str) -> bool:
+        """
+        Loads the package of a .metadata file into a trial if it's in the cache.
+
+        :return: True if the package was found.
+        """
+
+        packagePath = self._getPackagePath(metadataPath)
+        if not os.path.isfile(packagePath):
+            return False
+
+        try:
+            trial.load(packagePath)
+        except Exception as e:
+            logger.warning("Discarding unreadable cached package %s: %s", packagePath, e)
+            self._removePackage(packagePath)
+            return False
+
+        # Mark the package as the most recently used
+        os.utime(packagePath)
+        return True
+
+    def store(self, trial: Trial, metadataPath: str):
+        """
+        Saves a trial parsed from a .metadata file in the cache and evicts the least recently used packages if the
+        cache exceeds its maximum size.
+        """
+
+        packagePath = self._getPackagePath(metadataPath)
+        temporaryPath = f"{packagePath}.tmp"
+        try:
+            trial.save(temporaryPath)
+        except Exception:
+            # Don't leave a partial package behind (e.g. if the disk is full)
+            if os.path.isfile(temporaryPath):
+                ParseCache._removePackage(temporaryPath)
+            raise
+        os.replace(temporaryPath, packagePath)
+
+        self._evict(keep=packagePath)
+
+    def clear(self):
+        for packagePath in self._getPackagePaths():
+            self._removePackage(packagePath)
+
+    def _getPackagePath(self, metadataPath: str) -> str:
+        fileHash = self._getFileHash(metadataPath)
+        return os.path.join(self.cacheDir, f"{fileHash}_{Trial.PARSER_VERSION}{ParseCache.PACKAGE_EXTENSION}")
+
+    def _getFileHash(self, metadataPath: str) -> str:
+        index = self._loadIndex()
+        key = os.path.abspath(metadataPath)
+        stat = getFileStat(metadataPath)
+
+        entry = index.get(key, None)
+        if entry is not None and entry["stat"] == stat:
+            return entry["hash"]
+
+        fileHash = getFileHash(metadataPath)
+        index[key] = {"stat": stat, "hash": fileHash}
+        try:
+            self._saveIndex(index)
+        except OSError as e:
+            # The hash is still valid. It will be computed again next time.
+            logger.warning("Could not update the parse cache index %s: %s", self._indexPath, e)
+
+        return fileHash
+
+    def _getPackagePaths(self) -> List[str]:
+        if not os.path.isdir(self.cacheDir):
+            return []
+
+        return [os.path.join(self.cacheDir, filename) for filename in os.listdir(self.cacheDir) if
+                filename.endswith(ParseCache.PACKAGE_EXTENSION)]
+
+    def _evict(self, keep: str):
+        packages = []
+        for packagePath in self._getPackagePaths():
+            stat = os.stat(packagePath)
+            packages.append((stat.st_mtime_ns, stat.st_size, packagePath))
+
+        totalSize = sum(size for _, size, _ in packages)
+        for _, size, packagePath in sorted(packages):
+            if totalSize <= self.maxSize:
+                break
+            if packagePath != keep and self._removePackage(packagePath):
+                totalSize -= size
+
+    @staticmethod
+    def _removePackage(packagePath: str) -> bool:
+        try:
+            os.remove(packagePath)
+            return True
+        except OSError:
+            # The package may be memory-mapped by a trial on platforms that don't allow removing open files
+            return False
+
+    def _loadIndex(self) -> Dict[str, Any]:
+        if not os.path.isfile(self._indexPath):
+            return {}
+
+        try:
+            with open(self._indexPath, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _saveIndex(self, index: Dict[str, Any]):
+        os.makedirs(self.cacheDir, exist_ok=True)
+        temporaryPath = f"{self._indexPath}.tmp"
+        with open(temporaryPath, "w") as f:
+            json.dump(index, f)
+        os.replace(temporaryPath, self._indexPath)
@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class ParseProfiler:
+    """
+    This class collects a profile of the parsing of a trial when given to Trial.parse (or to the parse method of
+    StreamingParser or ParallelParser): the time spent in each phase (reading, ground truth, timestamps, sorting,
+    handlers, etc.), the number of messages and the time spent decoding and handling them per topic, the number of calls
+    and the time per handler, line counts with samples of bad lines and the peak memory.
+
+    Python allocations are traced to measure the peak memory of the parse, which slows it down. Tracing can be turned
+    off to get more accurate times, in which case only the peak resident memory of the process is reported.
+    """
+
+    SKIPPED_LINES = "<skipped lines>"
+    BAD_LINES = "<bad lines>"
+    NO_TOPIC = "<no topic>"
+
+    def __init__(self, traceMemory: bool = True):
+        self.traceMemory = traceMemory
+
+        self.totalTime = 0.0
+        self.phases: Dict[str, float] = {}
+        self.topics: Dict[str, Dict[str, Any]] = {}
+        self.handlers: Dict[str, Dict[str, Any]] = {}
+        self.numLines = 0
+        self.numSkippedLines = 0
+        self.numBadLines = 0
+        self.badLines: List[Dict[str, Any]] = []
+        self.peakTracedMemory = None
+        self.peakResidentMemory = None
+
+        self._startTime = None
+        self._startedTracing = False
+
+    def start(self):
+        self._startTime = time.perf_counter()
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._startedTracing = True
+
+    def stop(self):
+        self.totalTime += time.perf_counter() - self._startTime
+        if self._startedTracing:
+            self.peakTracedMemory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self._startedTracing = False
+
+        if resource is not None:
+            # Kilobytes on Linux and bytes on macOS
+            maxResidentMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peakResidentMemory = maxResidentMemory if sys.platform == "darwin" else maxResidentMemory * 1024
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def addDecoding(self, topic: str, elapsed: float):
+        """
+        Records the time spent reading a line that belongs to a topic, from the pre-filter to the json decoding.
+        """
+
+        entry = self._getTopicEntry(topic)
+        entry["lines"] += 1
+        entry["decode_seconds"] += elapsed
+
+    def addHandling(self, handlerName: str, topic: str, elapsed: float):
+        entry = self._getTopicEntry(topic)
+        entry["handler_calls"] += 1
+        entry["handler_seconds"] += elapsed
+
+        entry = self.handlers.setdefault(handlerName, {"calls": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        entry["seconds"] += elapsed
+
+    def setLineCounts(self, numLines: int, numSkippedLines: int, numBadLines: int,
+                      badLines: List[Dict[str, Any]] = None):
+        self.numLines = numLines
+        self.numSkippedLines = numSkippedLines
+        self.numBadLines = numBadLines
+        self.badLines = badLines if badLines is not None else []
+
+    def toDict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": self.totalTime,
+            "phases": self.phases,
+            "topics": self.topics,
+            "handlers": self.handlers,
+            "lines": {"total": self.numLines, "skipped": self.numSkippedLines, "bad": self.numBadLines},
+            "bad_lines": self.badLines,
+            "memory": {"peak_traced_bytes": self.peakTracedMemory, "peak_resident_bytes": self.peakResidentMemory}
+        }
+
+    def toJson(self) -> str:
+        return json.dumps(self.toDict(), indent=2)
+
+    def formatTable(self) -> str:
+        lines = [f"Total: {self.totalTime:.3f}s", "", f"{'Phase':<40} {'Seconds':>10} {'%':>6}"]
+        for name, seconds in sorted(self.phases.items(), key=lambda x: -x[1]):
+            lines.append(f"{name:<40} {seconds:>10.3f} {self._getPercentage(seconds):>6.1f}")
+
+        lines += ["", f"{'Topic':<40} {'Lines':>8} {'Decode s':>10} {'Handled':>8} {'Handler s':>10}"]
+        for topic, entry in sorted(self.topics.items(),
+                                   key=lambda x: -(x[1]["decode_seconds"] + x[1]["handler_seconds"])):
+            lines.append(f"{topic[:40]:<40} {entry['lines']:>8} {entry['decode_seconds']:>10.3f} "
+                         f"{entry['handler_calls']:>8} {entry['handler_seconds']:>10.3f}")
+
+        lines += ["", f"{'Handler':<40} {'Calls':>8} {'Seconds':>10} {'%':>6}"]
+        for name, entry in sorted(self.handlers.items(), key=lambda x: -x[1]["seconds"]):
+            lines.append(f"{name:<40} {entry['calls']:>8} {entry['seconds']:>10.3f} "
+                         f"{self._getPercentage(entry['seconds']):>6.1f}")
+
+        lines += ["", f"Lines: {self.numLines} total, {self.numSkippedLines} skipped, {self.numBadLines} bad"]
+        for badLine in self.badLines:
+            lines.append(f"  line {badLine['line']} ({badLine['length']} characters): {badLine['error']}")
+
+        if self.peakTracedMemory is not None:
+            lines.append(f"Peak traced memory: {self.peakTracedMemory / 2 ** 20:.1f} MiB")
+        if self.peakResidentMemory is not None:
+            lines.append(f"Peak resident memory of the process: {self.peakResidentMemory / 2 ** 20:.1f} MiB")
+
+        return "\n".join(lines)
+
+    def _getTopicEntry(self, topic: str) -> Dict[str, Any]:
+        entry = self.topics.get(topic, None)
+        if entry is None:
+            entry = {"lines": 0, "decode_seconds": 0.0, "handler_calls": 0, "handler_seconds": 0.0}
+            self.topics[topic] = entry
+
+        return entry
+
+    def _getPercentage(self, seconds: float) -> float:
+        return 100 * seconds / self.totalTime if self.totalTime > 0 else 0.0
+
+
+if __name__ == "__main__":
+    # Imported here because the trial imports this module
+    from tomcat_viz.Common.Files import openFile
+    from tomcat_viz.Parser.ParallelParser import ParallelParser
+    from tomcat_viz.Parser.StreamingParser import StreamingParser
+    from tomcat_viz.Parser.Trial import Trial
+
+    parser = argparse.ArgumentParser(description="Parses a .metadata file and reports where the time is spent.")
+    parser.add_argument("metadata", type=str, help="Path to the .metadata file. It can be compressed (.gz, .bz2, .xz).")
+    parser.add_argument("--json", type=str, help="Path of a file where the report is saved as json.")
+    parser.add_argument("--streaming", action="store_true", help="Parse in streaming mode.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used to read the file. Only faster than 1 for large files on "
+                             "machines with idle processors (see benchmarks/parallel_parse.py).")
+    parser.add_argument("--no_memory_tracing", action="store_true",
+                        help="Do not trace Python allocations. Times are more accurate, but only the peak resident "
+                             "memory of the process is reported.")
+    args = parser.parse_args()
+
+    profiler = ParseProfiler(traceMemory=not args.no_memory_tracing)
+    with openFile(args.metadata, "r") as f:
+        if args.streaming:
+            StreamingParser(Trial()).parse(f, profiler)
+        else:
+            ParallelParser(Trial(), args.workers).parse(f, profiler)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            f.write(profiler.toJson())
+    print(profiler.formatTable())
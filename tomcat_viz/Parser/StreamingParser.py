@@ -0,0 +1,92 @@
+from typing import Any, Dict, Iterable, TextIO
+import heapq
+
+from tomcat_viz.Common.Format import timestampToMicroseconds
+from tomcat_viz.Parser.ParseProfiler import ParseProfiler
+from tomcat_viz.Parser.Trial import Trial
+
+
+class StreamingParser:
+    """
+    This class parses the messages of a trial as they are read. Only a window of reorderWindow messages is kept in
+    memory to fix out-of-order timestamps, so memory does not grow with the size of the file. Messages are held in the
+    parsing state of the trial (see ParsingState), so they can be given in several calls (see TrialFollower).
+    """
+
+    # Maximum number of messages held in memory to fix out-of-order timestamps
+    DEFAULT_REORDER_WINDOW = 1000
+
+    def __init__(self, trial: Trial, reorderWindow: int = DEFAULT_REORDER_WINDOW):
+        self.trial = trial
+        self.reorderWindow = reorderWindow
+
+    @property
+    def finished(self) -> bool:
+        # Whether no other message needs to be parsed
+        state = self.trial.parsingState
+        return state is None or state.finished
+
+    def parse(self, trialMessagesFile: TextIO, profiler: ParseProfiler = None):
+        """
+        Parses the messages of an exported trial file, reading lines as they are needed. The result is the same as the
+        one of Trial.parse as long as no message is out of order by more than the window.
+        """
+
+        with self.trial.profiling(profiler):
+            reader = self.trial.createMetadataReader()
+            self.trial.startParsing()
+            # Reading and handling are interleaved. Reading times are given per topic.
+            with self.trial.profilePhase("read and handlers"):
+                self.parseMessages(reader.read(trialMessagesFile))
+            self.trial.updateLineCounts(reader.numSkippedLines, reader.numBadLines, reader.numLines, reader.badLines)
+
+            if not self.finished and "map" not in self.trial.parsingState.parsedGroundTruth:
+                raise KeyError("map")
+            self.finish()
+
+    def parseMessages(self, messages: Iterable[Dict[str, Any]]):
+        """
+        Parses messages as they are read, keeping a window of reorderWindow messages to fix out-of-order timestamps.
+        It stops consuming messages when no other message needs to be parsed. The trial must have started parsing.
+        """
+
+        trial = self.trial
+        state = trial.parsingState
+        for message in messages:
+            groundTruthKey = Trial.GROUND_TRUTH_TOPICS.get(message.get("topic", None), None)
+            if groundTruthKey is not None:
+                state.groundTruthMessagesMap[groundTruthKey] = message
+                if "map" in state.groundTruthMessagesMap:
+                    # Coordinates of ground truth objects are relative to the map bounds, so these messages can only be
+                    # parsed after the map.
+                    for key in ["map"] + list(state.groundTruthMessagesMap.keys()):
+                        if key not in state.parsedGroundTruth:
+                            trial.parseGroundTruthMessage(key, state.groundTruthMessagesMap[key])
+                            state.parsedGroundTruth.add(key)
+                continue
+
+            heapq.heappush(state.reorderWindow,
+                           (timestampToMicroseconds(message["header"]["timestamp"]), state.numReadMessages, message))
+            state.numReadMessages += 1
+
+            # Messages are held until the map is known because player and object positions are relative to its bounds
+            if len(state.reorderWindow) > self.reorderWindow and "map" in state.parsedGroundTruth:
+                if not trial.parseMessage(heapq.heappop(state.reorderWindow)[2]):
+                    # Nothing else to parse. There's no need to read the rest of the messages.
+                    state.finished = True
+                    return
+
+    def finish(self):
+        """
+        Parses the messages left in the window, if the map is known, and finishes the parse.
+        """
+
+        state = self.trial.parsingState
+        if not state.finished and "map" in state.parsedGroundTruth:
+            with self.trial.profilePhase("handlers"):
+                while len(state.reorderWindow) > 0:
+                    if not self.trial.parseMessage(heapq.heappop(state.reorderWindow)[2]):
+                        state.finished = True
+                        break
+        with self.trial.profilePhase("finish"):
+            self.trial.finishParsing()
@@ -1,89 +1,303 @@
-from typing import Any, Dict, List, Set, TextIO
-import os
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Set, TextIO, Tuple
+import itertools
 import json
-from dateutil.parser import parse
 import numpy as np
 import pickle
+import threading
+import time
 
+from tomcat_viz.Parser.Columnar import EventLog, GrowableArray, MessageTable, PositionSeries, StringPool
 from tomcat_viz.Parser.Map import Map
+from tomcat_viz.Parser.MetadataReader import MetadataReader
+from tomcat_viz.Parser.ParseProfiler import ParseProfiler
 from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Common.Memory import MemoryCounter
+from tomcat_viz.Common.Format import timestampToMicroseconds
 
 
-class ChatMessage:
+class ValueType:
+    """
+    This is the base class of the immutable value types of a trial. Subclasses declare their attributes in __slots__,
+    so instances don't carry a dictionary, and set them with object.__setattr__ in the constructor.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable.")
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # Trial packages saved before value types had slots store the attributes of each object in a dictionary.
+        # Restoring them here makes these packages load transparently.
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+class ChatMessage(ValueType):
     """
     This class represents a chat message in the trial. It encapsulates information about the sender, the message and
-    the addressee. It is used so we can create a set of messages to get rid of duplicate ones.
+    the addressees, a bitmask with bit i set if the player of index i received the message.
     """
 
-    def __init__(self, sender: str, addressee: str, color: str, text: str):
-        self.sender = sender
-        self.addressee = addressee
-        self.color = color
-        self.text = text
+    __slots__ = ("sender", "addressees", "color", "text")
+
+    def __init__(self, sender: str, addressees: int, color: str, text: str):
+        object.__setattr__(self, "sender", sender)
+        object.__setattr__(self, "addressees", addressees)
+        object.__setattr__(self, "color", color)
+        object.__setattr__(self, "text", text)
+
+    def isAddressedTo(self, playerIdx: int) -> bool:
+        return bool(self.addressees & (1 << playerIdx))
 
     def __eq__(self, other):
         return (isinstance(other, self.__class__) and
-                getattr(other, 'sender', None) == self.sender and
-                getattr(other, 'addressee', None) == self.addressee and
-                getattr(other, 'text', None) == self.text)
+                other.sender == self.sender and
+                other.addressees == self.addressees and
+                other.text == self.text)
 
     def __hash__(self):
-        return hash(f"{self.sender}#{self.addressee}#{self.text}")
+        return hash((self.sender, self.addressees, self.text))
+
+    def __reduce__(self):
+        return ChatMessage, (self.sender, self.addressees, self.color, self.text)
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # Messages of old packages were stored once per addressee, with the id of the addressee. They are merged into
+        # messages with an addressee bitmask when the package is loaded (see MessageTable.fromPlayerLogs).
+        super().__setstate__({"addressees" if name == "addressee" else name: value for name, value in state.items()})
 
 
-class Position:
+class Position(ValueType):
+    __slots__ = ("x", "y")
 
     def __init__(self, x: float, y: float):
-        self.x = x
-        self.y = y
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
 
     def __eq__(self, other):
-        return (isinstance(other, self.__class__) and
-                getattr(other, 'x', None) == self.x and
-                getattr(other, 'y', None) == self.y)
+        return isinstance(other, self.__class__) and other.x == self.x and other.y == self.y
 
     def __hash__(self):
-        return hash(f"{self.x}#{self.y}")
+        return hash((self.x, self.y))
 
     def __repr__(self):
         return f"{self.x}#{self.y}"
 
+    def __reduce__(self):
+        return Position, (self.x, self.y)
+
+
+class Marker(ValueType):
+    __slots__ = ("markerType", "position")
 
-class Marker:
     def __init__(self, markerType: Constants.MarkerType, x: float, y: float):
-        super().__init__()
-        self.markerType = markerType
-        self.position = Position(x, y)
+        object.__setattr__(self, "markerType", markerType)
+        object.__setattr__(self, "position", Position(x, y))
 
     def __eq__(self, other):
         return (isinstance(other, self.__class__) and
-                getattr(other, 'markerType', None) == self.markerType and
-                getattr(other, 'position', None) == self.position)
+                other.markerType == self.markerType and
+                other.position == self.position)
 
     def __hash__(self):
-        return hash(f"{self.markerType}#{self.position}")
+        return hash((self.markerType, self.position.x, self.position.y))
 
     def __repr__(self):
         return f"{self.markerType}#{self.position}"
 
+    def __reduce__(self):
+        return Marker, (self.markerType, self.position.x, self.position.y)
+
+
+class Victim(ValueType):
+    __slots__ = ("victimType", "position")
 
-class Victim:
     def __init__(self, victimType: Constants.VictimType, x: float, y: float):
-        super().__init__()
-        self.victimType = victimType
-        self.position = Position(x, y)
+        object.__setattr__(self, "victimType", victimType)
+        object.__setattr__(self, "position", Position(x, y))
 
     def __eq__(self, other):
         return (isinstance(other, self.__class__) and
-                getattr(other, 'victimType', None) == self.victimType and
-                getattr(other, 'position', None) == self.position)
+                other.victimType == self.victimType and
+                other.position == self.position)
 
     def __hash__(self):
-        return hash(f"{self.victimType}#{self.position}")
+        return hash((self.victimType, self.position.x, self.position.y))
 
     def __repr__(self):
         return f"{self.victimType}#{self.position}"
 
+    def __reduce__(self):
+        return Victim, (self.victimType, self.position.x, self.position.y)
+
+
+class WorldState:
+    """
+    This class represents the objects in the map at a time step: the marker and the victim in each position, the
+    number of rubbles stacked in each position and the positions where a victim was expected but not found. Events are
+    applied with the same rules the map widget uses to draw them.
+    """
+
+    SAFE_VICTIM_TYPES = {
+        Constants.VictimType.A: Constants.VictimType.SAFE_A,
+        Constants.VictimType.B: Constants.VictimType.SAFE_B,
+        Constants.VictimType.CRITICAL: Constants.VictimType.SAFE_CRITICAL
+    }
+
+    def __init__(self):
+        self.markers: Dict[Position, Constants.MarkerType] = {}
+        self.rubbleCounts: Dict[Position, int] = {}
+        self.victims: Dict[Position, Constants.VictimType] = {}
+        self.missingVictims: Set[Position] = set()
+
+    @classmethod
+    def fromGroundTruth(cls, trial: "Trial") -> "WorldState":
+        state = cls()
+        for victim in trial.victimList:
+            if victim.victimType in WorldState.SAFE_VICTIM_TYPES:
+                state.victims[victim.position] = victim.victimType
+        for rubblePosition in trial.rubbleList:
+            state.rubbleCounts[rubblePosition] = state.rubbleCounts.get(rubblePosition, 0) + 1
+
+        return state
+
+    def copy(self) -> "WorldState":
+        state = WorldState()
+        state.markers = self.markers.copy()
+        state.rubbleCounts = self.rubbleCounts.copy()
+        state.victims = self.victims.copy()
+        state.missingVictims = self.missingVictims.copy()
+        return state
+
+    def apply(self, removedMarkers: List[Marker], placedMarkers: List[Marker], rubbleCounts: List[Tuple[Position, int]],
+              savedVictims: List[Victim], pickedUpVictims: List[Victim], placedVictims: List[Victim]):
+        """
+        Applies the events of a time step.
+        """
+
+        for marker in removedMarkers:
+            self.markers.pop(marker.position, None)
+        for marker in placedMarkers:
+            self.markers[marker.position] = marker.markerType
+
+        for position, count in rubbleCounts:
+            if position in self.rubbleCounts:
+                self.rubbleCounts[position] += count
+                if self.rubbleCounts[position] == 0:
+                    del self.rubbleCounts[position]
+            elif count > 0:
+                self.rubbleCounts[position] = count
+
+        for victim in savedVictims:
+            safeType = WorldState.SAFE_VICTIM_TYPES.get(victim.victimType, Constants.VictimType.SAFE_CRITICAL)
+            if Victim(safeType, victim.position.x, victim.position.y) in pickedUpVictims:
+                # Saved and picked up in the same time step
+                continue
+            if victim.position in self.victims:
+                self.victims[victim.position] = safeType
+            else:
+                self.missingVictims.add(victim.position)
+        for victim in pickedUpVictims:
+            if victim.position in self.victims:
+                del self.victims[victim.position]
+            else:
+                self.missingVictims.add(victim.position)
+        for victim in placedVictims:
+            # Victims of unknown type are not drawn
+            if victim.victimType is not None:
+                self.victims[victim.position] = victim.victimType
+
+    def diff(self, other: "WorldState") -> "WorldStateDiff":
+        """
+        Gets the changes from this state to another one.
+        """
+
+        return WorldStateDiff(WorldState._diffEntries(self.markers, other.markers),
+                              WorldState._diffEntries(self.rubbleCounts, other.rubbleCounts),
+                              WorldState._diffEntries(self.victims, other.victims),
+                              WorldState._diffEntries(dict.fromkeys(self.missingVictims, True),
+                                                      dict.fromkeys(other.missingVictims, True)))
+
+    @staticmethod
+    def _diffEntries(entries1: Dict[Position, Any], entries2: Dict[Position, Any]) -> Dict[Position, Tuple[Any, Any]]:
+        changes = {}
+        for position, value in entries1.items():
+            otherValue = entries2.get(position, None)
+            if otherValue != value:
+                changes[position] = (value, otherValue)
+        for position, value in entries2.items():
+            if position not in entries1:
+                changes[position] = (None, value)
+
+        return changes
+
+
+class WorldStateDiff:
+    """
+    This class represents the changes in the objects in the map between two time steps. Each dictionary maps a position
+    to a pair (value before, value after), where None means that the position had no such object. Missing victims
+    have the value True.
+    """
+
+    def __init__(self, markers: Dict[Position, Tuple[Any, Any]], rubbleCounts: Dict[Position, Tuple[Any, Any]],
+                 victims: Dict[Position, Tuple[Any, Any]], missingVictims: Dict[Position, Tuple[Any, Any]]):
+        self.markers = markers
+        self.rubbleCounts = rubbleCounts
+        self.victims = victims
+        self.missingVictims = missingVictims
+
+    def isEmpty(self) -> bool:
+        return (len(self.markers) == 0 and len(self.rubbleCounts) == 0 and len(self.victims) == 0 and
+                len(self.missingVictims) == 0)
+
+
+class ParsingState:
+    """
+    This class holds the values collected while the messages of a trial are parsed. Some of them are only written to
+    the trial when a time step is complete. Keeping them together allows messages to be parsed one at a time.
+    """
+
+    def __init__(self):
+        self.nextTimeStep = 0
+        self.missionStarted = False
+        self.playerIdToColor: Dict[str, str] = {}
+
+        # These variables contain valid values per time step.
+        # Some will have their value reset in the end of a time step.
+        self.currentScore = 0
+        self.currentPlayersPositions: List[List[Position]] = [[] for _ in range(Constants.NUM_ROLES)]
+        self.currentPlayersYaws: List[float] = [0 for _ in range(Constants.NUM_ROLES)]
+        self.currentPlacedMarkers: Set[Marker] = set()
+        self.currentRemovedMarkers: Set[Marker] = set()
+        # Addressees bitmask per color per (sender, text). A message sent again to a player in the same time step is
+        # kept once, with the color it was first sent with.
+        self.currentChatMessages: Dict[Tuple[str, str], Dict[str, int]] = {}
+        # Rows (speaker id, speaker bitmask, color, text) of the message table of speech transcriptions
+        self.currentSpeechTranscriptions: List[Tuple[str, int, str, str]] = []
+        self.currentPlayersActions = [Constants.Action.NONE for _ in range(Constants.NUM_ROLES)]
+        self.currentRubbleCounts: Dict[Position, int] = {}
+        self.collapsedRubbleCounts: Set[Position] = set()
+        self.currentActiveBlackout = False
+        self.currentSavedVictims: Set[Victim] = set()
+        self.currentPickedUpVictims: Set[Victim] = set()
+        self.currentPlacedVictims: Set[Victim] = set()
+        self.currentPlayersEquippedItems = [Constants.EquippedItem.HAMMER for _ in range(Constants.NUM_ROLES)]
+
+        # These variables are used when messages are parsed as they are read (see StreamingParser and TrialFollower).
+        self.groundTruthMessagesMap: Dict[str, Any] = {}
+        self.parsedGroundTruth: Set[str] = set()
+        # Min-heap of messages ordered by timestamp. Ties are broken by the order of the message in the file, which
+        # gives the same ordering as the stable sort used when the whole file is loaded at once.
+        self.reorderWindow: List[Tuple[int, int, Dict[str, Any]]] = []
+        self.numReadMessages = 0
+        # Whether no other message needs to be parsed
+        self.finished = False
+
 
 class Trial:
     USED_TOPICS = [
@@ -113,9 +327,36 @@ class Trial:
     THREAT_PLATE_LIST_TOPIC = "ground_truth/mission/threatsign_list"
     VICTIM_SIGNAL_PLATE_LIST_TOPIC = "ground_truth/mission/freezeblock_list"
 
+    GROUND_TRUTH_TOPICS = {
+        MAP_TOPIC: "map",
+        VICTIM_LIST_TOPIC: "victim_list",
+        RUBBLE_LIST_TOPIC: "rubble_list",
+        THREAT_PLATE_LIST_TOPIC: "threat_plate_list",
+        VICTIM_SIGNAL_PLATE_LIST_TOPIC: "victim_signal_plate_list"
+    }
+
     AGENT_NAME = "ASI_UAZ_TA1_ToMCAT"
     AGENT_ALIAS = "ToMCAT"
 
+    # Version of the parser. It must be incremented whenever a change in the parser changes the content of parsed
+    # trials, so packages created from .metadata files by an older parser are not reused (see BatchConverter and
+    # ParseCache).
+    PARSER_VERSION = 1
+
+    # Handlers per (message type, sub type) in lower case. Each handler receives the trial and a message, and returns
+    # False if no other message needs to be parsed. Handlers flagged as mission only are skipped until the mission
+    # starts.
+    _messageHandlers: Dict[Tuple[str, str], List[Tuple[Callable[["Trial", Dict[str, Any]], bool], bool]]] = {}
+
+    # Interval (in time steps) between the keyframes of the state of the world (see stateAt)
+    KEYFRAME_INTERVAL = 30
+
+    # Attributes reported by getMemoryFootprint, in the order they are measured
+    MEMORY_FIELDS = ["map", "victimList", "rubbleList", "threatPlateList", "victimSignalPlateList", "metadata",
+                     "scores", "placedMarkers", "removedMarkers", "activeBlackout", "savedVictims", "pickedUpVictims",
+                     "placedVictims", "rubbleCounts", "playersPositions", "playersYaws", "strings", "chatMessages",
+                     "speechTranscriptions", "playersActions", "playersEquippedItems", "_keyframes"]
+
     def __init__(self, timeSteps: int = 900):
         self.timeSteps = timeSteps
 
@@ -128,421 +369,784 @@ class Trial:
 
         self.metadata = {}
         self.scores = np.array([])
-        self.placedMarkers: List[Set[Marker]] = []
-        self.removedMarkers: List[Set[Marker]] = []
+        # Events are stored only in the time step they happened. Indexing an event log by time step gives the list of
+        # events in that time step.
+        self.placedMarkers = EventLog()
+        self.removedMarkers = EventLog()
         self.activeBlackout: List[bool] = []
-        self.savedVictims: List[Set[Victim]] = []
-        self.pickedUpVictims: List[Set[Victim]] = []
-        self.placedVictims: List[Set[Victim]] = []
+        self.savedVictims = EventLog()
+        self.pickedUpVictims = EventLog()
+        self.placedVictims = EventLog()
 
-        # List of rubbles added or removed in each position per time step
-        self.rubbleCounts: List[Dict[Position, int]] = []
+        # Pairs (position, count) with the number of rubbles added or removed in a position per time step
+        self.rubbleCounts = EventLog()
 
         # Each list contains 3 entries. One per player. For each player there will be #timeSteps entries. And for each
         # of these, there might be multiple values (e.g. chat messages)
-        self.playersPositions: List[List[List[Position]]] = []
-        self.playersYaws: List[List[float]] = []
-        self.chatMessages: List[List[Set[ChatMessage]]] = []
-        self.speechTranscriptions: List[List[List[str]]] = []
+        # Positions and yaws are stored in float32 arrays. Indexing a position series by time step gives the list of
+        # positions of the player in that time step.
+        self.playersPositions: List[PositionSeries] = []
+        self.playersYaws: List[GrowableArray] = []
         self.playersActions: List[List[Constants.Action]] = []
         self.playersEquippedItems: List[List[Constants.EquippedItem]] = []
 
+        # Chat messages and speech transcriptions are stored once, with a bitmask of the players they concern: the
+        # addressees of a chat message and the speaker of a transcription. Their strings are interned in a pool shared
+        # by both tables.
+        self.strings = StringPool()
+        self.chatMessages = MessageTable(self.strings)
+        self.speechTranscriptions = MessageTable(self.strings)
+
+        # Number of lines of the last parsed file that were not decoded because they cannot contain relevant messages,
+        # and number of lines that are not valid json.
+        self.numSkippedLines = 0
+        self.numBadLines = 0
+
+        self._parsingState = None
+        # Profiler of the current parse, if any
+        self._profiler = None
+
+        # Sections of a loaded package that were not created yet, and the functions that create them
+        self._sectionLoaders: Dict[str, Callable[[], Any]] = {}
+        self._sectionLock = threading.RLock()
+
+        # State of the world every KEYFRAME_INTERVAL time steps. They are created as they are needed.
+        self._keyframes: List[WorldState] = []
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called when an attribute is not found, which is the case of deferred sections not accessed yet
+        if "_sectionLock" in self.__dict__:
+            with self._sectionLock:
+                self._loadSection(name)
+                if name in self.__dict__:
+                    # The section may also have been created by another thread
+                    return self.__dict__[name]
+
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+
+    @classmethod
+    def registerMessageHandler(cls, messageType: str, subType: str,
+                               handler: Callable[["Trial", Dict[str, Any]], bool], missionOnly: bool = False):
+        """
+        Registers a function to be called for every message of a given type and sub type, in addition to the ones
+        already registered for it. Handlers are called in the order they were registered. The topic of the message must
+        be in Trial.USED_TOPICS for it to reach the handlers.
+        """
+
+        key = (messageType.lower(), subType.lower())
+        cls._messageHandlers.setdefault(key, []).append((handler, missionOnly))
+
+    def deferSection(self, name: str, loader: Callable[[], Any]):
+        """
+        Defers the creation of an attribute of the trial until it is first accessed or the trial is preloaded.
+        """
+
+        with self._sectionLock:
+            self.__dict__.pop(name, None)
+            self._sectionLoaders[name] = loader
+
+    def preload(self):
+        """
+        Creates all the deferred sections and decodes all the events of lazy event logs.
+        """
+
+        for name in list(self._sectionLoaders.keys()):
+            self._loadSection(name)
+        for log in self._getEventLogs():
+            log.materialize()
+
+    def preloadInBackground(self) -> threading.Thread:
+        thread = threading.Thread(target=self.preload, daemon=True)
+        thread.start()
+        return thread
+
+    def getMemoryFootprint(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Measures the memory retained by each field of the trial (see MemoryCounter). Deferred sections that were not
+        created yet are reported as not loaded, and measuring them does not create them.
+
+        :return: bytes in memory and bytes of memory-mapped files per field.
+        """
+
+        counter = MemoryCounter()
+        footprint = {}
+        for name in Trial.MEMORY_FIELDS:
+            # Read from the dictionary, so deferred sections are not created by __getattr__
+            loaded = name in self.__dict__
+            numBytes, numMappedBytes = counter.measure(self.__dict__[name]) if loaded else (0, 0)
+            footprint[name.lstrip("_")] = {"bytes": numBytes, "mapped_bytes": numMappedBytes, "loaded": loaded}
+
+        return footprint
+
+    def _loadSection(self, name: str):
+        with self._sectionLock:
+            loader = self._sectionLoaders.get(name, None)
+            if loader is not None:
+                self.__dict__[name] = loader()
+                del self._sectionLoaders[name]
+
+    def _clearDeferredSections(self):
+        with self._sectionLock:
+            self._sectionLoaders.clear()
+
     def save(self, filepath: str):
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-        trialPackage = {
-            "map": self.map,
-            "metadata": self.metadata,
-            "scores": self.scores,
-            "players_positions": self.playersPositions,
-            "players_yaws": self.playersYaws,
-            "placed_markers": self.placedMarkers,
-            "removed_markers": self.removedMarkers,
-            "chat_messages": self.chatMessages,
-            "players_actions": self.playersActions,
-            "rubble_counts": self.rubbleCounts,
-            "active_blackout": self.activeBlackout,
-            "saved_victims": self.savedVictims,
-            "picked_up_victims": self.pickedUpVictims,
-            "placed_victims": self.placedVictims,
-            "players_equipped_items": self.playersEquippedItems,
-            "victim_list": self.victimList,
-            "rubble_list": self.rubbleList,
-            "threat_plate_list": self.threatPlateList,
-            "victim_signal_plate_list": self.victimSignalPlateList,
-            "speech_transcriptions": self.speechTranscriptions
-        }
-
-        with open(filepath, "wb") as f:
-            pickle.dump(trialPackage, f)
-
-    def load(self, filepath: str):
+        """
+        Saves the trial as a columnar trial package (see TrialPackage).
+        """
+
+        # Imported here to avoid a circular import as the package module builds the value types of the trial
+        from tomcat_viz.Parser.Package import TrialPackage
+
+        TrialPackage.write(self, filepath)
+
+    def load(self, filepath: str, memoryMap: bool = True):
+        """
+        Loads a trial package. Packages saved with pickle (.pkl) by older versions are also accepted.
+        """
+
+        from tomcat_viz.Parser.Package import TrialPackage
+
+        self._clearDeferredSections()
+        self._keyframes = []
+        if TrialPackage.isPackage(filepath):
+            TrialPackage.read(self, filepath, memoryMap)
+        else:
+            self._loadPickle(filepath)
+
+    def _loadPickle(self, filepath: str):
         with open(filepath, "rb") as f:
             trialPackage = pickle.load(f)
 
         self.map = trialPackage["map"]
         self.metadata = trialPackage["metadata"]
         self.scores = trialPackage["scores"]
-        self.playersPositions = trialPackage["players_positions"]
-        self.playersYaws = trialPackage["players_yaws"]
-        self.placedMarkers = trialPackage["placed_markers"]
-        self.removedMarkers = trialPackage["removed_markers"]
-        self.chatMessages = trialPackage["chat_messages"]
+        self.playersPositions = [series if isinstance(series, PositionSeries) else PositionSeries.fromLists(series)
+                                 for series in trialPackage["players_positions"]]
+        self.playersYaws = [yaws if isinstance(yaws, GrowableArray) else GrowableArray.fromValues(yaws, np.float32)
+                            for yaws in trialPackage["players_yaws"]]
+        self.placedMarkers = Trial._toEventLog(trialPackage["placed_markers"])
+        self.removedMarkers = Trial._toEventLog(trialPackage["removed_markers"])
         self.playersActions = trialPackage["players_actions"]
-        self.rubbleCounts = trialPackage["rubble_counts"]
+        self.rubbleCounts = Trial._toEventLog(trialPackage["rubble_counts"])
         self.activeBlackout = trialPackage["active_blackout"]
-        self.savedVictims = trialPackage["saved_victims"]
-        self.pickedUpVictims = trialPackage["picked_up_victims"]
-        self.placedVictims = trialPackage["placed_victims"]
+        self.savedVictims = Trial._toEventLog(trialPackage["saved_victims"])
+        self.pickedUpVictims = Trial._toEventLog(trialPackage["picked_up_victims"])
+        self.placedVictims = Trial._toEventLog(trialPackage["placed_victims"])
         self.playersEquippedItems = trialPackage["players_equipped_items"]
         self.victimList = trialPackage["victim_list"]
         self.rubbleList = trialPackage["rubble_list"]
         self.threatPlateList = trialPackage["threat_plate_list"]
         self.victimSignalPlateList = trialPackage["victim_signal_plate_list"]
-        self.speechTranscriptions = trialPackage["speech_transcriptions"]
+        self.strings = StringPool()
+        self.chatMessages = Trial.chatMessagesFromPlayerLogs(
+            [Trial._toEventLog(messages) for messages in trialPackage["chat_messages"]], self.strings)
+        self.speechTranscriptions = Trial.speechTranscriptionsFromPlayerLogs(
+            [Trial._toEventLog(texts) for texts in trialPackage["speech_transcriptions"]], self.strings, self.metadata)
+
+    def parse(self, trialMessagesFile: TextIO, profiler: ParseProfiler = None):
+        """
+        Parses the messages of an exported trial file. All the relevant messages are loaded and sorted before the time
+        steps are built. Files can also be parsed in streaming mode (see StreamingParser) or with several processes
+        (see ParallelParser), and files that are still being written can be followed (see TrialFollower). These drivers
+        feed the messages to the trial one at a time through startParsing, parseMessage and finishParsing.
+
+        If a profiler is given, the time spent in each phase, topic and handler is recorded in it.
+        """
+
+        with self.profiling(profiler):
+            groundTruthMessagesMap, messages = self._readGroundTruthAndSortRemainingMessages(trialMessagesFile)
+            self.parseSortedMessages(groundTruthMessagesMap, messages)
+
+    def parseSortedMessages(self, groundTruthMessagesMap: Dict[str, Any], messages: Iterable[Dict[str, Any]]):
+        """
+        Parses messages that were already read from a file (e.g. a segment of a file with several trials, see
+        TrialSplitter). Ground truth messages are given per key of GROUND_TRUTH_TOPICS, and the other messages must be
+        sorted by timestamp.
+        """
 
-    def parse(self, trialMessagesFile: TextIO):
-        messages = self._parseGroundTruthAndSortRemainingMessages(trialMessagesFile)
+        self._parseGroundTruthMessages(groundTruthMessagesMap)
 
-        if len(messages) == 0:
+        # Nothing but the ground truth is parsed if there are no messages
+        messages = iter(messages)
+        firstMessage = next(messages, None)
+        if firstMessage is None:
             return
 
-        nextTimeStep = 0
-        missionStarted = False
-        playerIdToColor = {}
+        self.startParsing()
+        with self.profilePhase("handlers"):
+            for message in itertools.chain([firstMessage], messages):
+                if not self.parseMessage(message):
+                    break
+        with self.profilePhase("finish"):
+            self.finishParsing()
+
+    @contextmanager
+    def profiling(self, profiler: ParseProfiler = None):
+        """
+        Records the time spent in each phase, topic and handler of the parses made in the context in a profiler.
+        Nothing is recorded if no profiler is given.
+        """
+
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.start()
+
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                self._profiler = None
+
+    @property
+    def parsingState(self) -> ParsingState:
+        # State of the current parse, if any
+        return self._parsingState
+
+    @property
+    def numParsedTimeSteps(self) -> int:
+        return len(self.activeBlackout)
+
+    def stateAt(self, timeStep: int) -> WorldState:
+        """
+        Gets the markers, rubble and victims in the map at a time step. The state is restored from the last keyframe
+        before the time step, and only the time steps with events after the keyframe are applied. Events of the first
+        time step are not applied, as the map shows the ground truth in it.
+        """
+
+        if timeStep < 0 or timeStep >= self.numParsedTimeSteps:
+            raise IndexError("Time step out of range.")
+
+        index = timeStep // Trial.KEYFRAME_INTERVAL
+        while len(self._keyframes) <= index:
+            self._addKeyframe()
+
+        state = self._keyframes[index].copy()
+        self._applyEvents(state, index * Trial.KEYFRAME_INTERVAL + 1, timeStep)
+        return state
+
+    def diff(self, timeStep1: int, timeStep2: int) -> WorldStateDiff:
+        """
+        Gets the changes in the markers, rubble and victims in the map from one time step to another.
+        """
+
+        return self.stateAt(timeStep1).diff(self.stateAt(timeStep2))
+
+    def _addKeyframe(self):
+        if len(self._keyframes) == 0:
+            self._keyframes.append(WorldState.fromGroundTruth(self))
+            return
+
+        state = self._keyframes[-1].copy()
+        firstTimeStep = (len(self._keyframes) - 1) * Trial.KEYFRAME_INTERVAL + 1
+        self._applyEvents(state, firstTimeStep, firstTimeStep + Trial.KEYFRAME_INTERVAL - 1)
+        self._keyframes.append(state)
+
+    def _applyEvents(self, state: WorldState, firstTimeStep: int, lastTimeStep: int):
+        # The events of the whole range are read at once from each log and grouped by time step, which is much faster
+        # than indexing the logs by every time step in the range.
+        eventLogs = [self.removedMarkers, self.placedMarkers, self.rubbleCounts, self.savedVictims,
+                     self.pickedUpVictims, self.placedVictims]
+        eventsPerTimeStep: Dict[int, List[List[Any]]] = {}
+        for i, log in enumerate(eventLogs):
+            timeSteps, events = log.getEventsBetween(firstTimeStep, lastTimeStep)
+            for timeStep, event in zip(timeSteps.tolist(), events):
+                if timeStep not in eventsPerTimeStep:
+                    eventsPerTimeStep[timeStep] = [[] for _ in eventLogs]
+                eventsPerTimeStep[timeStep][i].append(event)
+
+        for timeStep in sorted(eventsPerTimeStep.keys()):
+            state.apply(*eventsPerTimeStep[timeStep])
+
+    def startParsing(self):
+        """
+        Resets the trial and starts a parse. Messages must then be given in timestamp order to parseMessage (and ground
+        truth messages to parseGroundTruthMessage) until finishParsing is called.
+        """
+
+        self._parsingState = ParsingState()
         self.metadata = {}
+        self._clearDeferredSections()
+        self._keyframes = []
 
         # Cleaning global variables
         self.scores = np.zeros(self.timeSteps, dtype=np.int32)
-        self.placedMarkers = []
-        self.removedMarkers = []
-        self.rubbleCounts = []
-        self.playersPositions = [[] for _ in range(Constants.NUM_ROLES)]
-        self.playersYaws = [[] for _ in range(Constants.NUM_ROLES)]
-        self.chatMessages = [[] for _ in range(Constants.NUM_ROLES)]
-        self.speechTranscriptions = [[] for _ in range(Constants.NUM_ROLES)]
+        self.placedMarkers = EventLog()
+        self.removedMarkers = EventLog()
+        self.rubbleCounts = EventLog()
+        self.playersPositions = [PositionSeries() for _ in range(Constants.NUM_ROLES)]
+        self.playersYaws = [GrowableArray(np.float32) for _ in range(Constants.NUM_ROLES)]
+        self.strings = StringPool()
+        self.chatMessages = MessageTable(self.strings)
+        self.speechTranscriptions = MessageTable(self.strings)
         self.playersActions = [[] for _ in range(Constants.NUM_ROLES)]
         self.activeBlackout = []
-        self.savedVictims = []
+        self.savedVictims = EventLog()
+        self.pickedUpVictims = EventLog()
+        self.placedVictims = EventLog()
         self.playersEquippedItems = [[] for _ in range(Constants.NUM_ROLES)]
 
-        # These variables contain valid values per time step.
-        # Some will have their value reset in the end of a time step.
-        currentScore = 0
-        currentPlayersPositions: List[List[Position]] = [[] for _ in range(Constants.NUM_ROLES)]
-        currentPlayersYaws: List[float] = [0 for _ in range(Constants.NUM_ROLES)]
-        currentPlacedMarkers = set()
-        currentRemovedMarkers = set()
-        currentChatMessages: List[Set[ChatMessage]] = [set() for _ in range(Constants.NUM_ROLES)]
-        currentSpeechTranscriptions: List[List[str]] = [[] for _ in range(Constants.NUM_ROLES)]
-        currentPlayersActions = [Constants.Action.NONE for _ in range(Constants.NUM_ROLES)]
-        currentRubbleCounts = {}
-        collapsedRubbleCounts: Set[Position] = set()
-        currentActiveBlackout = False
-        currentSavedVictims = set()
-        currentPickedUpVictims = set()
-        currentPlacedVictims = set()
-        currentPlayersEquippedItems = [Constants.EquippedItem.HAMMER for _ in range(Constants.NUM_ROLES)]
-        for message in messages:
-            if Trial._isMessageOf(message, "event", "Event:MissionState"):
-                state = message["data"]["mission_state"].lower()
-                if state == "start":
-                    missionStarted = True
-                else:
-                    # Mission finished. Nothing else to parse.
-                    break
-            elif Trial._isMessageOf(message, "trial", "start"):
-                self.metadata["map_block_filename"] = message["data"]["map_block_filename"]
-                self.metadata["trial_number"] = message["data"]["trial_number"]
-                name = message["data"]["name"]
-                self.metadata["team_number"] = name[:name.find("_")]
-                self.metadata["player_ids"] = [playerId.strip() for playerId in message["data"]["subjects"]]
-                for info in message["data"]["client_info"]:
-                    playerColor = info["callsign"].lower()
-                    playerId = info["participant_id"]
-                    playerIdToColor[playerId] = playerColor
-                    # Sometimes, the playername is used instead of the id
-                    playerIdToColor[info["playername"]] = playerColor
-                    if playerColor == "red":
-                        self.metadata["red_id"] = playerId
-                    elif playerColor == "green":
-                        self.metadata["green_id"] = playerId
-                    elif playerColor == "blue":
-                        self.metadata["blue_id"] = playerId
-            elif Trial._isMessageOf(message, "trial", "stop"):
-                # Trial finished. Nothing else to parse.
-                break
-            elif Trial._isMessageOf(message, "event", "Event:RoleSelected"):
-                role = Trial._getRoleFromStringType(message["data"]["new_role"].lower())
-                playerId = message["data"]["participant_id"]
-                playerColor = playerIdToColor[playerId]
-
-                if playerColor == "red":
-                    self.metadata["red_role"] = role
-                elif playerColor == "green":
-                    self.metadata["green_role"] = role
-                else:
-                    self.metadata["blue_role"] = role
-            elif Trial._isMessageOf(message, "observation", "State"):
-                playerId = message["data"]["participant_id"]
-                playerColor = playerIdToColor[playerId]
-                x = message["data"]["x"] - self.map.metadata["min_x"]
-                y = message["data"]["z"] - self.map.metadata["min_y"]
-                yaw = message["data"]["yaw"]
-                position = Position(x, y)
-
-                currentPlayersYaws[Constants.PLAYER_COLOR_MAP[playerColor].value] = yaw
-
-                if len(currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value]) > 0:
-                    if currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value][-1] != position:
-                        # Only add the new position if the player moved
-                        currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value].append(position)
-                else:
-                    currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value].append(position)
-
-            elif Trial._isMessageOf(message, "event", "Event:ItemEquipped"):
-                playerId = message["data"]["participant_id"]
-                playerColor = playerIdToColor[playerId]
-
-                itemName = message["data"]["equippeditemname"]
-                currentPlayersEquippedItems[
-                    Constants.PLAYER_COLOR_MAP[playerColor].value] = Trial._getItemTypeFromStringType(itemName)
-
-            if missionStarted:
-                if Trial._isMessageOf(message, "observation", "Event:Scoreboard"):
-                    currentScore = message["data"]["scoreboard"]["TeamScore"]
-
-                elif Trial._isMessageOf(message, "event", "Event:MarkerPlaced"):
-                    # We don't care about who placed it for the moment
-                    markerType = Trial._getMarkerTypeFromStringType(message["data"]["type"])
-                    x = message["data"]["marker_x"] - self.map.metadata["min_x"]
-                    y = message["data"]["marker_z"] - self.map.metadata["min_y"]
-
-                    marker = Marker(markerType, x, y)
-                    if marker in currentRemovedMarkers:
-                        # It was added previously, and added to be removed in this time step. We just need to remove it
-                        # from the list of removals.
-                        currentRemovedMarkers.discard(marker)
-                    else:
-                        # It was never added. We include it in the list of markers to be created
-                        currentPlacedMarkers.add(marker)
-
-                elif Trial._isMessageOf(message, "event", "Event:MarkerRemoved"):
-                    markerType = Trial._getMarkerTypeFromStringType(message["data"]["type"])
-                    x = message["data"]["marker_x"] - self.map.metadata["min_x"]
-                    y = message["data"]["marker_z"] - self.map.metadata["min_y"]
-
-                    marker = Marker(markerType, x, y)
-                    if marker in currentPlacedMarkers:
-                        # It was placed and removed within a time step.
-                        # Just remove from the list of markers to be added.
-                        currentPlacedMarkers.discard(marker)
-                    else:
-                        # It was added previously, so we must add it to the list of removals of the current time step
-                        currentRemovedMarkers.add(marker)
-
-                elif Trial._isMessageOf(message, "chat", "Event:Chat"):
-                    sender = message["data"]["sender"]
-                    jsonText = json.loads(message["data"]["text"])
-                    color = jsonText["color"] if jsonText["color"] != "yellow" else "orange"
-                    for playerId in message["data"]["addressees"]:
-                        playerColor = playerIdToColor[playerId]
-                        chatMessage = ChatMessage(sender, playerId, color, jsonText["text"])
-                        currentChatMessages[Constants.PLAYER_COLOR_MAP[playerColor].value].add(chatMessage)
-
-                elif Trial._isMessageOf(message, "event", "Event:VictimPickedUp"):
-                    playerId = message["data"]["participant_id"]
-                    playerColor = playerIdToColor[playerId]
-                    currentPlayersActions[
-                        Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.CARRYING_VICTIM
-
-                    x = message["data"]["victim_x"] - self.map.metadata["min_x"]
-                    y = message["data"]["victim_z"] - self.map.metadata["min_y"]
-                    victimType = self._getVictimTypeFromStringType(message["data"]["type"])
-                    victim = Victim(victimType, x, y)
-
-                    if victim in currentPlacedVictims:
-                        # Victim was picked up again before the within a time step. Just remove it from the list of
-                        # victims that were placed
-                        currentPlacedVictims.remove(victim)
-                    else:
-                        currentPickedUpVictims.add(victim)
-
-                elif Trial._isMessageOf(message, "event", "Event:VictimPlaced"):
-                    playerId = message["data"]["participant_id"]
-                    playerColor = playerIdToColor[playerId]
-                    currentPlayersActions[
-                        Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.NONE
-
-                    x = message["data"]["victim_x"] - self.map.metadata["min_x"]
-                    y = message["data"]["victim_z"] - self.map.metadata["min_y"]
-                    victimType = self._getVictimTypeFromStringType(message["data"]["type"])
-                    victim = Victim(victimType, x, y)
-
-                    if victim in currentPickedUpVictims:
-                        # Victim was picked up and placed immediately in the same location, just never pick it up.
-                        currentPickedUpVictims.remove(victim)
-                    else:
-                        currentPlacedVictims.add(victim)
+    def finishParsing(self):
+        self._parsingState = None
+        for positions in self.playersPositions:
+            positions.trim()
+        for yaws in self.playersYaws:
+            yaws.trim()
+        for log in self._getEventLogs():
+            log.trim()
+        self.chatMessages.trim()
+        self.speechTranscriptions.trim()
 
-                elif Trial._isMessageOf(message, "event", "Event:Triage"):
-                    playerId = message["data"]["participant_id"]
-                    playerColor = playerIdToColor[playerId]
+    def _getEventLogs(self) -> List[EventLog]:
+        return [self.placedMarkers, self.removedMarkers, self.rubbleCounts, self.savedVictims, self.pickedUpVictims,
+                self.placedVictims]
 
-                    if message["data"]["triage_state"].lower() == "in_progress":
-                        currentPlayersActions[
-                            Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.HEALING_VICTIM
-                    else:
-                        currentPlayersActions[
-                            Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.NONE
-                        if message["data"]["triage_state"].lower() == "successful":
-                            x = message["data"]["victim_x"] - self.map.metadata["min_x"]
-                            y = message["data"]["victim_z"] - self.map.metadata["min_y"]
-                            victimType = self._getVictimTypeFromStringType(message["data"]["type"])
-                            currentSavedVictims.add(Victim(victimType, x, y))
-
-                elif Trial._isMessageOf(message, "event", "Event:ToolUsed"):
-                    tool = message["data"]["tool_type"].lower()
-                    target_block = message["data"]["target_block_type"].lower()
-                    if tool == "hammer" and target_block == "minecraft:gravel":
-                        playerId = message["data"]["participant_id"]
-                        playerColor = playerIdToColor[playerId]
-                        currentPlayersActions[
-                            Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.DESTROYING_RUBBLE
-
-                elif Trial._isMessageOf(message, "event", "Event:RubbleDestroyed"):
-                    x = message["data"]["rubble_x"] - self.map.metadata["min_x"]
-                    y = message["data"]["rubble_z"] - self.map.metadata["min_y"]
-                    position = Position(x, y)
-
-                    if position in currentRubbleCounts:
-                        currentRubbleCounts[position] -= 1
+    def parseMessage(self, message: Dict[str, Any]) -> bool:
+        """
+        Updates the trial with the content of a single message. Messages must be given in timestamp order.
+
+        :return: False if the trial or mission finished and no other message needs to be parsed.
+        """
+
+        if self._profiler is not None:
+            return self._parseMessageWithProfiler(message)
+
+        key = (message["header"]["message_type"].lower(), message["msg"]["sub_type"].lower())
+        for handler, missionOnly in Trial._messageHandlers.get(key, []):
+            if missionOnly and not self._parsingState.missionStarted:
+                continue
+
+            if not handler(self, message):
+                return False
+
+        return True
+
+    def _parseMessageWithProfiler(self, message: Dict[str, Any]) -> bool:
+        key = (message["header"]["message_type"].lower(), message["msg"]["sub_type"].lower())
+        topic = str(message.get("topic", ParseProfiler.NO_TOPIC))
+        for handler, missionOnly in Trial._messageHandlers.get(key, []):
+            if missionOnly and not self._parsingState.missionStarted:
+                continue
+
+            start = time.perf_counter()
+            handled = handler(self, message)
+            self._profiler.addHandling(handler.__name__, topic, time.perf_counter() - start)
+            if not handled:
+                return False
+
+        return True
+
+    def profilePhase(self, name: str):
+        return self._profiler.phase(name) if self._profiler is not None else nullcontext()
+
+    def _parseMissionStateMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        if message["data"]["mission_state"].lower() == "start":
+            state.missionStarted = True
+            return True
+
+        # Mission finished. Nothing else to parse.
+        return False
+
+    def _parseTrialStartMessage(self, message: Dict[str, Any]) -> bool:
+        metadata, playerIdToColor = Trial.readTrialStartMessage(message)
+        self.metadata.update(metadata)
+        self._parsingState.playerIdToColor.update(playerIdToColor)
+
+        return True
+
+    @staticmethod
+    def readTrialStartMessage(message: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        Reads the metadata of a trial from its trial start message.
+
+        :return: metadata of the trial and the color of each player id.
+        """
+
+        metadata = {}
+        playerIdToColor = {}
+        metadata["map_block_filename"] = message["data"]["map_block_filename"]
+        metadata["trial_number"] = message["data"]["trial_number"]
+        name = message["data"]["name"]
+        metadata["team_number"] = name[:name.find("_")]
+        metadata["player_ids"] = [playerId.strip() for playerId in message["data"]["subjects"]]
+        for info in message["data"]["client_info"]:
+            playerColor = info["callsign"].lower()
+            playerId = info["participant_id"]
+            playerIdToColor[playerId] = playerColor
+            # Sometimes, the playername is used instead of the id
+            playerIdToColor[info["playername"]] = playerColor
+            if playerColor == "red":
+                metadata["red_id"] = playerId
+            elif playerColor == "green":
+                metadata["green_id"] = playerId
+            elif playerColor == "blue":
+                metadata["blue_id"] = playerId
+
+        return metadata, playerIdToColor
+
+    def _parseTrialStopMessage(self, message: Dict[str, Any]) -> bool:
+        # Trial finished. Nothing else to parse.
+        return False
+
+    def _parseRoleSelectedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        role = Trial._getRoleFromStringType(message["data"]["new_role"].lower())
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+
+        if playerColor == "red":
+            self.metadata["red_role"] = role
+        elif playerColor == "green":
+            self.metadata["green_role"] = role
+        else:
+            self.metadata["blue_role"] = role
+
+        return True
+
+    def _parsePlayerStateMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+        x = message["data"]["x"] - self.map.metadata["min_x"]
+        y = message["data"]["z"] - self.map.metadata["min_y"]
+        yaw = message["data"]["yaw"]
+        position = Position(x, y)
+
+        state.currentPlayersYaws[Constants.PLAYER_COLOR_MAP[playerColor].value] = yaw
+
+        if len(state.currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value]) > 0:
+            if state.currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value][-1] != position:
+                # Only add the new position if the player moved
+                state.currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value].append(position)
+        else:
+            state.currentPlayersPositions[Constants.PLAYER_COLOR_MAP[playerColor].value].append(position)
+
+        return True
+
+    def _parseItemEquippedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+
+        itemName = message["data"]["equippeditemname"]
+        state.currentPlayersEquippedItems[
+            Constants.PLAYER_COLOR_MAP[playerColor].value] = Trial._getItemTypeFromStringType(itemName)
+
+        return True
+
+    def _parseScoreboardMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        state.currentScore = message["data"]["scoreboard"]["TeamScore"]
+
+        return True
+
+    def _parseMarkerPlacedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        # We don't care about who placed it for the moment
+        markerType = Trial._getMarkerTypeFromStringType(message["data"]["type"])
+        x = message["data"]["marker_x"] - self.map.metadata["min_x"]
+        y = message["data"]["marker_z"] - self.map.metadata["min_y"]
+
+        marker = Marker(markerType, x, y)
+        if marker in state.currentRemovedMarkers:
+            # It was added previously, and added to be removed in this time step. We just need to remove it
+            # from the list of removals.
+            state.currentRemovedMarkers.discard(marker)
+        else:
+            # It was never added. We include it in the list of markers to be created
+            state.currentPlacedMarkers.add(marker)
+
+        return True
+
+    def _parseMarkerRemovedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        markerType = Trial._getMarkerTypeFromStringType(message["data"]["type"])
+        x = message["data"]["marker_x"] - self.map.metadata["min_x"]
+        y = message["data"]["marker_z"] - self.map.metadata["min_y"]
+
+        marker = Marker(markerType, x, y)
+        if marker in state.currentPlacedMarkers:
+            # It was placed and removed within a time step.
+            # Just remove from the list of markers to be added.
+            state.currentPlacedMarkers.discard(marker)
+        else:
+            # It was added previously, so we must add it to the list of removals of the current time step
+            state.currentRemovedMarkers.add(marker)
+
+        return True
+
+    def _parseChatMessage(self, message: Dict[str, Any]) -> bool:
+        sender = message["data"]["sender"]
+        jsonText = json.loads(message["data"]["text"])
+        color = jsonText["color"] if jsonText["color"] != "yellow" else "orange"
+        self._addChatMessage(sender, message["data"]["addressees"], color, jsonText["text"])
+
+        return True
+
+    def _parseVictimPickedUpMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+        state.currentPlayersActions[
+            Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.CARRYING_VICTIM
+
+        x = message["data"]["victim_x"] - self.map.metadata["min_x"]
+        y = message["data"]["victim_z"] - self.map.metadata["min_y"]
+        victimType = self._getVictimTypeFromStringType(message["data"]["type"])
+        victim = Victim(victimType, x, y)
+
+        if victim in state.currentPlacedVictims:
+            # Victim was picked up again before the within a time step. Just remove it from the list of
+            # victims that were placed
+            state.currentPlacedVictims.remove(victim)
+        else:
+            state.currentPickedUpVictims.add(victim)
+
+        return True
+
+    def _parseVictimPlacedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+        state.currentPlayersActions[
+            Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.NONE
+
+        x = message["data"]["victim_x"] - self.map.metadata["min_x"]
+        y = message["data"]["victim_z"] - self.map.metadata["min_y"]
+        victimType = self._getVictimTypeFromStringType(message["data"]["type"])
+        victim = Victim(victimType, x, y)
+
+        if victim in state.currentPickedUpVictims:
+            # Victim was picked up and placed immediately in the same location, just never pick it up.
+            state.currentPickedUpVictims.remove(victim)
+        else:
+            state.currentPlacedVictims.add(victim)
+
+        return True
+
+    def _parseTriageMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+
+        if message["data"]["triage_state"].lower() == "in_progress":
+            state.currentPlayersActions[
+                Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.HEALING_VICTIM
+        else:
+            state.currentPlayersActions[
+                Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.NONE
+            if message["data"]["triage_state"].lower() == "successful":
+                x = message["data"]["victim_x"] - self.map.metadata["min_x"]
+                y = message["data"]["victim_z"] - self.map.metadata["min_y"]
+                victimType = self._getVictimTypeFromStringType(message["data"]["type"])
+                state.currentSavedVictims.add(Victim(victimType, x, y))
+
+        return True
+
+    def _parseToolUsedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        tool = message["data"]["tool_type"].lower()
+        target_block = message["data"]["target_block_type"].lower()
+        if tool == "hammer" and target_block == "minecraft:gravel":
+            playerId = message["data"]["participant_id"]
+            playerColor = state.playerIdToColor[playerId]
+            state.currentPlayersActions[
+                Constants.PLAYER_COLOR_MAP[playerColor].value] = Constants.Action.DESTROYING_RUBBLE
+
+        return True
+
+    def _parseRubbleDestroyedMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        x = message["data"]["rubble_x"] - self.map.metadata["min_x"]
+        y = message["data"]["rubble_z"] - self.map.metadata["min_y"]
+        position = Position(x, y)
+
+        if position in state.currentRubbleCounts:
+            state.currentRubbleCounts[position] -= 1
+        else:
+            state.currentRubbleCounts[position] = -1
+
+        state.collapsedRubbleCounts.discard(position)
+
+        return True
+
+    def _parsePerturbationMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        if message["data"]["type"].lower() == "blackout":
+            state.currentActiveBlackout = message["data"]["mission_state"].lower() == "start"
+
+        return True
+
+    def _parseRubbleCollapseMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        # How many are stacked on top of each other
+        counts = abs(message["data"]["toBlock_y"] - message["data"]["fromBlock_y"]) + 1
+
+        for x in range(message["data"]["fromBlock_x"], message["data"]["toBlock_x"] + 1):
+            for y in range(message["data"]["fromBlock_z"], message["data"]["toBlock_z"] + 1):
+                position = Position(x - self.map.metadata["min_x"], y - self.map.metadata["min_y"])
+                if position not in state.collapsedRubbleCounts:
+                    state.currentRubbleCounts[position] = counts
+                    state.collapsedRubbleCounts.add(position)
+
+        return True
+
+    def _parseSpeechTranscriptionMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        playerId = message["data"]["participant_id"]
+        playerColor = state.playerIdToColor[playerId]
+        text = message["data"]["text"].strip()
+        state.currentSpeechTranscriptions.append(
+            (playerId, 1 << Constants.PLAYER_COLOR_MAP[playerColor].value, "", text))
+
+        return True
+
+    def _parseInterventionChatMessage(self, message: Dict[str, Any]) -> bool:
+        self._addChatMessage(Trial.AGENT_ALIAS, message["data"]["receivers"], "orange", message["data"]["content"])
+
+        return True
+
+    def _addChatMessage(self, sender: str, addresseeIds: List[str], color: str, text: str):
+        state = self._parsingState
+
+        addressees = 0
+        for playerId in addresseeIds:
+            addressees |= 1 << Constants.PLAYER_COLOR_MAP[state.playerIdToColor[playerId]].value
+        messagesPerColor = state.currentChatMessages.setdefault((sender, text), {})
+        for receivedAddressees in messagesPerColor.values():
+            addressees &= ~receivedAddressees
+        if addressees != 0:
+            messagesPerColor[color] = messagesPerColor.get(color, 0) | addressees
+
+    def _parseTimeStepMessage(self, message: Dict[str, Any]) -> bool:
+        state = self._parsingState
+
+        # Collect observations for the current time step
+        missionTimer = message["data"]["mission_timer"]
+        elapsedSeconds = self._missionTimerToElapsedSeconds(missionTimer)
+
+        if elapsedSeconds >= state.nextTimeStep:
+            # Events collected since the last time step are recorded once, in the first of the time steps covered by
+            # this message. The remaining ones get no events.
+            for t in range(state.nextTimeStep, elapsedSeconds + 1):
+                self.scores[t] = state.currentScore
+                self.placedMarkers.append(state.currentPlacedMarkers)
+                state.currentPlacedMarkers.clear()
+                self.removedMarkers.append(state.currentRemovedMarkers)
+                state.currentRemovedMarkers.clear()
+                for playerIdx, positions in enumerate(self.playersPositions):
+                    if len(state.currentPlayersPositions[playerIdx]) == 0:
+                        # Players that never reported a position (e.g. trials with fewer players) have none
+                        positions.append(positions[-1][-1:] if len(positions) > 0 else [])
                     else:
-                        currentRubbleCounts[position] = -1
-
-                    collapsedRubbleCounts.discard(position)
-
-                elif Trial._isMessageOf(message, "event", "Event:Perturbation"):
-                    if message["data"]["type"].lower() == "blackout":
-                        currentActiveBlackout = message["data"]["mission_state"].lower() == "start"
-
-                elif Trial._isMessageOf(message, "event", "Event:RubbleCollapse"):
-                    # How many are stacked on top of each other
-                    counts = abs(message["data"]["toBlock_y"] - message["data"]["fromBlock_y"]) + 1
-
-                    for x in range(message["data"]["fromBlock_x"], message["data"]["toBlock_x"] + 1):
-                        for y in range(message["data"]["fromBlock_z"], message["data"]["toBlock_z"] + 1):
-                            position = Position(x - self.map.metadata["min_x"], y - self.map.metadata["min_y"])
-                            if position not in collapsedRubbleCounts:
-                                currentRubbleCounts[position] = counts
-                                collapsedRubbleCounts.add(position)
-
-                elif Trial._isMessageOf(message, "observation", "asr:transcription"):
-                    playerId = message["data"]["participant_id"]
-                    playerColor = playerIdToColor[playerId]
-                    text = message["data"]["text"].strip()
-                    currentSpeechTranscriptions[Constants.PLAYER_COLOR_MAP[playerColor].value].append(text)
-
-                elif Trial._isMessageOf(message, "agent", "Intervention:Chat"):
-                    sender = Trial.AGENT_ALIAS
-                    for playerId in message["data"]["receivers"]:
-                        playerColor = playerIdToColor[playerId]
-                        chatMessage = ChatMessage(sender, playerId, "orange", message["data"]["content"])
-                        currentChatMessages[Constants.PLAYER_COLOR_MAP[playerColor].value].add(chatMessage)
-
-                elif Trial._isMessageOf(message, "observation", "State"):
-                    # Collect observations for the current time step
-                    missionTimer = message["data"]["mission_timer"]
-                    elapsedSeconds = self._missionTimerToElapsedSeconds(missionTimer)
-
-                    if elapsedSeconds >= nextTimeStep:
-                        for t in range(nextTimeStep, elapsedSeconds + 1):
-                            self.scores[t] = currentScore
-                            self.placedMarkers.append(currentPlacedMarkers.copy())
-                            self.removedMarkers.append(currentRemovedMarkers.copy())
-                            for playerIdx, positions in enumerate(self.playersPositions):
-                                if len(currentPlayersPositions[playerIdx]) == 0:
-                                    positions.append([self.playersPositions[playerIdx][-1][-1]])
-                                else:
-                                    positions.append(currentPlayersPositions[playerIdx].copy())
-                                currentPlayersPositions[playerIdx].clear()
-                            for playerIdx, yaws in enumerate(self.playersYaws):
-                                yaws.append(currentPlayersYaws[playerIdx])
-                            for playerIdx, messages in enumerate(self.chatMessages):
-                                messages.append(currentChatMessages[playerIdx].copy())
-                                currentChatMessages[playerIdx].clear()
-                            for playerIdx, texts in enumerate(self.speechTranscriptions):
-                                texts.append(currentSpeechTranscriptions[playerIdx].copy())
-                                currentSpeechTranscriptions[playerIdx].clear()
-                            for playerIdx, actions in enumerate(self.playersActions):
-                                actions.append(currentPlayersActions[playerIdx])
-                                if currentPlayersActions[playerIdx] != Constants.Action.CARRYING_VICTIM:
-                                    # If the players are carrying victims. The action only stops after they place them.
-                                    currentPlayersActions[playerIdx] = Constants.Action.NONE
-                            self.rubbleCounts.append(currentRubbleCounts.copy())
-                            self.activeBlackout.append(currentActiveBlackout)
-                            self.savedVictims.append(currentSavedVictims.copy())
-                            self.pickedUpVictims.append(currentPickedUpVictims.copy())
-                            self.placedVictims.append(currentPlacedVictims.copy())
-                            for playerIdx, equippedItems in enumerate(self.playersEquippedItems):
-                                equippedItems.append(currentPlayersEquippedItems[playerIdx])
-
-                        nextTimeStep = elapsedSeconds + 1
-
-                        currentPlacedMarkers.clear()
-                        currentRemovedMarkers.clear()
-                        currentRubbleCounts.clear()
-                        currentSavedVictims.clear()
-                        currentPickedUpVictims.clear()
-                        currentPlacedVictims.clear()
-
-                    if nextTimeStep == self.timeSteps:
-                        break
-
-    def _parseGroundTruthAndSortRemainingMessages(self, trialMessagesFile: TextIO) -> List[Any]:
+                        positions.append(state.currentPlayersPositions[playerIdx].copy())
+                    state.currentPlayersPositions[playerIdx].clear()
+                for playerIdx, yaws in enumerate(self.playersYaws):
+                    yaws.append(state.currentPlayersYaws[playerIdx])
+                self.chatMessages.append((sender, addressees, color, text) for (sender, text), messagesPerColor in
+                                         state.currentChatMessages.items() for color, addressees in
+                                         messagesPerColor.items())
+                state.currentChatMessages.clear()
+                self.speechTranscriptions.append(state.currentSpeechTranscriptions)
+                state.currentSpeechTranscriptions.clear()
+                for playerIdx, actions in enumerate(self.playersActions):
+                    actions.append(state.currentPlayersActions[playerIdx])
+                    if state.currentPlayersActions[playerIdx] != Constants.Action.CARRYING_VICTIM:
+                        # If the players are carrying victims. The action only stops after they place them.
+                        state.currentPlayersActions[playerIdx] = Constants.Action.NONE
+                self.rubbleCounts.append(state.currentRubbleCounts.items())
+                state.currentRubbleCounts.clear()
+                self.activeBlackout.append(state.currentActiveBlackout)
+                self.savedVictims.append(state.currentSavedVictims)
+                state.currentSavedVictims.clear()
+                self.pickedUpVictims.append(state.currentPickedUpVictims)
+                state.currentPickedUpVictims.clear()
+                self.placedVictims.append(state.currentPlacedVictims)
+                state.currentPlacedVictims.clear()
+                for playerIdx, equippedItems in enumerate(self.playersEquippedItems):
+                    equippedItems.append(state.currentPlayersEquippedItems[playerIdx])
+
+            state.nextTimeStep = elapsedSeconds + 1
+
+        if state.nextTimeStep == self.timeSteps:
+            return False
+
+        return True
+
+    def _readGroundTruthAndSortRemainingMessages(self, trialMessagesFile: TextIO) -> Tuple[Dict[str, Any], List[Any]]:
         messages = []
         groundTruthMessagesMap: Dict[str, Any] = {}
 
-        for line in trialMessagesFile:
-            jsonMessage = None
-            try:
-                jsonMessage = json.loads(line)
-            except:
-                print(f"Bad json line of len: {len(line)}, {line}")
-
-            if jsonMessage is not None:
-                if "topic" in jsonMessage:
-                    if jsonMessage["topic"] == Trial.MAP_TOPIC:
-                        groundTruthMessagesMap["map"] = jsonMessage
-                    elif jsonMessage["topic"] == Trial.VICTIM_LIST_TOPIC:
-                        groundTruthMessagesMap["victim_list"] = jsonMessage
-                    elif jsonMessage["topic"] == Trial.RUBBLE_LIST_TOPIC:
-                        groundTruthMessagesMap["rubble_list"] = jsonMessage
-                    elif jsonMessage["topic"] == Trial.THREAT_PLATE_LIST_TOPIC:
-                        groundTruthMessagesMap["threat_plate_list"] = jsonMessage
-                    elif jsonMessage["topic"] == Trial.VICTIM_SIGNAL_PLATE_LIST_TOPIC:
-                        groundTruthMessagesMap["victim_signal_plate_list"] = jsonMessage
-                    elif jsonMessage["topic"] in Trial.USED_TOPICS:
-                        messages.append(jsonMessage)
+        reader = self.createMetadataReader()
+        with self.profilePhase("read"):
+            for jsonMessage in reader.read(trialMessagesFile):
+                groundTruthKey = Trial.GROUND_TRUTH_TOPICS.get(jsonMessage.get("topic", None), None)
+                if groundTruthKey is not None:
+                    groundTruthMessagesMap[groundTruthKey] = jsonMessage
                 else:
-                    # Intervention messages generated locally don't have the topic field.
-                    if "source" in jsonMessage["msg"] and jsonMessage["msg"]["source"] == Trial.AGENT_NAME:
-                        messages.append(jsonMessage)
-
-        self._parseGroundTruthMessages(groundTruthMessagesMap)
-
+                    messages.append(jsonMessage)
+        self.updateLineCounts(reader.numSkippedLines, reader.numBadLines, reader.numLines, reader.badLines)
+
+        if self._profiler is not None:
+            # Timestamps are converted apart from the sort, so both are timed
+            with self.profilePhase("timestamps"):
+                timestamps = [timestampToMicroseconds(message["header"]["timestamp"]) for message in messages]
+            with self.profilePhase("sort"):
+                order = sorted(range(len(messages)), key=timestamps.__getitem__)
+                return groundTruthMessagesMap, [messages[i] for i in order]
+
+        # Timestamps are converted only once per message and compared as integers
         sorted_messages = sorted(
-            messages, key=lambda x: parse(x["header"]["timestamp"])
+            messages, key=lambda x: timestampToMicroseconds(x["header"]["timestamp"])
         )
 
-        return sorted_messages
+        return groundTruthMessagesMap, sorted_messages
+
+    def createMetadataReader(self) -> MetadataReader:
+        return MetadataReader(Trial._getRelevantTopics(), Trial.AGENT_NAME, profiler=self._profiler)
+
+    def updateLineCounts(self, numSkippedLines: int, numBadLines: int, numLines: int = 0,
+                         badLines: List[Dict[str, Any]] = None):
+        self.numSkippedLines = numSkippedLines
+        self.numBadLines = numBadLines
+        if self._profiler is not None:
+            self._profiler.setLineCounts(numLines, numSkippedLines, numBadLines, badLines)
 
     def _parseGroundTruthMessages(self, groundTruthMessagesMap: Dict[str, Any]):
-        self._parseMap(groundTruthMessagesMap["map"])
-        self._parseVictimList(groundTruthMessagesMap["victim_list"])
-        self._parseRubbleList(groundTruthMessagesMap["rubble_list"])
-        self._parseThreatPlateList(groundTruthMessagesMap["threat_plate_list"])
-        self._parseVictimSignalPlateList(groundTruthMessagesMap["victim_signal_plate_list"])
+        for key in ["map", "victim_list", "rubble_list", "threat_plate_list", "victim_signal_plate_list"]:
+            self.parseGroundTruthMessage(key, groundTruthMessagesMap[key])
+
+    def parseGroundTruthMessage(self, key: str, message: Dict[str, Any]):
+        with self.profilePhase(f"ground truth ({key})"):
+            self._parseGroundTruthMessageContent(key, message)
+
+    def _parseGroundTruthMessageContent(self, key: str, message: Dict[str, Any]):
+        if key == "map":
+            self._parseMap(message)
+        elif key == "victim_list":
+            self._parseVictimList(message)
+        elif key == "rubble_list":
+            self._parseRubbleList(message)
+        elif key == "threat_plate_list":
+            self._parseThreatPlateList(message)
+        elif key == "victim_signal_plate_list":
+            self._parseVictimSignalPlateList(message)
 
     def _parseMap(self, message: Dict[str, Any]):
         self.map = Map()
@@ -579,9 +1183,32 @@ class Trial:
         return -1
 
     @staticmethod
-    def _isMessageOf(message: json, type: str, subType: str):
-        return message["header"]["message_type"].lower() == type.lower() and message["msg"][
-            "sub_type"].lower() == subType.lower()
+    def _toEventLog(eventsPerTimeStep: Any) -> EventLog:
+        # Trial packages saved before event logs were introduced have a collection of events per time step
+        return eventsPerTimeStep if isinstance(eventsPerTimeStep, EventLog) else EventLog.fromLists(eventsPerTimeStep)
+
+    @staticmethod
+    def chatMessagesFromPlayerLogs(logs: List[EventLog], strings: StringPool) -> MessageTable:
+        """
+        Creates the table of chat messages from the chat messages of each player, as stored in old trial packages.
+        """
+
+        return MessageTable.fromPlayerLogs(logs, strings, lambda message, _: (message.sender, message.color,
+                                                                              message.text))
+
+    @staticmethod
+    def speechTranscriptionsFromPlayerLogs(logs: List[EventLog], strings: StringPool,
+                                           metadata: Dict[str, Any]) -> MessageTable:
+        """
+        Creates the table of speech transcriptions from the texts of each player, as stored in old trial packages.
+        """
+
+        speakerIds = [metadata.get(f"{player.name.lower()}_id", "") for player in Constants.Player]
+        return MessageTable.fromPlayerLogs(logs, strings, lambda text, playerIdx: (speakerIds[playerIdx], "", text))
+
+    @staticmethod
+    def _getRelevantTopics() -> Set[str]:
+        return set(Trial.USED_TOPICS).union(Trial.GROUND_TRUTH_TOPICS.keys())
 
     @staticmethod
     def _getRoleFromStringType(stringType: str) -> Constants.Role:
@@ -674,3 +1301,30 @@ class Trial:
             victimType = Constants.VictimType.CRITICAL
 
         return victimType
+
+
+# Messages before the mission starts give trial information and the initial state of the players.
+Trial.registerMessageHandler("event", "Event:MissionState", Trial._parseMissionStateMessage)
+Trial.registerMessageHandler("trial", "start", Trial._parseTrialStartMessage)
+Trial.registerMessageHandler("trial", "stop", Trial._parseTrialStopMessage)
+Trial.registerMessageHandler("event", "Event:RoleSelected", Trial._parseRoleSelectedMessage)
+Trial.registerMessageHandler("observation", "State", Trial._parsePlayerStateMessage)
+Trial.registerMessageHandler("event", "Event:ItemEquipped", Trial._parseItemEquippedMessage)
+
+# Messages below only matter after the mission starts. Player states are registered a second time to close time
+# steps, after their positions are collected.
+Trial.registerMessageHandler("observation", "Event:Scoreboard", Trial._parseScoreboardMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:MarkerPlaced", Trial._parseMarkerPlacedMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:MarkerRemoved", Trial._parseMarkerRemovedMessage, missionOnly=True)
+Trial.registerMessageHandler("chat", "Event:Chat", Trial._parseChatMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:VictimPickedUp", Trial._parseVictimPickedUpMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:VictimPlaced", Trial._parseVictimPlacedMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:Triage", Trial._parseTriageMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:ToolUsed", Trial._parseToolUsedMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:RubbleDestroyed", Trial._parseRubbleDestroyedMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:Perturbation", Trial._parsePerturbationMessage, missionOnly=True)
+Trial.registerMessageHandler("event", "Event:RubbleCollapse", Trial._parseRubbleCollapseMessage, missionOnly=True)
+Trial.registerMessageHandler("observation", "asr:transcription", Trial._parseSpeechTranscriptionMessage,
+                             missionOnly=True)
+Trial.registerMessageHandler("agent", "Intervention:Chat", Trial._parseInterventionChatMessage, missionOnly=True)
+Trial.registerMessageHandler("observation", "State", Trial._parseTimeStepMessage, missionOnly=True)
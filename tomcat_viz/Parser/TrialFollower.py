@@ -0,0 +1,60 @@
+from typing import Any
+
+from tomcat_viz.Parser.StreamingParser import StreamingParser
+from tomcat_viz.Parser.Trial import Trial
+
+
+class TrialFollower:
+    """
+    This class parses a trial whose messages are still being produced: the lines appended to a .metadata file that is
+    still being written (see FileTail) or the messages received by a message stream server (see MessageStreamServer).
+    Each call to update parses the lines read from the source since the previous call, extending the trial with the new
+    time steps. Following stops by itself once the end of the trial is parsed.
+    """
+
+    # Messages are parsed as soon as the window is full, so a smaller window than the one of streaming parses reduces
+    # the delay between a message being produced and it being shown.
+    DEFAULT_REORDER_WINDOW = 100
+
+    def __init__(self, trial: Trial, source: Any, reorderWindow: int = DEFAULT_REORDER_WINDOW):
+        """
+        Starts parsing a source of lines. It must have a readLines method returning the complete lines produced since
+        the previous call, and a close method. The source is closed when following stops.
+        """
+
+        self.trial = trial
+        self._source = source
+        self._reader = trial.createMetadataReader()
+        self._parser = StreamingParser(trial, reorderWindow)
+        trial.startParsing()
+
+    @property
+    def isFollowing(self) -> bool:
+        return self._source is not None
+
+    def update(self) -> int:
+        """
+        Parses the complete lines read from the source since the last update.
+
+        :return: number of time steps parsed so far.
+        """
+
+        if self.isFollowing:
+            self._parser.parseMessages(self._reader.read(self._source.readLines()))
+            self.trial.updateLineCounts(self._reader.numSkippedLines, self._reader.numBadLines)
+            if self._parser.finished:
+                self.stop()
+
+        return self.trial.numParsedTimeSteps
+
+    def stop(self):
+        """
+        Parses the messages left in the reorder window and stops following the source.
+        """
+
+        if not self.isFollowing:
+            return
+
+        self._parser.finish()
+        self._source.close()
+        self._source = None
@@ -0,0 +1,425 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+import argparse
+import json
+import math
+import random
+
+from tomcat_viz.Common.Constants import Constants
+from tomcat_viz.Parser.Trial import Trial
+
+
+class TrialGenerator:
+    """
+    This class writes synthetic .metadata files with the structure of the testbed exports, so the parser can be
+    benchmarked without participant data. A file has the trial start, the semantic map and the other ground truth
+    messages, the roles and initial states of the players, and then, for every second of the mission, player states
+    at a given rate, a random mix of events of every topic in Trial.USED_TOPICS and lines of irrelevant topics. Events
+    are consistent with each other (e.g. only placed markers are removed and only carried victims are placed).
+
+    Messages of a second are written slightly out of timestamp order, as in the exports. Files are deterministic given
+    the parameters and the seed.
+    """
+
+    # Coordinates of the corner of the map in the testbed
+    MIN_X = -2225
+    MIN_Z = -11
+    ROOM_SIZE = 10
+    CORRIDOR_WIDTH = 4
+    # Probability of swapping a message with the previous one when a second is written
+    SWAP_PROBABILITY = 0.05
+
+    PLAYER_IDS = ["P000001", "P000002", "P000003"]
+    ROLES = ["Medical_Specialist", "Engineering_Specialist", "Transport_Specialist"]
+
+    # Relative frequency of the events in the mission
+    EVENT_WEIGHTS = {
+        "marker_placed": 8,
+        "marker_removed": 3,
+        "triage": 6,
+        "victim_picked_up": 3,
+        "victim_placed": 3,
+        "rubble_destroyed": 6,
+        "rubble_collapse": 1,
+        "item_equipped": 4,
+        "chat": 3,
+        "speech": 8,
+        "intervention": 1
+    }
+
+    NOISE_TOPICS = [
+        ("status/asistdataingester/heartbeat", "status", "heartbeat"),
+        ("observations/events/player/location", "event", "Event:location"),
+        ("observations/events/player/proximity", "event", "Event:Proximity"),
+        ("agent/measures/AC_IHMC_TA2_Player-Proximity", "agent", "measures")
+    ]
+
+    MARKER_TYPES = ["novictim", "abrasion", "bonedamage", "regularvictim", "criticalvictim", "threat", "rubble", "sos"]
+    VICTIM_BLOCKS = ["block_victim_1", "block_victim_1b", "block_victim_proximity"]
+    ITEMS = ["asistmod:item_hammer", "asistmod:item_medical_kit", "asistmod:item_stretcher"]
+
+    def __init__(self, missionLength: int = 900, stateRate: float = 10, eventRate: float = 1, noiseRate: float = 20,
+                 numPlayers: int = Constants.NUM_ROLES, numRooms: int = 40, seed: int = 0):
+        """
+        :param missionLength: number of seconds of the mission. Trials must be created with this many time steps.
+        :param stateRate: number of state messages per player per second.
+        :param eventRate: average number of events per second.
+        :param noiseRate: average number of lines of irrelevant topics per second.
+        :param numPlayers: number of players (up to 3).
+        :param numRooms: number of rooms of the map.
+        """
+
+        if not 1 <= numPlayers <= Constants.NUM_ROLES:
+            raise ValueError(f"The number of players must be between 1 and {Constants.NUM_ROLES}.")
+
+        self.missionLength = missionLength
+        self.stateRate = stateRate
+        self.eventRate = eventRate
+        self.noiseRate = noiseRate
+        self.numPlayers = numPlayers
+        self.numRooms = numRooms
+        self.seed = seed
+
+    def write(self, filepath: str) -> int:
+        """
+        Writes a synthetic trial to a file.
+
+        :return: number of lines written.
+        """
+
+        numLines = 0
+        with open(filepath, "w") as f:
+            for message in self.generate():
+                f.write(json.dumps(message))
+                f.write("\n")
+                numLines += 1
+
+        return numLines
+
+    def generate(self) -> Iterator[Dict[str, Any]]:
+        """
+        Generates the messages of a synthetic trial in the order they are written to the file.
+        """
+
+        state = _GeneratorState(self, random.Random(self.seed))
+        yield from state.generate()
+
+    @staticmethod
+    def createSemanticMap(numRooms: int) -> Dict[str, Any]:
+        """
+        Creates a semantic map with rows of rooms. Below each row there's a corridor made of two parts connected to
+        the rooms by doors and to the next row by an opening.
+        """
+
+        numColumns = max(1, round(math.sqrt(numRooms * 3)))
+        roomSize = TrialGenerator.ROOM_SIZE
+        corridorWidth = TrialGenerator.CORRIDOR_WIDTH
+        pitchX = roomSize + 2
+        pitchZ = roomSize + corridorWidth + 4
+        rowWidth = numColumns * pitchX
+
+        locations = []
+        connections = []
+        for room in range(numRooms):
+            row, column = divmod(room, numColumns)
+            x = TrialGenerator.MIN_X + 1 + column * pitchX
+            z = TrialGenerator.MIN_Z + 1 + row * pitchZ
+            locations.append(TrialGenerator._createLocation(f"room_{room}", "room", x, z, x + roomSize, z + roomSize))
+            connections.append(TrialGenerator._createLocation(f"door_{room}", "door", x + 4, z + roomSize, x + 6,
+                                                              z + roomSize + 1))
+
+            if column == 0:
+                corridorZ = z + roomSize + 2
+                corridorX = TrialGenerator.MIN_X + 1
+                parts = [f"corridor_{row}_west", f"corridor_{row}_east"]
+                locations.append({"id": f"corridor_{row}", "type": "corridor", "child_locations": parts})
+                locations.append(TrialGenerator._createLocation(parts[0], "corridor_part", corridorX, corridorZ,
+                                                                corridorX + rowWidth // 2, corridorZ + corridorWidth))
+                locations.append(TrialGenerator._createLocation(parts[1], "corridor_part",
+                                                                corridorX + rowWidth // 2 - 1, corridorZ,
+                                                                corridorX + rowWidth - 2, corridorZ + corridorWidth))
+                connections.append(TrialGenerator._createLocation(f"opening_{row}", "opening", corridorX + 1,
+                                                                  corridorZ + corridorWidth, corridorX + 3,
+                                                                  corridorZ + corridorWidth + 1))
+
+        return {"locations": locations, "connections": connections}
+
+    @staticmethod
+    def _createLocation(locationId: str, locationType: str, x1: int, z1: int, x2: int, z2: int) -> Dict[str, Any]:
+        return {"id": locationId, "type": locationType,
+                "bounds": {"type": "rectangle", "coordinates": [{"x": x1, "z": z1}, {"x": x2, "z": z2}]}}
+
+
+class _GeneratorState:
+    """
+    State of the world while the messages of a synthetic trial are generated.
+    """
+
+    def __init__(self, generator: TrialGenerator, rng: random.Random):
+        self.generator = generator
+        self.rng = rng
+        self.start = datetime(2022, 3, 10, 15, 30, 0)
+
+        self.semanticMap = TrialGenerator.createSemanticMap(generator.numRooms)
+        self.rooms = [self._getBounds(location) for location in self.semanticMap["locations"] if
+                      location["type"] == "room"]
+        self.corridors = [self._getBounds(location) for location in self.semanticMap["locations"] if
+                          location["type"] == "corridor_part"]
+        areas = self.rooms + self.corridors
+        self.mapBounds = (min(a[0] for a in areas), min(a[1] for a in areas), max(a[2] for a in areas) - 1,
+                          max(a[3] for a in areas) - 1)
+
+        self.playerIds = TrialGenerator.PLAYER_IDS[:generator.numPlayers]
+        self.positions = [list(self._getRandomPoint(self.corridors)) for _ in self.playerIds]
+        self.yaws = [0.0 for _ in self.playerIds]
+        self.carriedVictims: List[Any] = [None for _ in self.playerIds]
+
+        # About one victim and one rubble per room, as in the Saturn maps
+        self.victims = []
+        for _ in range(max(1, generator.numRooms)):
+            x, z = self._getRandomPoint(self.rooms)
+            self.victims.append((int(x), int(z), self.rng.choice(TrialGenerator.VICTIM_BLOCKS)))
+        self.untriagedVictims = list(self.victims)
+        self.savedVictims = []
+        self.rubbles = [tuple(int(c) for c in self._getRandomPoint(self.corridors)) for _ in
+                        range(max(1, generator.numRooms))]
+        self.placedMarkers = []
+        self.score = 0
+
+        # A blackout in the middle third of the mission
+        self.blackoutStart = generator.missionLength // 3
+        self.blackoutEnd = self.blackoutStart + max(1, generator.missionLength // 10)
+
+    def generate(self) -> Iterator[Dict[str, Any]]:
+        yield from self._generatePlanning()
+        for second in range(self.generator.missionLength):
+            messages = self._generateSecond(second)
+            messages.sort(key=lambda x: x[0])
+            for i in range(1, len(messages)):
+                if self.rng.random() < TrialGenerator.SWAP_PROBABILITY:
+                    messages[i - 1], messages[i] = messages[i], messages[i - 1]
+            for _, message in messages:
+                yield message
+
+        end = self.generator.missionLength
+        yield self._createMessage(end, "observations/events/mission", "event", "Event:MissionState",
+                                  {"mission": "Saturn_A", "mission_state": "Stop"})
+        yield self._createMessage(end + 1, "trial", "trial", "stop", {})
+
+    def _generatePlanning(self) -> Iterator[Dict[str, Any]]:
+        t = -60.0
+        clientInfo = [{"callsign": player.name.capitalize(), "participant_id": playerId,
+                       "playername": f"Player{playerId[-3:]}"} for player, playerId in
+                      zip(Constants.Player, self.playerIds)]
+        yield self._createMessage(t, "trial", "trial", "start", {
+            "name": "TM000001_T000001",
+            "trial_number": "T000001",
+            # Shipped in Resources/Maps with no blocks, as the synthetic map has no victim signal plates
+            "map_block_filename": "MapBlocks_SaturnA_Synthetic_xyz.csv",
+            "subjects": self.playerIds,
+            "client_info": clientInfo
+        })
+        yield self._createMessage(t + 1, "ground_truth/semantic_map/initialized", "groundtruth",
+                                  "SemanticMap:Initialized", {"semantic_map": self.semanticMap})
+        yield self._createMessage(t + 1, "ground_truth/mission/victims_list", "groundtruth", "Mission:VictimList", {
+            "mission_victim_list": [{"x": x, "y": 60, "z": z, "block_type": blockType}
+                                    for x, z, blockType in self.victims]})
+        yield self._createMessage(t + 1, "ground_truth/mission/blockages_list", "groundtruth", "Mission:BlockageList", {
+            "mission_blockage_list": [{"x": x, "y": 60, "z": z, "block_type": "gravel"} for x, z in self.rubbles]})
+        yield self._createMessage(t + 1, "ground_truth/mission/threatsign_list", "groundtruth",
+                                  "Mission:ThreatSignList", {"mission_threatsign_list": [
+                                      {"x": int(x), "y": 60, "z": int(z), "block_type": "block_rubble_collapse"} for
+                                      x, z in (self._getRandomPoint(self.rooms) for _ in range(len(self.rooms) // 4))]})
+        yield self._createMessage(t + 1, "ground_truth/mission/freezeblock_list", "groundtruth",
+                                  "Mission:FreezeBlockList", {"mission_freezeblock_list": []})
+
+        for player, playerId in enumerate(self.playerIds):
+            yield self._createMessage(t + 2, "observations/events/player/role_selected", "event", "Event:RoleSelected",
+                                      {"participant_id": playerId, "new_role": TrialGenerator.ROLES[player],
+                                       "prev_role": "None"})
+            yield self._createStateMessage(t + 3, player, "Mission Timer not initialized.")
+
+        yield self._createMessage(-0.001, "observations/events/mission", "event", "Event:MissionState",
+                                  {"mission": "Saturn_A", "mission_state": "Start"})
+
+    def _generateSecond(self, second: int) -> List[Tuple[float, Dict[str, Any]]]:
+        generator = self.generator
+        remaining = generator.missionLength - second
+        timer = f"{remaining // 60} : {remaining % 60}"
+        messages = []
+
+        def add(t: float, message: Dict[str, Any]):
+            messages.append((t, message))
+
+        numStates = self._getCount(generator.stateRate)
+        for player in range(len(self.playerIds)):
+            for i in range(numStates):
+                self._move(player)
+                t = second + (i + self.rng.random()) / max(1, numStates)
+                add(t, self._createStateMessage(t, player, timer))
+
+        for _ in range(self._getCount(generator.eventRate)):
+            t = second + self.rng.random()
+            for message in self._createEvent(t):
+                add(t, message)
+
+        for _ in range(self._getCount(generator.noiseRate)):
+            t = second + self.rng.random()
+            topic, messageType, subType = self.rng.choice(TrialGenerator.NOISE_TOPICS)
+            add(t, self._createMessage(t, topic, messageType, subType, {
+                "participant_id": self.rng.choice(self.playerIds), "elapsed_milliseconds": int(t * 1000)}))
+
+        if second in [self.blackoutStart, self.blackoutEnd]:
+            t = second + 0.5
+            add(t, self._createMessage(t, "observations/events/mission/perturbation", "event", "Event:Perturbation",
+                                       {"type": "blackout",
+                                        "mission_state": "start" if second == self.blackoutStart else "stop"}))
+
+        return messages
+
+    def _createEvent(self, t: float) -> List[Dict[str, Any]]:
+        names = list(TrialGenerator.EVENT_WEIGHTS.keys())
+        name = self.rng.choices(names, weights=list(TrialGenerator.EVENT_WEIGHTS.values()))[0]
+        player = self.rng.randrange(len(self.playerIds))
+        playerId = self.playerIds[player]
+        x, z = (int(c) for c in self.positions[player])
+
+        if name == "marker_placed":
+            marker = (f"{Constants.Player(player).name.lower()}_{self.rng.choice(TrialGenerator.MARKER_TYPES)}", x, z)
+            self.placedMarkers.append(marker)
+            return [self._createMessage(t, "observations/events/player/marker_placed", "event", "Event:MarkerPlaced",
+                                        {"participant_id": playerId, "type": marker[0], "marker_x": x, "marker_z": z})]
+
+        if name == "marker_removed" and len(self.placedMarkers) > 0:
+            markerType, markerX, markerZ = self.placedMarkers.pop(self.rng.randrange(len(self.placedMarkers)))
+            return [self._createMessage(t, "observations/events/player/marker_removed", "event", "Event:MarkerRemoved",
+                                        {"participant_id": playerId, "type": markerType, "marker_x": markerX,
+                                         "marker_z": markerZ})]
+
+        if name == "triage" and len(self.untriagedVictims) > 0:
+            victimX, victimZ, blockType = self.untriagedVictims.pop(self.rng.randrange(len(self.untriagedVictims)))
+            victimType = "victim_c" if "proximity" in blockType else "victim_b" if "1b" in blockType else "victim_a"
+            self.savedVictims.append((victimX, victimZ, victimType.replace("victim_", "victim_saved_")))
+            self.score += 50 if victimType == "victim_c" else 10
+            data = {"participant_id": playerId, "victim_x": victimX, "victim_z": victimZ, "type": victimType}
+            return [self._createMessage(t, "observations/events/player/triage", "event", "Event:Triage",
+                                        dict(data, triage_state="IN_PROGRESS")),
+                    self._createMessage(t + 0.001, "observations/events/player/triage", "event", "Event:Triage",
+                                        dict(data, triage_state="SUCCESSFUL")),
+                    self._createMessage(t + 0.002, "observations/events/scoreboard", "observation",
+                                        "Event:Scoreboard", {"scoreboard": {"TeamScore": self.score}})]
+
+        if name == "victim_picked_up" and self.carriedVictims[player] is None and len(self.savedVictims) > 0:
+            victimX, victimZ, victimType = self.savedVictims.pop(self.rng.randrange(len(self.savedVictims)))
+            self.carriedVictims[player] = victimType
+            return [self._createMessage(t, "observations/events/player/victim_picked_up", "event",
+                                        "Event:VictimPickedUp", {"participant_id": playerId, "victim_x": victimX,
+                                                                 "victim_z": victimZ, "type": victimType})]
+
+        if name == "victim_placed" and self.carriedVictims[player] is not None:
+            victimType = self.carriedVictims[player]
+            self.carriedVictims[player] = None
+            self.savedVictims.append((x, z, victimType))
+            return [self._createMessage(t, "observations/events/player/victim_placed", "event", "Event:VictimPlaced",
+                                        {"participant_id": playerId, "victim_x": x, "victim_z": z,
+                                         "type": victimType})]
+
+        if name == "rubble_destroyed" and len(self.rubbles) > 0:
+            rubbleX, rubbleZ = self.rubbles.pop(self.rng.randrange(len(self.rubbles)))
+            return [self._createMessage(t, "observations/events/player/tool_used", "event", "Event:ToolUsed",
+                                        {"participant_id": playerId, "tool_type": "HAMMER",
+                                         "target_block_type": "minecraft:gravel", "target_block_x": rubbleX,
+                                         "target_block_z": rubbleZ}),
+                    self._createMessage(t + 0.001, "observations/events/player/rubble_destroyed", "event",
+                                        "Event:RubbleDestroyed", {"participant_id": playerId, "rubble_x": rubbleX,
+                                                                  "rubble_z": rubbleZ})]
+
+        if name == "rubble_collapse":
+            fromX, fromZ = (int(c) for c in self._getRandomPoint(self.corridors))
+            self.rubbles += [(fromX + dx, fromZ + dz) for dx in range(2) for dz in range(2)]
+            return [self._createMessage(t, "observations/events/player/rubble_collapse", "event",
+                                        "Event:RubbleCollapse", {"participant_id": playerId, "fromBlock_x": fromX,
+                                                                 "fromBlock_y": 60, "fromBlock_z": fromZ,
+                                                                 "toBlock_x": fromX + 1, "toBlock_y": 61,
+                                                                 "toBlock_z": fromZ + 1})]
+
+        if name == "item_equipped":
+            return [self._createMessage(t, "observations/events/player/itemequipped", "event", "Event:ItemEquipped",
+                                        {"participant_id": playerId,
+                                         "equippeditemname": self.rng.choice(TrialGenerator.ITEMS)})]
+
+        if name == "chat":
+            text = json.dumps({"color": self.rng.choice(["yellow", "red", "white"]), "text": f"Victim at {x}, {z}"})
+            return [self._createMessage(t, "minecraft/chat", "chat", "Event:Chat",
+                                        {"sender": "Server", "addressees": self.playerIds, "text": text})]
+
+        if name == "speech":
+            return [self._createMessage(t, "agent/asr/final", "observation", "asr:transcription",
+                                        {"participant_id": playerId, "text": f" I'm in room {self.rng.randrange(99)} ",
+                                         "is_final": True})]
+
+        if name == "intervention":
+            return [self._createMessage(t, f"agent/intervention/{Trial.AGENT_NAME}/chat", "agent",
+                                        "Intervention:Chat", {"receivers": [playerId],
+                                                              "content": "Remember to place markers."},
+                                        source=Trial.AGENT_NAME)]
+
+        # The event could not happen in the current state of the world
+        return []
+
+    def _createStateMessage(self, t: float, player: int, timer: str) -> Dict[str, Any]:
+        x, z = self.positions[player]
+        return self._createMessage(t, "observations/state", "observation", "state", {
+            "participant_id": self.playerIds[player], "x": round(x, 4), "y": 60.0, "z": round(z, 4),
+            "yaw": round(self.yaws[player], 4), "pitch": 0.0, "mission_timer": timer,
+            "elapsed_milliseconds": max(0, int(t * 1000))})
+
+    def _createMessage(self, t: float, topic: str, messageType: str, subType: str, data: Dict[str, Any],
+                       source: str = "simulator") -> Dict[str, Any]:
+        timestamp = (self.start + timedelta(seconds=t)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return {"header": {"timestamp": timestamp, "message_type": messageType, "version": "1.1"},
+                "msg": {"sub_type": subType, "source": source, "timestamp": timestamp, "version": "2.0"},
+                "data": data,
+                "topic": topic}
+
+    def _move(self, player: int):
+        # Random walk inside the map
+        self.yaws[player] = (self.yaws[player] + self.rng.uniform(-20, 20) + 180) % 360 - 180
+        if self.rng.random() < 0.7:
+            position = self.positions[player]
+            minX, minZ, maxX, maxZ = self.mapBounds
+            position[0] = min(max(position[0] + self.rng.uniform(-0.5, 0.5), minX), maxX)
+            position[1] = min(max(position[1] + self.rng.uniform(-0.5, 0.5), minZ), maxZ)
+
+    def _getRandomPoint(self, areas: List[Tuple[int, int, int, int]]) -> Tuple[float, float]:
+        x1, z1, x2, z2 = self.rng.choice(areas)
+        return self.rng.uniform(x1, x2 - 1), self.rng.uniform(z1, z2 - 1)
+
+    def _getCount(self, rate: float) -> int:
+        # The fraction of the rate is given with probability, so rates below 1 per second are possible
+        count = int(rate)
+        return count + (1 if self.rng.random() < rate - count else 0)
+
+    @staticmethod
+    def _getBounds(location: Dict[str, Any]) -> Tuple[int, int, int, int]:
+        coordinates = location["bounds"]["coordinates"]
+        return coordinates[0]["x"], coordinates[0]["z"], coordinates[1]["x"], coordinates[1]["z"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes a synthetic .metadata file.")
+    parser.add_argument("output", type=str, help="Path of the .metadata file.")
+    parser.add_argument("--length", type=int, default=900, help="Length of the mission in seconds.")
+    parser.add_argument("--state_rate", type=float, default=10, help="State messages per player per second.")
+    parser.add_argument("--event_rate", type=float, default=1, help="Average number of events per second.")
+    parser.add_argument("--noise_rate", type=float, default=20,
+                        help="Average number of lines of irrelevant topics per second.")
+    parser.add_argument("--players", type=int, default=Constants.NUM_ROLES, help="Number of players (1 to 3).")
+    parser.add_argument("--rooms", type=int, default=40, help="Number of rooms of the map.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random number generator.")
+    args = parser.parse_args()
+
+    trialGenerator = TrialGenerator(args.length, args.state_rate, args.event_rate, args.noise_rate, args.players,
+                                    args.rooms, args.seed)
+    numLines = trialGenerator.write(args.output)
+    print(f"Wrote {numLines} lines to {args.output}. Parse it with Trial(timeSteps={args.length}).")
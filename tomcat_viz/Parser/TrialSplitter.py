@@ -0,0 +1,168 @@
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+import argparse
+import os
+import time
+
+from tomcat_viz.Common.Files import openFile, removeCompressionExtension
+from tomcat_viz.Common.Format import timestampToMicroseconds
+from tomcat_viz.Parser.MetadataReader import MetadataReader
+from tomcat_viz.Parser.Trial import Trial
+
+
+class TrialSegment:
+    """
+    This class holds the messages of one mission of a file with several trials or missions: the ground truth messages
+    per key of Trial.GROUND_TRUTH_TOPICS and the other messages sorted by timestamp.
+    """
+
+    def __init__(self, index: int, mission: str, groundTruthMessagesMap: Dict[str, Any],
+                 messages: List[Dict[str, Any]]):
+        self.index = index
+        self.mission = mission
+        self.groundTruthMessagesMap = groundTruthMessagesMap
+        self.messages = messages
+
+    def parse(self, timeSteps: int = 900) -> Trial:
+        trial = Trial(timeSteps)
+        trial.parseSortedMessages(self.groundTruthMessagesMap, self.messages)
+        return trial
+
+
+class TrialSplitter:
+    """
+    This class splits files that contain several trials or missions (e.g. a training mission followed by two missions)
+    into one trial per mission. Trial.parse stops at the end of the first mission.
+
+    The file is read once. Messages are sorted by timestamp as in Trial.parse, and a segment ends with the stop of its
+    mission, or with the start of the next trial if the mission was not stopped. Messages between two missions (e.g.
+    ground truth and role selections) go to the next one. Ground truth messages are attached to the segment they fall
+    in, and a mission with no ground truth of a kind inherits the one of the previous mission. The trial start message
+    and role selections of a trial are repeated in each of its missions, as they are sent only once per trial.
+    """
+
+    PACKAGE_EXTENSION = ".trial"
+
+    def __init__(self, timeSteps: int = 900):
+        self.timeSteps = timeSteps
+        self.numSkippedLines = 0
+        self.numBadLines = 0
+
+    def readSegments(self, trialMessagesFile: TextIO) -> List[TrialSegment]:
+        """
+        Reads a file and splits its messages in one segment per mission. Nothing is parsed.
+        """
+
+        reader = MetadataReader(Trial._getRelevantTopics(), Trial.AGENT_NAME)
+        messages = list(reader.read(trialMessagesFile))
+        self.numSkippedLines = reader.numSkippedLines
+        self.numBadLines = reader.numBadLines
+
+        # The sort is stable, so messages with the same timestamp keep their order in the file
+        messages.sort(key=lambda x: timestampToMicroseconds(x["header"]["timestamp"]))
+
+        segments = []
+        groundTruthMessagesMap: Dict[str, Any] = {}
+        previousGroundTruthMessagesMap: Dict[str, Any] = {}
+        trialStartMessage = None
+        roleSelectedMessages: Dict[str, Dict[str, Any]] = {}
+        segmentMessages: List[Dict[str, Any]] = []
+        mission: Optional[str] = None
+
+        def closeSegment():
+            nonlocal groundTruthMessagesMap, previousGroundTruthMessagesMap
+            previousGroundTruthMessagesMap = {**previousGroundTruthMessagesMap, **groundTruthMessagesMap}
+            segments.append(TrialSegment(len(segments), mission, previousGroundTruthMessagesMap, segmentMessages))
+            groundTruthMessagesMap = {}
+
+        def newSegmentMessages() -> List[Dict[str, Any]]:
+            setupMessages = [] if trialStartMessage is None else [trialStartMessage]
+            return setupMessages + list(roleSelectedMessages.values())
+
+        for message in messages:
+            groundTruthKey = Trial.GROUND_TRUTH_TOPICS.get(message.get("topic", None), None)
+            if groundTruthKey is not None:
+                groundTruthMessagesMap[groundTruthKey] = message
+                continue
+
+            key = TrialSplitter._getKey(message)
+            if key == ("trial", "start"):
+                if mission is not None:
+                    # The previous mission was not stopped
+                    closeSegment()
+                    mission = None
+                trialStartMessage = message
+                roleSelectedMessages = {}
+                segmentMessages = []
+            elif key == ("event", "event:roleselected"):
+                roleSelectedMessages[message["data"]["participant_id"]] = message
+
+            segmentMessages.append(message)
+
+            missionState = TrialSplitter._getMissionState(message)
+            if missionState == "start":
+                mission = message["data"].get("mission", "")
+            elif missionState is not None or key == ("trial", "stop"):
+                if mission is not None:
+                    closeSegment()
+                    mission = None
+                if key == ("trial", "stop"):
+                    trialStartMessage = None
+                    roleSelectedMessages = {}
+                segmentMessages = newSegmentMessages()
+
+        if mission is not None:
+            closeSegment()
+
+        return segments
+
+    def split(self, trialMessagesFile: TextIO, indices: List[int] = None) -> Iterator[Tuple[TrialSegment, Trial]]:
+        """
+        Reads a file once and parses the trial of each of its segments (or only the ones with the given indices).
+        Messages of a segment are released as soon as it's parsed.
+        """
+
+        segments = self.readSegments(trialMessagesFile)
+        for i, segment in enumerate(segments):
+            segments[i] = None
+            if indices is None or segment.index in indices:
+                yield segment, segment.parse(self.timeSteps)
+
+    @staticmethod
+    def _getKey(message: Dict[str, Any]) -> Tuple[str, str]:
+        # Same key as the one of the message handlers of Trial
+        return message["header"]["message_type"].lower(), message["msg"]["sub_type"].lower()
+
+    @staticmethod
+    def _getMissionState(message: Dict[str, Any]) -> Optional[str]:
+        if TrialSplitter._getKey(message) != ("event", "event:missionstate"):
+            return None
+
+        return message["data"]["mission_state"].lower()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Splits a .metadata file with several trials or missions into one "
+                                                 "trial package per mission, reading the file once.")
+    parser.add_argument("input", type=str, help="Path of the .metadata file (it can be compressed).")
+    parser.add_argument("--output_dir", type=str, default=".", help="Directory where the packages are saved.")
+    parser.add_argument("--segments", type=int, nargs="+",
+                        help="Indices of the segments to save, starting from 0. All of them by default.")
+    parser.add_argument("--time_steps", type=int, default=900, help="Number of seconds of a mission.")
+    args = parser.parse_args()
+
+    basename = os.path.basename(removeCompressionExtension(args.input))
+    basename = os.path.splitext(basename)[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    splitter = TrialSplitter(args.time_steps)
+    with openFile(args.input, "r") as f:
+        for trialSegment, segmentTrial in splitter.split(f, args.segments):
+            packagePath = os.path.join(args.output_dir,
+                                       f"{basename}_{trialSegment.index}{TrialSplitter.PACKAGE_EXTENSION}")
+            segmentTrial.save(packagePath)
+            print(f"Segment {trialSegment.index}: trial {segmentTrial.metadata.get('trial_number', '?')}, mission "
+                  f"{trialSegment.mission}, {segmentTrial.numParsedTimeSteps} time steps -> {packagePath}")
+    if splitter.numBadLines > 0:
+        print(f"Skipped {splitter.numBadLines} bad json line(s)")
+    print(f"Done in {time.perf_counter() - start:.1f}s")